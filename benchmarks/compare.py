@@ -0,0 +1,71 @@
+"""
+Compare two reports of `benchmarks.run`.
+
+Usage: python -m benchmarks.compare BASELINE.json CANDIDATE.json [--threshold 0.1]
+
+Prints the p50/p95 latencies of every operation in both reports and flags the ones
+that got slower by more than the threshold.
+"""
+
+import argparse
+import json
+import sys
+
+
+def _operations(report: dict, prefix: str = ""):
+    for name, value in report.items():
+        if not isinstance(value, dict):
+            continue
+        if "p50_ms" in value:
+            yield f"{prefix}{name}", value
+        else:
+            yield from _operations(value, f"{prefix}{name}.")
+
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> list[str]:
+    """
+    Args:
+        baseline (dict): The reference report.
+        candidate (dict): The report to check.
+        threshold (float): Relative p50 slowdown that counts as a regression.
+    Returns:
+        list[str]: The operations that regressed.
+    """
+    base_ops = dict(_operations(baseline))
+    regressions = []
+    print(f"{'operation':40} {'p50 ms':>17} {'p95 ms':>17}  change")
+    for name, new in _operations(candidate):
+        old = base_ops.get(name)
+        if old is None:
+            print(f"{name:40} {'':>8} {new['p50_ms']:>8} {'':>8} {new['p95_ms']:>8}  new")
+            continue
+        change = new["p50_ms"] / old["p50_ms"] - 1 if old["p50_ms"] else 0.0
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(
+            f"{name:40} {old['p50_ms']:>8} {new['p50_ms']:>8} "
+            f"{old['p95_ms']:>8} {new['p95_ms']:>8}  {change:+.1%}{flag}"
+        )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    sys.exit(1 if compare(baseline, candidate, args.threshold) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import hashlib
+
+import numpy as np
+from PIL import Image
+
+from core.model.base import BaseModel
+
+EMBEDDING_DIM = 768
+
+
+def random_unit_vectors(n: int, seed: int = 0, dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """
+    Deterministic random unit vectors.
+
+    Args:
+        n (int): Number of vectors.
+        seed (int): Seed of the generator.
+        dim (int): Dimension of the vectors.
+    Returns:
+        np.ndarray: A float32 array of shape (n, dim).
+    """
+    vectors = np.random.default_rng(seed).standard_normal((n, dim), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _seed(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+class FakeModel(BaseModel):
+    """
+    Stand-in for the embedding model that needs no weights.
+
+    Every input maps to a random unit vector seeded by its content, so the same
+    text or image always gets the same embedding and runs are reproducible.
+    """
+
+    model_id = "fake"
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+
+    def get_text_embs(self, text: str) -> np.ndarray:
+        return random_unit_vectors(1, _seed(text.encode()), self.dim)[0]
+
+    def get_img_embs(self, img: Image.Image) -> np.ndarray:
+        # Hashing a small copy keeps the fake cheap for full-size screenshots.
+        sample = img.resize((32, 32), Image.NEAREST).tobytes()
+        return random_unit_vectors(1, _seed(sample), self.dim)[0]
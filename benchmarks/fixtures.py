@@ -0,0 +1,97 @@
+"""
+Synthetic databases for the benchmarks.
+
+Fixtures are built once per row count under `benchmarks/fixtures/` and reused by
+later runs; building the 1M row fixture takes a while and several GiB of disk.
+"""
+
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from core.db import Database
+
+from .fakes import random_unit_vectors
+
+logger = logging.getLogger(__name__)
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+FIXTURE_SIZES = (10_000, 100_000, 1_000_000)
+APPLICATIONS = ("firefox", "code", "terminal", "slack", "evince", "gimp")
+# Span of the synthetic capture history, ending at the fixed epoch below.
+HISTORY = timedelta(days=90)
+EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+_CHUNK = 10_000
+
+
+def fixture_path(rows: int) -> str:
+    return os.path.join(FIXTURE_DIR, f"bench_{rows}.sqlite")
+
+
+def _count(db: Database) -> int:
+    return db._get_connection().execute("SELECT COUNT(*) FROM img_info").fetchone()[0]
+
+
+def fixture_db(rows: int, seed: int = 0, rebuild: bool = False) -> Database:
+    """
+    Get a database holding `rows` synthetic entries, building it if needed.
+
+    Entries are random unit embeddings spread evenly over `HISTORY` and cycled
+    through `APPLICATIONS`, inserted in chunks with `Database.insert_entries`.
+
+    Args:
+        rows (int): Number of entries.
+        seed (int): Seed of the embeddings.
+        rebuild (bool): Discard an existing fixture first.
+    Returns:
+        Database: The fixture database.
+    """
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    path = fixture_path(rows)
+    if rebuild and os.path.exists(path):
+        os.remove(path)
+
+    db = Database(path)
+    db.create_tables()
+    existing = _count(db)
+    if existing == rows:
+        return db
+    if existing:
+        raise RuntimeError(
+            f"{path} holds {existing} entries instead of {rows}; rebuild it."
+        )
+
+    logger.warning(f"Building benchmark fixture with {rows} entries at {path}...")
+    step = HISTORY / rows
+    for start in range(0, rows, _CHUNK):
+        end = min(start + _CHUNK, rows)
+        embs = random_unit_vectors(end - start, seed * 1_000_003 + start)
+        entries = [
+            (
+                f"/bench/smarn_{i:08d}.webp",
+                emb,
+                APPLICATIONS[i % len(APPLICATIONS)],
+                EPOCH - HISTORY + i * step,
+                None,
+            )
+            for i, emb in zip(range(start, end), embs)
+        ]
+        if db.insert_entries(entries) != len(entries):
+            raise RuntimeError(f"Could not fill benchmark fixture {path}.")
+    return db
+
+
+def sample_queries(n: int, seed: int = 1) -> np.ndarray:
+    """
+    Query embeddings for the fixtures.
+
+    Args:
+        n (int): Number of queries.
+        seed (int): Seed of the queries; differs from the fixtures' by default.
+    Returns:
+        np.ndarray: A float32 array of shape (n, dim).
+    """
+    return random_unit_vectors(n, seed)
@@ -0,0 +1,137 @@
+"""
+Recall and latency of the approximate indexes (the two-tier quantized index and,
+with hnswlib installed, the HNSW graph) against the exact float index.
+
+Usage: python -m benchmarks.quantized_recall [--db database.sqlite] [--queries 50] [--k 9]
+
+Queries are stored embeddings with a little Gaussian noise added, so no model is
+needed and the report reflects the real embedding distribution of the archive.
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from config import settings
+from core.ann_index import hnsw_available
+from core.db import Database
+from core.utils import deserialize
+
+from .timing import summarize
+
+
+def _sample_queries(
+    db: Database, n: int, noise: float, seed: int
+) -> list[np.ndarray]:
+    conn = db._get_connection()
+    rows = conn.execute(
+        "SELECT embedding FROM vec_idx WHERE id IN "
+        "(SELECT id FROM img_info ORDER BY random() LIMIT ?)",
+        (n,),
+    ).fetchall()
+    rng = np.random.default_rng(seed)
+    queries = []
+    for (blob,) in rows:
+        emb = deserialize(blob)
+        query = emb + rng.normal(0, noise, emb.shape).astype(np.float32)
+        queries.append(query / np.linalg.norm(query))
+    return queries
+
+
+def _timed_search(
+    db: Database, query: np.ndarray, k: int, quantized: bool, approximate: bool = False
+):
+    started = time.perf_counter()
+    entries = (
+        db.get_top_k_entries(query, k, quantized=quantized, approximate=approximate)
+        or []
+    )
+    return [entry[0] for entry in entries], time.perf_counter() - started
+
+
+def _recall(db, queries, exact, k: int, **search) -> dict:
+    """Mean recall@k against the exact results, and the latencies of a search."""
+    recalls, timings = [], []
+    for query, (truth, _) in zip(queries, exact):
+        found, seconds = _timed_search(db, query, k, **search)
+        recalls.append(len(set(found) & set(truth)) / max(len(truth), 1))
+        timings.append(seconds)
+    return {"recall": round(float(np.mean(recalls)), 4), **summarize(timings)}
+
+
+def recall_report(
+    db: Database,
+    n_queries: int = 50,
+    k: int = 9,
+    factors: tuple[int, ...] = (5, 10, 20, 50),
+    efs: tuple[int, ...] = (16, 64, 100, 200),
+    noise: float = 0.02,
+    seed: int = 0,
+) -> dict:
+    """
+    Compare the quantized index (per re-rank factor) and the HNSW graph (per ef)
+    with the exact index.
+
+    Args:
+        db (Database): The database to measure.
+        n_queries (int): Number of queries.
+        k (int): Results per query.
+        factors (tuple[int, ...]): Candidates fetched per result by the coarse scan.
+        efs (tuple[int, ...]): HNSW search candidate list sizes.
+        noise (float): Standard deviation of the noise added to each query.
+        seed (int): Seed of the query sample.
+    Returns:
+        dict: Latencies of the exact index, and recall@k/latency per re-rank
+            factor and per HNSW ef.
+    """
+    queries = _sample_queries(db, n_queries, noise, seed)
+    exact = [_timed_search(db, query, k, quantized=False) for query in queries]
+    report = {
+        "queries": len(queries),
+        "k": k,
+        "exact": summarize([seconds for _, seconds in exact]),
+        "quantized": {},
+    }
+
+    default_factor = settings.RERANK_FACTOR
+    try:
+        for factor in factors:
+            settings.RERANK_FACTOR = factor
+            report["quantized"][factor] = _recall(
+                db, queries, exact, k, quantized=True
+            )
+    finally:
+        settings.RERANK_FACTOR = default_factor
+
+    if not hnsw_available():
+        return report
+    ann = db.ann_index(enabled=True)
+    report["hnsw"] = {"entries": len(ann), "m": ann.m, "ef": {}}
+    default_ef = ann.ef_search
+    try:
+        for ef in efs:
+            ann.ef_search = ef
+            report["hnsw"]["ef"][ef] = _recall(
+                db, queries, exact, k, quantized=False, approximate=True
+            )
+    finally:
+        ann.ef_search = default_ef
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", default="database.sqlite")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=9)
+    args = parser.parse_args()
+
+    db = Database(args.db)
+    db.create_tables()
+    print(json.dumps(recall_report(db, args.queries, args.k), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Benchmark the capture, embedding, storage and search hot paths.
+
+Usage: python -m benchmarks.run [--rows 10000 100000 1000000] [--calls N]
+                                [--model fake|real] [--output FILE]
+
+Runs offline: embeddings come from a deterministic fake model unless `--model real`
+is given, and the databases are synthetic fixtures (see `benchmarks.fixtures`).
+Results are printed as JSON, with p50/p95 latencies and throughput per operation,
+so runs on different commits can be compared with `python -m benchmarks.compare`.
+"""
+
+import argparse
+import io
+import json
+import logging
+import platform
+import sqlite3
+import subprocess
+from datetime import datetime, timedelta, timezone
+
+import sqlite_vec
+
+from config import settings
+from core.ann_index import hnsw_available
+from core.change_detector import ChangeDetector
+from core.db import Database
+from core.storage import encode_image
+
+from .fakes import FakeModel
+from .fixtures import APPLICATIONS, EPOCH, fixture_db, sample_queries
+from .synthetic import synthetic_screenshot
+from .timing import measure
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> dict:
+    """Describe what produced a report."""
+    return {
+        "commit": _git_commit(),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "sqlite": sqlite3.sqlite_version,
+        "sqlite_vec": sqlite_vec.__version__,
+        "storage_codec": settings.STORAGE_CODEC,
+        "storage_quality": settings.STORAGE_QUALITY,
+    }
+
+
+def bench_capture(calls: int, frames: int = 4) -> dict:
+    """Change detection and encoding of full-size screenshots."""
+    imgs = [synthetic_screenshot(seed) for seed in range(frames)]
+    detector = ChangeDetector()
+
+    def encode(i: int) -> None:
+        encode_image(
+            imgs[i % frames],
+            io.BytesIO(),
+            settings.STORAGE_CODEC,
+            settings.STORAGE_QUALITY,
+        )
+
+    return {
+        "change_detect": measure(
+            lambda i: detector.has_changed(detector.sample(imgs[i % frames])), calls
+        ),
+        "image_encode": measure(encode, calls),
+    }
+
+
+def bench_embedding(model, calls: int, batch_size: int) -> dict:
+    """Single and batched image embedding."""
+    imgs = [synthetic_screenshot(seed, (1280, 720)) for seed in range(batch_size)]
+    return {
+        "img_embed": measure(lambda i: model.get_img_embs(imgs[i % batch_size]), calls),
+        "img_embed_batch": measure(
+            lambda i: model.get_img_embs_batch(imgs),
+            max(1, calls // batch_size),
+            warmup=1,
+            items_per_call=batch_size,
+        ),
+        "text_embed": measure(lambda i: model.get_text_embs(f"query {i}"), calls),
+    }
+
+
+def bench_database(db: Database, calls: int, k: int = 9) -> dict:
+    """Insert, KNN search and last-entry lookup against a fixture."""
+    queries = sample_queries(calls + 3)
+    since = EPOCH - timedelta(days=7)
+    report = {
+        "knn": measure(
+            lambda i: db.get_top_k_entries(
+                queries[i], k, quantized=False, approximate=False
+            ),
+            calls,
+        ),
+        "knn_quantized": measure(
+            lambda i: db.get_top_k_entries(
+                queries[i], k, quantized=True, approximate=False
+            ),
+            calls,
+        ),
+        "knn_filtered": measure(
+            lambda i: db.get_top_k_entries(
+                queries[i], k, since=since, apps=[APPLICATIONS[0]], quantized=False
+            ),
+            calls,
+        ),
+        "last_entry": measure(lambda i: db.get_last_entry(), calls),
+    }
+    if hnsw_available():
+        # Loading (or building) the graph is not part of the measurement.
+        db.ann_index(enabled=True)
+        report["knn_hnsw"] = measure(
+            lambda i: db.get_top_k_entries(queries[i], k, approximate=True), calls
+        )
+
+    # Inserted after the fixture's history and deleted again afterwards, so the
+    # fixture can be reused.
+    insert_embs = sample_queries(calls + 3, seed=2)
+    report["insert"] = measure(
+        lambda i: db.insert_entry(
+            f"/bench/insert_{i}.webp",
+            insert_embs[i],
+            APPLICATIONS[i % len(APPLICATIONS)],
+            timestamp=EPOCH + timedelta(seconds=i + 4),
+        ),
+        calls,
+    )
+    ids = [
+        row[0]
+        for row in db._get_connection().execute(
+            "SELECT id FROM img_info WHERE image_path LIKE '/bench/insert_%'"
+        )
+    ]
+    db.delete_entries(ids)
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000])
+    parser.add_argument("--calls", type=int, default=100)
+    parser.add_argument("--model", choices=("fake", "real"), default="fake")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild fixtures.")
+    parser.add_argument("--output", help="Also write the report to this file.")
+    args = parser.parse_args()
+
+    # Per-call info logs would dominate the timings.
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.model == "real":
+        from core.model import model
+    else:
+        model = FakeModel()
+
+    report = {
+        "environment": environment(),
+        "model": model.model_id,
+        "capture": bench_capture(args.calls),
+        "embedding": bench_embedding(model, args.calls, model.max_batch_size),
+        "database": {},
+    }
+    for rows in args.rows:
+        db = fixture_db(rows, rebuild=args.rebuild)
+        report["database"][str(rows)] = bench_database(db, args.calls)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Replay a screen activity trace through the capture scheduler policies.
+
+Usage: python -m benchmarks.scheduler_sim [--trace FILE | --db database.sqlite |
+                                           --synthetic HOURS] [--record FILE]
+                                          [--policies fixed adaptive]
+                                          [--inference-seconds 0.5]
+
+A trace is a CSV of `seconds,similarity[,load,on_battery]` rows, one per step of
+the recorded screen: `similarity` compares the screen at that step with the one
+at the previous step. `--db` derives a trace from the stored entries (the
+similarity of consecutive captures), `--synthetic` generates bursts of activity
+between idle stretches, and `--record` saves the trace for later runs.
+
+Each policy decides when to capture; a capture sees the lowest step similarity
+since the previous capture. A change (a step less similar than
+`--change-threshold`) is missed when no capture happens before the next change
+replaces it. Results are printed as JSON: captures per hour against missed changes.
+"""
+
+import argparse
+import bisect
+import csv
+import json
+import random
+from dataclasses import dataclass
+from datetime import datetime
+
+from config import settings
+from core.capture_scheduler import AdaptivePolicy, FixedStepPolicy, Sample
+from core.db import Database
+from core.utils import cosine_similarity, deserialize
+
+
+@dataclass
+class Step:
+    seconds: float
+    similarity: float
+    load: float = 0.0
+    on_battery: bool = False
+
+
+def load_trace(path: str) -> list[Step]:
+    with open(path, newline="") as f:
+        return [
+            Step(
+                seconds=float(row[0]),
+                similarity=float(row[1]),
+                load=float(row[2]) if len(row) > 2 else 0.0,
+                on_battery=len(row) > 3 and row[3].strip() in ("1", "true", "True"),
+            )
+            for row in csv.reader(f)
+            if row and not row[0].startswith("#")
+        ]
+
+
+def save_trace(trace: list[Step], path: str) -> None:
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["# seconds", "similarity", "load", "on_battery"])
+        for step in trace:
+            writer.writerow(
+                [step.seconds, step.similarity, step.load, int(step.on_battery)]
+            )
+
+
+def trace_from_db(db: Database) -> list[Step]:
+    """Similarities of consecutive stored captures, timed by capture time."""
+    rows = db._get_connection().execute(
+        """
+            SELECT img_info.timestamp, vec_idx.embedding
+            FROM img_info
+            JOIN vec_idx ON vec_idx.id = img_info.id
+            ORDER BY img_info.timestamp
+        """
+    )
+    trace, start, prev = [], None, None
+    for timestamp, blob in rows:
+        captured_at = datetime.fromisoformat(timestamp)
+        emb = deserialize(blob)
+        if start is None:
+            start = captured_at
+        similarity = 0.0 if prev is None else cosine_similarity(prev, emb)
+        trace.append(Step((captured_at - start).total_seconds(), similarity))
+        prev = emb
+    return trace
+
+
+def synthetic_trace(hours: float, step: float = 10, seed: int = 0) -> list[Step]:
+    """
+    Alternate idle stretches (reading, meetings) with bursts of window switching,
+    with some background load now and then.
+    """
+    rng = random.Random(seed)
+    trace, seconds, active, load = [], 0.0, False, 0.0
+    while seconds < hours * 3600:
+        # Switch between idle and active every ~10 minutes on average.
+        if rng.random() < step / 600:
+            active = not active
+            load = rng.choice((0.1, 0.2, 0.3, 1.2))
+        if active and rng.random() < 0.25:
+            similarity = rng.uniform(0.4, 0.85)
+        else:
+            similarity = rng.uniform(0.96, 1.0)
+        trace.append(Step(seconds, similarity, load))
+        seconds += step
+    return trace
+
+
+def simulate(
+    policy, trace: list[Step], inference_seconds: float, change_threshold: float
+) -> dict:
+    """
+    Run a policy over a trace.
+
+    Returns:
+        dict: Captures per hour, changes, missed changes and the mean interval.
+    """
+    end = trace[-1].seconds
+    captures, intervals = [], []
+    seconds, i = 0.0, 0
+    while seconds <= end:
+        # Lowest step similarity since the previous capture.
+        similarity = 1.0
+        while i < len(trace) and trace[i].seconds <= seconds:
+            similarity = min(similarity, trace[i].similarity)
+            i += 1
+        current = trace[max(i - 1, 0)]
+        captures.append(seconds)
+        interval = policy.next_interval(
+            Sample(
+                similarity=similarity,
+                load=current.load,
+                on_battery=current.on_battery,
+                inference_seconds=inference_seconds,
+            )
+        )
+        intervals.append(interval)
+        seconds += interval * 60
+
+    changes = [step.seconds for step in trace if step.similarity < change_threshold]
+    missed = 0
+    for k, changed_at in enumerate(changes):
+        replaced_at = changes[k + 1] if k + 1 < len(changes) else end + 1
+        first = bisect.bisect_left(captures, changed_at)
+        if first == len(captures) or captures[first] >= replaced_at:
+            missed += 1
+
+    hours = max(end, 1) / 3600
+    return {
+        "captures": len(captures),
+        "captures_per_hour": len(captures) / hours,
+        "changes": len(changes),
+        "missed_changes": missed,
+        "miss_rate": missed / len(changes) if changes else 0.0,
+        "mean_interval_minutes": sum(intervals) / len(intervals),
+    }
+
+
+def make_policy(name: str):
+    if name == "fixed":
+        return FixedStepPolicy(settings.INITIAL_INTERVAL)
+    return AdaptivePolicy()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--trace", help="Replay this CSV trace.")
+    source.add_argument("--db", help="Derive the trace from this database.")
+    source.add_argument(
+        "--synthetic", type=float, default=8, help="Hours of trace to generate."
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--record", help="Save the trace to this CSV file.")
+    parser.add_argument(
+        "--policies",
+        nargs="+",
+        choices=("fixed", "adaptive"),
+        default=["fixed", "adaptive"],
+    )
+    parser.add_argument("--inference-seconds", type=float, default=0.5)
+    parser.add_argument(
+        "--change-threshold", type=float, default=settings.SCHEDULER_DIFFERENT
+    )
+    args = parser.parse_args()
+
+    if args.trace:
+        trace = load_trace(args.trace)
+    elif args.db:
+        trace = trace_from_db(Database(args.db))
+    else:
+        trace = synthetic_trace(args.synthetic, seed=args.seed)
+    if not trace:
+        raise SystemExit("The trace is empty.")
+    if args.record:
+        save_trace(trace, args.record)
+
+    report = {
+        "trace_hours": trace[-1].seconds / 3600,
+        "steps": len(trace),
+        "inference_seconds": args.inference_seconds,
+        "policies": {
+            name: simulate(
+                make_policy(name), trace, args.inference_seconds, args.change_threshold
+            )
+            for name in args.policies
+        },
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Compare screenshot storage codecs on encode time and bytes per frame.
+
+Usage: python -m benchmarks.storage_codecs [--quality Q] [image ...]
+
+Without images, synthetic screenshots are used.
+"""
+
+import argparse
+import io
+import json
+import time
+
+from PIL import Image
+
+from core.storage import CODECS, codec_available, encode_image
+
+from .synthetic import synthetic_screenshot
+
+
+def bench_codecs(imgs: list[Image.Image], quality: int, repeat: int = 3) -> dict:
+    """
+    Encode every image with every available codec.
+
+    Args:
+        imgs (list[Image.Image]): The frames to encode.
+        quality (int): Codec quality (0-100).
+        repeat (int): Number of times each frame is encoded.
+    Returns:
+        dict: Codec name -> {"encode_ms", "bytes_per_frame"}.
+    """
+    imgs = [img.convert("RGB") for img in imgs]
+    report = {}
+    for codec in CODECS:
+        if not codec_available(codec):
+            report[codec] = {"error": "not supported by this Pillow build"}
+            continue
+
+        timings, sizes = [], []
+        for img in imgs:
+            for _ in range(repeat):
+                buf = io.BytesIO()
+                started = time.perf_counter()
+                encode_image(img, buf, codec, quality)
+                timings.append(time.perf_counter() - started)
+            sizes.append(buf.tell())
+        report[codec] = {
+            "encode_ms": round(1000 * sum(timings) / len(timings), 2),
+            "bytes_per_frame": sum(sizes) // len(sizes),
+        }
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("images", nargs="*", help="Screenshots to encode.")
+    parser.add_argument("--quality", type=int, default=80)
+    parser.add_argument("--frames", type=int, default=4, help="Synthetic frames.")
+    args = parser.parse_args()
+
+    if args.images:
+        imgs = [Image.open(path) for path in args.images]
+    else:
+        imgs = [synthetic_screenshot(seed) for seed in range(args.frames)]
+    print(json.dumps(bench_codecs(imgs, args.quality), indent=2))
+
+
+if __name__ == "__main__":
+    main()
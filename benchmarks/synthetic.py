@@ -0,0 +1,41 @@
+import numpy as np
+from PIL import Image, ImageDraw
+
+
+def synthetic_screenshot(
+    seed: int = 0, size: tuple[int, int] = (1920, 1080)
+) -> Image.Image:
+    """
+    Generate a deterministic desktop-like image: flat window panels, title bars and
+    lines of "text", which compress much like real screenshots do.
+
+    Args:
+        seed (int): Seed of the layout.
+        size (tuple[int, int]): Width and height of the image.
+    Returns:
+        Image.Image: The RGB image.
+    """
+    rng = np.random.default_rng(seed)
+    width, height = size
+    img = Image.new("RGB", size, tuple(int(c) for c in rng.integers(20, 60, 3)))
+    draw = ImageDraw.Draw(img)
+
+    for _ in range(rng.integers(2, 6)):
+        x0 = int(rng.integers(0, width * 3 // 4))
+        y0 = int(rng.integers(0, height * 3 // 4))
+        x1 = min(width, x0 + int(rng.integers(width // 4, width)))
+        y1 = min(height, y0 + int(rng.integers(height // 4, height)))
+        background = tuple(int(c) for c in rng.integers(180, 256, 3))
+        draw.rectangle((x0, y0, x1, y1), fill=background)
+        draw.rectangle((x0, y0, x1, y0 + 28), fill=(60, 60, 70))
+
+        # Lines of "text": runs of short dark dashes
+        for y in range(y0 + 40, y1 - 12, 18):
+            x = x0 + 12
+            while x < x1 - 60:
+                word = int(rng.integers(12, 70))
+                draw.rectangle((x, y, x + word, y + 9), fill=(30, 30, 30))
+                x += word + int(rng.integers(6, 12))
+            if rng.random() < 0.1:
+                break
+    return img
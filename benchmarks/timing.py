@@ -0,0 +1,54 @@
+import time
+from typing import Callable
+
+import numpy as np
+
+
+def summarize(seconds: list[float], items_per_call: int = 1) -> dict:
+    """
+    Summarize latencies of repeated calls.
+
+    Args:
+        seconds (list[float]): Duration of each call.
+        items_per_call (int): Items processed per call, for the throughput.
+    Returns:
+        dict: {"calls", "p50_ms", "p95_ms", "mean_ms", "per_second"}.
+    """
+    if not seconds:
+        return {"calls": 0}
+    timings = np.asarray(seconds)
+    total = float(timings.sum())
+    return {
+        "calls": len(seconds),
+        "p50_ms": round(1000 * float(np.percentile(timings, 50)), 3),
+        "p95_ms": round(1000 * float(np.percentile(timings, 95)), 3),
+        "mean_ms": round(1000 * total / len(seconds), 3),
+        "per_second": round(len(seconds) * items_per_call / total, 1) if total else None,
+    }
+
+
+def measure(
+    fn: Callable[[int], object],
+    calls: int,
+    warmup: int = 3,
+    items_per_call: int = 1,
+) -> dict:
+    """
+    Call `fn(i)` repeatedly and summarize its latency.
+
+    Args:
+        fn (Callable[[int], object]): The operation; gets the call index.
+        calls (int): Number of timed calls.
+        warmup (int): Untimed calls made first (with negative indices).
+        items_per_call (int): Items processed per call, for the throughput.
+    Returns:
+        dict: See `summarize`.
+    """
+    for i in range(warmup):
+        fn(-1 - i)
+    seconds = []
+    for i in range(calls):
+        started = time.perf_counter()
+        fn(i)
+        seconds.append(time.perf_counter() - started)
+    return summarize(seconds, items_per_call)
@@ -0,0 +1,211 @@
+"""
+Runtime settings for smarn.
+
+Every value can be overridden with an environment variable of the same name
+prefixed by ``SMARN_`` (e.g. ``SMARN_EMBED_QUEUE_SIZE=8``).
+"""
+
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(f"SMARN_{name}", default))
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.environ.get(f"SMARN_{name}", default))
+
+
+def _env_str(name: str, default: str) -> str:
+    return os.environ.get(f"SMARN_{name}", default)
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.environ.get(f"SMARN_{name}")
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# --- Capture pipeline ---
+# Frames waiting to be embedded. When full, the oldest waiting frame is dropped.
+EMBED_QUEUE_SIZE = _env_int("EMBED_QUEUE_SIZE", 16)
+# Embedded frames waiting to be written to the database.
+WRITE_QUEUE_SIZE = _env_int("WRITE_QUEUE_SIZE", 32)
+# Initial capture interval in minutes.
+INITIAL_INTERVAL = _env_float("INITIAL_INTERVAL", 1)
+# Seconds between pipeline stats log lines.
+STATS_LOG_PERIOD = _env_float("STATS_LOG_PERIOD", 300)
+# Number of recent embeddings each new frame is compared against.
+SIMILARITY_WINDOW = _env_int("SIMILARITY_WINDOW", 8)
+
+# Capture scheduler: "adaptive" (activity, load, battery and CPU budget aware) or
+# "fixed" (the original 0.25 minute steps on two similarity thresholds).
+SCHEDULER = _env_str("SCHEDULER", "adaptive")
+# Bounds of the capture interval in minutes.
+MIN_INTERVAL = _env_float("MIN_INTERVAL", 0.25)
+MAX_INTERVAL = _env_float("MAX_INTERVAL", 5)
+# Weight of the newest observation in the smoothed activity and inference cost.
+SCHEDULER_EWMA_ALPHA = _env_float("SCHEDULER_EWMA_ALPHA", 0.3)
+# Frame similarity at or above which the screen counts as idle...
+SCHEDULER_SIMILAR = _env_float("SCHEDULER_SIMILAR", 0.95)
+# ...and at or below which it counts as fully active.
+SCHEDULER_DIFFERENT = _env_float("SCHEDULER_DIFFERENT", 0.8)
+# Load average per CPU above which captures are spread out proportionally.
+SCHEDULER_LOAD_THRESHOLD = _env_float("SCHEDULER_LOAD_THRESHOLD", 0.7)
+# Interval multiplier while running on battery.
+SCHEDULER_BATTERY_FACTOR = _env_float("SCHEDULER_BATTERY_FACTOR", 2)
+# Average fraction of one core that embedding captures may use (0 disables).
+SCHEDULER_CPU_BUDGET = _env_float("SCHEDULER_CPU_BUDGET", 0.05)
+
+# Screen capture backend: "auto" (in-process on X11, else maim/grim), "x11" or
+# "subprocess".
+CAPTURE_BACKEND = _env_str("CAPTURE_BACKEND", "auto")
+
+# --- Change detection ---
+# Minimum fraction of changed screen tiles for a frame to be embedded and stored.
+CHANGE_THRESHOLD = _env_float("CHANGE_THRESHOLD", 0.01)
+# Minimum mean absolute pixel difference (0-255) for a tile to count as changed.
+CHANGE_PIXEL_THRESHOLD = _env_float("CHANGE_PIXEL_THRESHOLD", 6)
+
+# --- Search ---
+# Results per page of a search.
+SEARCH_PAGE_SIZE = _env_int("SEARCH_PAGE_SIZE", 9)
+# Number of query embeddings kept in memory.
+QUERY_CACHE_SIZE = _env_int("QUERY_CACHE_SIZE", 256)
+# Also keep query embeddings in the database so they survive restarts.
+QUERY_CACHE_PERSIST = _env_bool("QUERY_CACHE_PERSIST", True)
+# Maximum number of query embeddings kept in the database.
+QUERY_CACHE_DISK_SIZE = _env_int("QUERY_CACHE_DISK_SIZE", 10000)
+# Search the binary-quantized index first and re-rank its candidates exactly.
+QUANTIZED_INDEX = _env_bool("QUANTIZED_INDEX", False)
+# Candidates fetched from the quantized index per requested result.
+RERANK_FACTOR = _env_int("RERANK_FACTOR", 20)
+# Fuse the KNN ranking with a BM25 ranking of the OCR text.
+HYBRID_SEARCH = _env_bool("HYBRID_SEARCH", True)
+# Rank constant of reciprocal rank fusion; higher values flatten the top ranks.
+RRF_K = _env_int("RRF_K", 60)
+
+# --- Approximate search (HNSW) ---
+# Keep an HNSW graph of the embeddings next to the database (needs hnswlib).
+HNSW_INDEX = _env_bool("HNSW_INDEX", False)
+# Unfiltered searches use the graphs once the shards searched hold this many
+# entries together; smaller archives and filtered searches scan vec_idx exactly.
+HNSW_MIN_ROWS = _env_int("HNSW_MIN_ROWS", 50_000)
+# Links per node; higher improves recall at the cost of memory and insert time.
+HNSW_M = _env_int("HNSW_M", 16)
+# Candidate list sizes while inserting and while searching.
+HNSW_EF_CONSTRUCTION = _env_int("HNSW_EF_CONSTRUCTION", 200)
+HNSW_EF_SEARCH = _env_int("HNSW_EF_SEARCH", 100)
+# Save the graph after this many inserts and deletions (0 only on shutdown).
+HNSW_SAVE_EVERY = _env_int("HNSW_SAVE_EVERY", 10_000)
+
+# --- Thumbnails ---
+# Pillow format of the result thumbnails: "webp" or "jpeg".
+THUMBNAIL_FORMAT = _env_str("THUMBNAIL_FORMAT", "webp")
+# Size budget of the thumbnail directory; least recently used thumbnails are evicted.
+THUMBNAIL_CACHE_BYTES = _env_int("THUMBNAIL_CACHE_BYTES", 512 * 1024 * 1024)
+
+# --- Model ---
+# Inference backend: "torch" (fp32), "torch-int8" (dynamically quantized) or "onnx".
+MODEL_BACKEND = _env_str("MODEL_BACKEND", "torch")
+# Directory holding the exported ONNX towers (see `python -m core.model.onnx_clip`).
+ONNX_MODEL_DIR = _env_str("ONNX_MODEL_DIR", "models/jina-clip-v1-onnx")
+# Load the int8-quantized ONNX towers instead of the fp32 ones.
+ONNX_QUANTIZED = _env_bool("ONNX_QUANTIZED", True)
+# Maximum number of images or texts embedded in a single forward pass.
+MAX_BATCH_SIZE = _env_int("MAX_BATCH_SIZE", 16)
+# Intra-op threads used for inference (0 lets the runtime decide).
+INFERENCE_THREADS = _env_int("INFERENCE_THREADS", 0)
+# Intra-op threads of background (capture and import) embedding; interactive
+# searches keep INFERENCE_THREADS. 0 lets the runtime decide.
+BACKGROUND_THREADS = _env_int("BACKGROUND_THREADS", 2)
+# Niceness (0-19) of the background inference thread.
+BACKGROUND_NICE = _env_int("BACKGROUND_NICE", 10)
+# Also run background inference under SCHED_IDLE, so it only gets CPU time no
+# other process wants. Captures may then lag far behind on a busy machine.
+BACKGROUND_SCHED_IDLE = _env_bool("BACKGROUND_SCHED_IDLE", False)
+# Seconds an embedding request waits for concurrent requests to share its
+# forward pass (0 only batches requests that queued while the model was busy).
+INFERENCE_BATCH_WINDOW = _env_float("INFERENCE_BATCH_WINDOW", 0.005)
+
+# --- Idle detection (deferred backlog embedding) ---
+# Highest 1-minute load average per CPU at which the machine counts as idle.
+IDLE_MAX_LOAD = _env_float("IDLE_MAX_LOAD", 0.3)
+# Seconds without keyboard or mouse input (X11 only) after which the user is idle.
+IDLE_INPUT_SECONDS = _env_float("IDLE_INPUT_SECONDS", 120)
+# Seconds between idle checks while deferred work is waiting.
+IDLE_POLL_SECONDS = _env_float("IDLE_POLL_SECONDS", 30)
+# Seconds after which deferred work runs even if the machine never went idle
+# (0 waits indefinitely).
+IDLE_MAX_DEFER = _env_float("IDLE_MAX_DEFER", 4 * 3600)
+
+# --- Storage ---
+# Screenshot storage codec: "webp", "webp-lossless", "avif" or "png".
+STORAGE_CODEC = _env_str("STORAGE_CODEC", "webp")
+# Codec quality (0-100). For lossless WebP this trades encode time for size.
+STORAGE_QUALITY = _env_int("STORAGE_QUALITY", 80)
+# Number of encoder processes.
+ENCODE_WORKERS = _env_int("ENCODE_WORKERS", 1)
+
+# --- OCR ---
+# Recognize the text of every stored screenshot (needs tesseract and pytesseract).
+OCR_ENABLED = _env_bool("OCR_ENABLED", False)
+# Tesseract languages, e.g. "eng+deu".
+OCR_LANGUAGES = _env_str("OCR_LANGUAGES", "eng")
+# Number of OCR processes.
+OCR_WORKERS = _env_int("OCR_WORKERS", 1)
+
+# --- Retention ---
+# Captures younger than this many days are always kept in full.
+RETENTION_KEEP_DAYS = _env_float("RETENTION_KEEP_DAYS", 7)
+# Until this age, one frame per run of near-duplicates per application is kept.
+# Older captures are reduced to their thumbnail. 0 keeps full captures forever.
+RETENTION_DEDUPE_DAYS = _env_float("RETENTION_DEDUPE_DAYS", 90)
+# Months whose captures are all older than this many days are retired: their
+# database shard and screenshots are deleted. 0 keeps every month.
+RETENTION_RETIRE_DAYS = _env_float("RETENTION_RETIRE_DAYS", 0)
+# Cosine similarity above which consecutive frames of an application are duplicates.
+RETENTION_DUPLICATE_SIMILARITY = _env_float("RETENTION_DUPLICATE_SIMILARITY", 0.97)
+# Entries processed per compactor transaction.
+COMPACT_BATCH_SIZE = _env_int("COMPACT_BATCH_SIZE", 200)
+# Seconds between compactor runs.
+COMPACT_INTERVAL = _env_float("COMPACT_INTERVAL", 3600)
+
+# --- Metrics ---
+# Directory the Prometheus text files (smarn-<process>.prom) are written to.
+# Empty disables the export.
+METRICS_DIR = _env_str("METRICS_DIR", "metrics")
+# Seconds between metrics file writes.
+METRICS_INTERVAL = _env_float("METRICS_INTERVAL", 15)
+
+# --- Database ---
+# Directory of the monthly database shards and their catalog.
+DATA_DIR = _env_str("DATA_DIR", os.path.join(os.path.expanduser("~"), ".smarn"))
+# Database from before sharding, adopted as the oldest shard when the catalog is
+# created. A relative path is resolved from the working directory.
+LEGACY_DB_FILE = _env_str("LEGACY_DB_FILE", "database.sqlite")
+# Bytes of the database file memory-mapped by each connection (0 disables mmap).
+DB_MMAP_SIZE = _env_int("DB_MMAP_SIZE", 256 * 1024 * 1024)
+# Page cache size per connection, in bytes.
+DB_CACHE_SIZE = _env_int("DB_CACHE_SIZE", 64 * 1024 * 1024)
+# Seconds a connection waits for a lock held by another process.
+DB_BUSY_TIMEOUT = _env_float("DB_BUSY_TIMEOUT", 10)
+# Seconds the writer waits for more writes before committing a group.
+DB_COMMIT_DELAY = _env_float("DB_COMMIT_DELAY", 0.01)
+# Maximum number of writes committed together.
+DB_COMMIT_BATCH = _env_int("DB_COMMIT_BATCH", 256)
+
+# --- Daemon ---
+# Unix socket the capture service serves search, embedding and ingest requests on,
+# so the GUI and the CLI share its model instead of loading their own.
+DAEMON_SOCKET = _env_str(
+    "DAEMON_SOCKET",
+    os.path.join(
+        os.environ.get("XDG_RUNTIME_DIR", "/tmp"), f"smarn-{os.getuid()}.sock"
+    ),
+)
+# Serve the socket from the capture service.
+DAEMON_ENABLED = _env_bool("DAEMON_ENABLED", True)
+# Search cursors the daemon keeps open; the least recently used are closed first.
+DAEMON_MAX_CURSORS = _env_int("DAEMON_MAX_CURSORS", 64)
@@ -0,0 +1,283 @@
+"""
+Optional HNSW graph over the stored embeddings, for sub-linear search of large
+archives.
+
+`vec_idx` stays the source of truth: the graph is updated as entries are
+inserted and deleted, saved next to the database file, and can be rebuilt from
+`vec_idx` at any time. Needs the `hnswlib` package.
+
+Usage: python -m core.ann_index [--db FILE] [--rebuild]   (every shard without --db)
+"""
+
+import argparse
+import importlib.util
+import logging
+import os
+import threading
+
+import numpy as np
+
+from config import settings
+from config.log_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DIM = 768
+
+
+def hnsw_available() -> bool:
+    """Whether the hnswlib package is installed."""
+    return importlib.util.find_spec("hnswlib") is not None
+
+
+def index_path(db_file: str) -> str:
+    """Where the graph of a database file is saved, e.g. `database.hnsw`."""
+    return os.path.splitext(db_file)[0] + ".hnsw"
+
+
+class HnswIndex:
+    """
+    An HNSW graph keyed by entry id, with cosine distances like `vec_idx`.
+
+    Thread-safe; searches and updates are serialized by a lock, since resizing
+    and changing `ef` are not safe during a search.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        dim: int = EMBEDDING_DIM,
+        m: int = settings.HNSW_M,
+        ef_construction: int = settings.HNSW_EF_CONSTRUCTION,
+        ef_search: int = settings.HNSW_EF_SEARCH,
+        save_every: int = settings.HNSW_SAVE_EVERY,
+    ):
+        """
+        Args:
+            path (str): File the graph is saved to and loaded from.
+            dim (int): Embedding dimension.
+            m (int): Links per node; higher improves recall at the cost of memory
+                and insert time.
+            ef_construction (int): Candidate list size while inserting.
+            ef_search (int): Candidate list size while searching (at least `k`);
+                higher improves recall at the cost of latency.
+            save_every (int): Save after this many changes (0 only saves on
+                `save()`). Changes since the last save are recovered from
+                `vec_idx` on load.
+        """
+        import hnswlib
+
+        self.path = path
+        self.dim = dim
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.save_every = save_every
+        self._hnswlib = hnswlib
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self._empty()
+
+    def _empty(self, capacity: int = 1024) -> None:
+        # hnswlib indexes cannot be re-initialized, so start from a new one.
+        self._index = self._hnswlib.Index(space="cosine", dim=self.dim)
+        self._index.init_index(
+            max_elements=capacity, M=self.m, ef_construction=self.ef_construction
+        )
+        self._live = 0
+
+    def __len__(self) -> int:
+        """Number of entries in the graph, deleted ones excluded."""
+        return self._live
+
+    def load(self) -> bool:
+        """
+        Load the saved graph, if there is one.
+
+        Returns:
+            bool: Whether a saved graph was loaded.
+        """
+        if not os.path.exists(self.path):
+            return False
+        with self._lock:
+            self._index = self._hnswlib.Index(space="cosine", dim=self.dim)
+            self._index.load_index(self.path)
+            self._live = self._index.get_current_count()
+            self._unsaved = 0
+        if self._index.M != self.m:
+            logger.warning(
+                f"{self.path} was built with M={self._index.M}; rebuild it to use "
+                f"M={self.m}."
+            )
+        logger.info(f"Loaded the HNSW index of {self._live} entries.")
+        return True
+
+    def sync(self, read_ids, fetch, batch_size: int = 500) -> None:
+        """
+        Bring the graph in line with the entries of `vec_idx`.
+
+        Safe while entries are being inserted: the graph's ids are read before the
+        database's, so an entry added meanwhile is never taken for a deleted one.
+
+        Args:
+            read_ids (Callable[[], set[int]]): Reads the ids of every entry.
+            fetch (Callable[[list[int]], tuple[list[int], np.ndarray]]): Reads the
+                ids and embeddings of the entries among some ids.
+            batch_size (int): Embeddings read per `fetch`.
+        """
+        with self._lock:
+            known = set(self._index.get_ids_list())
+        ids = read_ids()
+        missing = sorted(ids - known)
+        stale = known - ids
+        for start in range(0, len(missing), batch_size):
+            found, embs = fetch(missing[start : start + batch_size])
+            self.add(found, embs)
+        self.remove(stale)
+        with self._lock:
+            self._live = len(ids)
+        if missing or stale:
+            logger.info(
+                f"HNSW index caught up: {len(missing)} added, {len(stale)} removed."
+            )
+
+    def add(self, ids: list[int], embs: np.ndarray) -> None:
+        """Insert or update entries."""
+        if not len(ids):
+            return
+        embs = np.asarray(embs, dtype=np.float32).reshape(len(ids), self.dim)
+        with self._lock:
+            needed = self._index.get_current_count() + len(ids)
+            capacity = self._index.get_max_elements()
+            if needed > capacity:
+                self._index.resize_index(max(capacity * 2, needed))
+            self._index.add_items(embs, ids)
+            self._live += len(ids)
+            self._changed(len(ids))
+
+    def remove(self, ids) -> None:
+        """Drop entries from the results; their nodes stay until a rebuild."""
+        removed = 0
+        with self._lock:
+            for id_ in ids:
+                try:
+                    self._index.mark_deleted(id_)
+                    removed += 1
+                except RuntimeError:
+                    # Not in the graph, or already deleted.
+                    pass
+            self._live -= removed
+            self._changed(removed)
+
+    def search(self, query_emb: np.ndarray, k: int) -> list[tuple[int, float]]:
+        """
+        Approximate `k` nearest entries.
+
+        Args:
+            query_emb (np.ndarray): The query embedding.
+            k (int): Number of entries.
+        Returns:
+            list[tuple[int, float]]: (id, cosine distance) pairs, closest first.
+        """
+        with self._lock:
+            k = min(k, self._live)
+            if k <= 0:
+                return []
+            self._index.set_ef(max(self.ef_search, k))
+            labels, distances = self._index.knn_query(
+                np.asarray(query_emb, dtype=np.float32).reshape(1, self.dim), k=k
+            )
+        return [(int(id_), float(d)) for id_, d in zip(labels[0], distances[0])]
+
+    def clear(self) -> None:
+        """Drop every entry and the saved graph."""
+        with self._lock:
+            self._empty()
+            self._unsaved = 0
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def rebuild(self, batches) -> int:
+        """
+        Build a fresh graph aside, then swap it in and save it.
+
+        Searches keep using the old graph meanwhile. Entries inserted during the
+        build are only in the old graph; `sync` afterwards to pick them up.
+
+        Args:
+            batches (Iterable[tuple[list[int], np.ndarray]]): Every entry's id and
+                embedding, in chunks.
+        Returns:
+            int: Number of entries indexed.
+        """
+        fresh = HnswIndex(
+            self.path, self.dim, self.m, self.ef_construction, self.ef_search, 0
+        )
+        for ids, embs in batches:
+            fresh.add(ids, embs)
+            logger.info(f"Indexed {len(fresh)} embeddings.")
+        with self._lock:
+            self._index, self._live = fresh._index, fresh._live
+            self._save()
+        return self._live
+
+    def _changed(self, count: int) -> None:
+        # Called with the lock held.
+        self._unsaved += count
+        if self.save_every and self._unsaved >= self.save_every:
+            self._save()
+
+    def save(self) -> None:
+        """Write the graph to its file, if it changed since it was last saved."""
+        with self._lock:
+            if self._unsaved or not os.path.exists(self.path):
+                self._save()
+
+    def _save(self) -> None:
+        # Written aside and renamed, so a crash never leaves a truncated graph.
+        partial = f"{self.path}.partial"
+        self._index.save_index(partial)
+        os.replace(partial, self.path)
+        self._unsaved = 0
+
+
+def main() -> None:
+    from .db import Database
+    from .shards import ShardedDatabase
+
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--db", help="A single database file instead of the shards.")
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Rebuild from vec_idx instead of catching up a saved graph.",
+    )
+    args = parser.parse_args()
+
+    setup_logging()
+    if not hnsw_available():
+        logger.error("The HNSW index needs the hnswlib package.")
+        raise SystemExit(1)
+
+    if args.db:
+        databases = [Database(args.db)]
+    else:
+        sharded = ShardedDatabase()
+        sharded.create_tables()
+        databases = [shard.db for shard in sharded.shards()]
+
+    for db in databases:
+        db.create_tables()
+        if args.rebuild:
+            indexed = db.build_ann_index()
+        else:
+            ann = db.ann_index(enabled=True)
+            ann.save()
+            indexed = len(ann)
+        logger.info(f"The HNSW index of {db.db_file} holds {indexed} entries.")
+
+
+if __name__ == "__main__":
+    main()
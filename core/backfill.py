@@ -0,0 +1,216 @@
+"""
+Index screenshots that were not taken by the capture service.
+
+Usage: python -m core.backfill DIR [DIR ...] [--workers N] [--batch-size N]
+                               [--when-idle]
+
+Useful for restores from backup, migrated machines, or frames captured while the
+service was down. Already indexed files are skipped, so an interrupted run can be
+resumed by running it again.
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import re
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+from PIL import Image
+
+from config import settings
+from config.log_config import setup_logging
+
+from .model import inference
+from .shards import ShardedDatabase
+from .thumbnails import make_thumbnail
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".avif", ".bmp", ".ppm"}
+# Matches the names given by `core.screenshot.capture`.
+FILENAME_TIMESTAMP = re.compile(r"smarn_(\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})")
+# Images are shrunk in the workers so that only small images cross process
+# boundaries; the model's own preprocessing resizes them further.
+_PREPARED_SIZE = (896, 896)
+_DEFAULT_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+
+def find_images(roots: list[str]) -> list[str]:
+    """
+    Recursively list the image files below some directories, oldest name first.
+
+    Args:
+        roots (list[str]): The directories to walk.
+    Returns:
+        list[str]: Absolute image paths.
+    """
+    paths = []
+    for root in roots:
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                if os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS:
+                    paths.append(os.path.abspath(os.path.join(dirpath, filename)))
+    return sorted(paths)
+
+
+def infer_timestamp(path: str) -> datetime:
+    """
+    Infer when a screenshot was taken, from its smarn file name or else its mtime.
+
+    Args:
+        path (str): The image path.
+    Returns:
+        datetime: The (timezone-aware) capture time.
+    """
+    match = FILENAME_TIMESTAMP.search(os.path.basename(path))
+    if match:
+        # File names use local time.
+        return datetime.strptime(match.group(1), "%Y-%m-%d_%H-%M-%S").astimezone()
+    return datetime.fromtimestamp(os.path.getmtime(path), timezone.utc)
+
+
+def _prepare(path: str) -> tuple[str, Image.Image | None, str | None]:
+    """Decode, shrink and thumbnail one image. Runs in a worker process."""
+    try:
+        with Image.open(path) as img:
+            img = img.convert("RGB")
+        thumbnail_path = make_thumbnail(path, img)
+        img.thumbnail(_PREPARED_SIZE, Image.BILINEAR, reducing_gap=2.0)
+        return path, img, thumbnail_path
+    except OSError as e:
+        logger.error(f"Skipping {path}: {e}")
+        return path, None, None
+
+
+class _Progress:
+    def __init__(self, total: int, period: float = 5.0):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.period = period
+        self._started = time.monotonic()
+        self._last_report = self._started
+
+    def update(self, done: int = 0, failed: int = 0, force: bool = False) -> None:
+        self.done += done
+        self.failed += failed
+        now = time.monotonic()
+        if force or now - self._last_report >= self.period:
+            self._last_report = now
+            rate = self.done / max(now - self._started, 1e-9)
+            logger.info(
+                f"Indexed {self.done}/{self.total} images "
+                f"({self.failed} failed, {rate:.1f} images/s)"
+            )
+
+
+def backfill(
+    roots: list[str],
+    workers: int = _DEFAULT_WORKERS,
+    batch_size: int = settings.MAX_BATCH_SIZE,
+    commit_every: int = 512,
+    when_idle: bool = False,
+) -> int:
+    """
+    Index every image below `roots` that is not in the database yet.
+
+    Images are decoded in a process pool, embedded in batches, and inserted in
+    large transactions.
+
+    Args:
+        roots (list[str]): The directories to import.
+        workers (int): Decoder processes.
+        batch_size (int): Images per forward pass.
+        commit_every (int): Entries per transaction.
+        when_idle (bool): Only embed while the machine is idle.
+    Returns:
+        int: Number of images indexed.
+    """
+    db = ShardedDatabase()
+    db.create_tables()
+    indexed = db.get_indexed_paths()
+    paths = [path for path in find_images(roots) if path not in indexed]
+    logger.info(
+        f"Found {len(paths)} images to index ({len(indexed)} already indexed)."
+    )
+    if not paths:
+        return 0
+
+    progress = _Progress(len(paths))
+    prepared: list[tuple[str, Image.Image, str | None]] = []
+    rows: list[tuple] = []
+
+    def collect(future) -> None:
+        path, img, thumbnail_path = future.result()
+        if img is None:
+            progress.update(failed=1)
+            return
+        prepared.append((path, img, thumbnail_path))
+        if len(prepared) >= batch_size:
+            embed()
+        if len(rows) >= commit_every:
+            commit()
+
+    def embed() -> None:
+        if not prepared:
+            return
+        embs = inference.embed_images(
+            [img for _, img, _ in prepared], when_idle=when_idle
+        ).result()
+        for (path, _, thumbnail_path), emb in zip(prepared, embs):
+            rows.append((path, emb, "", infer_timestamp(path), thumbnail_path))
+        prepared.clear()
+
+    def commit() -> None:
+        progress.update(done=db.insert_entries(rows))
+        rows.clear()
+
+    # Spawned rather than forked: the parent may already hold model threads.
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+    ) as pool:
+        # Bound the decodes in flight so memory stays flat when embedding is the
+        # bottleneck; results are consumed in submission order.
+        in_flight: deque = deque()
+        for path in paths:
+            in_flight.append(pool.submit(_prepare, path))
+            if len(in_flight) >= workers * 4:
+                collect(in_flight.popleft())
+        while in_flight:
+            collect(in_flight.popleft())
+
+    embed()
+    commit()
+    progress.update(force=True)
+    return progress.done
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("dirs", nargs="+", help="Directories of screenshots.")
+    parser.add_argument("--workers", type=int, default=_DEFAULT_WORKERS)
+    parser.add_argument("--batch-size", type=int, default=settings.MAX_BATCH_SIZE)
+    parser.add_argument("--commit-every", type=int, default=512)
+    parser.add_argument(
+        "--when-idle",
+        action="store_true",
+        help="Only embed while the machine is idle (low load, no recent input).",
+    )
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    backfill(
+        args.dirs, args.workers, args.batch_size, args.commit_every, args.when_idle
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,257 @@
+"""
+Choosing when to take the next screenshot.
+
+A policy maps what was just observed (how much the screen changed, how loaded
+and power-constrained the machine is, what an embedding costs) to the next
+capture interval. `FixedStepPolicy` is the original +/- 0.25 minute stepping;
+`AdaptivePolicy` is the default. `CaptureScheduler` feeds either one with live
+system readings.
+
+Policies are pure apart from their own smoothing state, so
+`benchmarks.scheduler_sim` can replay recorded traces through them.
+"""
+
+import logging
+import os
+import threading
+from dataclasses import dataclass
+
+from config import settings
+
+from .metrics import registry
+from .utils import modulate_interval
+
+logger = logging.getLogger(__name__)
+
+POWER_SUPPLY_DIR = "/sys/class/power_supply"
+
+# Similarity recorded for a frame the change detector skipped. Its score is a
+# fraction of changed pixel tiles, not a cosine similarity, so it is not fed to
+# the policies; a skipped frame is counted as the same screen as the last
+# embedded one, which is what its embedding would have shown.
+UNCHANGED_SIMILARITY = 1.0
+
+
+@dataclass
+class Sample:
+    """What the scheduler knows after a capture."""
+
+    # Cosine similarity between this frame and the previous ones (1 = unchanged).
+    similarity: float
+    # 1-minute load average divided by the number of CPUs.
+    load: float = 0.0
+    on_battery: bool = False
+    # CPU seconds spent embedding one frame.
+    inference_seconds: float = 0.0
+
+
+class FixedStepPolicy:
+    """The original policy: 0.25 minute steps on two similarity thresholds."""
+
+    name = "fixed"
+
+    def __init__(self, interval: float = settings.INITIAL_INTERVAL):
+        self.interval = interval
+
+    def next_interval(self, sample: Sample) -> float:
+        self.interval = modulate_interval(self.interval, sample.similarity)
+        return self.interval
+
+
+class AdaptivePolicy:
+    """
+    Derive the interval from a smoothed change signal, then back off under load.
+
+    The change signal is an EWMA of `1 - similarity`, so a single odd frame does
+    not swing the interval while a sustained burst of activity quickly shortens it.
+    It is mapped onto [min_interval, max_interval] geometrically: a fully active
+    screen is captured every `min_interval`, an idle one every `max_interval`.
+
+    The result is then stretched by the per-CPU load above `load_threshold` and by
+    `battery_factor` on battery, and never drops below the interval at which
+    embedding would use more than `cpu_budget` of one core.
+    """
+
+    name = "adaptive"
+
+    def __init__(
+        self,
+        min_interval: float = settings.MIN_INTERVAL,
+        max_interval: float = settings.MAX_INTERVAL,
+        alpha: float = settings.SCHEDULER_EWMA_ALPHA,
+        similar: float = settings.SCHEDULER_SIMILAR,
+        different: float = settings.SCHEDULER_DIFFERENT,
+        load_threshold: float = settings.SCHEDULER_LOAD_THRESHOLD,
+        battery_factor: float = settings.SCHEDULER_BATTERY_FACTOR,
+        cpu_budget: float = settings.SCHEDULER_CPU_BUDGET,
+    ):
+        """
+        Args:
+            min_interval (float): Shortest interval in minutes.
+            max_interval (float): Longest interval in minutes.
+            alpha (float): EWMA weight of the newest change observation.
+            similar (float): Similarity at or above which the screen counts as idle.
+            different (float): Similarity at or below which it counts as fully active.
+            load_threshold (float): Per-CPU load above which captures slow down.
+            battery_factor (float): Interval multiplier on battery.
+            cpu_budget (float): Fraction of one core embedding may use on average.
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.alpha = alpha
+        self.similar = similar
+        self.different = different
+        self.load_threshold = load_threshold
+        self.battery_factor = battery_factor
+        self.cpu_budget = cpu_budget
+        self.change: float | None = None
+
+    def activity(self) -> float:
+        """The smoothed change signal rescaled to [0, 1]."""
+        if self.change is None:
+            return 1.0
+        low, high = 1 - self.similar, 1 - self.different
+        return min(1.0, max(0.0, (self.change - low) / (high - low)))
+
+    def next_interval(self, sample: Sample) -> float:
+        change = 1 - sample.similarity
+        if self.change is None:
+            self.change = change
+        else:
+            self.change = self.alpha * change + (1 - self.alpha) * self.change
+
+        ratio = self.min_interval / self.max_interval
+        interval = self.max_interval * ratio ** self.activity()
+
+        if sample.load > self.load_threshold:
+            interval *= sample.load / self.load_threshold
+        if sample.on_battery:
+            interval *= self.battery_factor
+        if self.cpu_budget > 0:
+            interval = max(interval, sample.inference_seconds / self.cpu_budget / 60)
+
+        return min(self.max_interval, max(self.min_interval, interval))
+
+
+def make_policy(
+    name: str = settings.SCHEDULER, interval: float = settings.INITIAL_INTERVAL
+):
+    """
+    Args:
+        name (str): "adaptive" or "fixed".
+        interval (float): Initial interval in minutes (used by the fixed policy).
+    Returns:
+        AdaptivePolicy | FixedStepPolicy: The policy.
+    """
+    if name == "fixed":
+        return FixedStepPolicy(interval)
+    if name != "adaptive":
+        logger.warning(f"Unknown scheduler {name!r}; using the adaptive one.")
+    return AdaptivePolicy()
+
+
+def cpu_load() -> float:
+    """1-minute load average per CPU (0 where unavailable)."""
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except OSError:
+        return 0.0
+
+
+def on_battery(power_supply_dir: str = POWER_SUPPLY_DIR) -> bool:
+    """
+    Whether the machine runs on battery, from the kernel's power supply class.
+
+    Args:
+        power_supply_dir (str): The sysfs power supply directory.
+    Returns:
+        bool: True if no AC adapter is online and a battery is discharging.
+    """
+
+    def read(supply: str, attribute: str) -> str:
+        try:
+            with open(os.path.join(power_supply_dir, supply, attribute)) as f:
+                return f.read().strip()
+        except OSError:
+            return ""
+
+    try:
+        supplies = os.listdir(power_supply_dir)
+    except OSError:
+        return False
+
+    discharging = False
+    for supply in supplies:
+        kind = read(supply, "type")
+        if kind in ("Mains", "USB") and read(supply, "online") == "1":
+            return False
+        if kind == "Battery" and read(supply, "status") == "Discharging":
+            discharging = True
+    return discharging
+
+
+class CaptureScheduler:
+    """Feeds a policy with live load, power and inference cost readings."""
+
+    def __init__(self, policy=None, interval: float = settings.INITIAL_INTERVAL):
+        """
+        Args:
+            policy (AdaptivePolicy | FixedStepPolicy, optional): Defaults to the
+                SCHEDULER setting.
+            interval (float): Initial interval in minutes.
+        """
+        self.policy = policy if policy is not None else make_policy(interval=interval)
+        self.interval = interval
+        self._inference_seconds = 0.0
+        self._lock = threading.Lock()
+        registry.gauge(
+            "smarn_scheduler_activity",
+            "Smoothed screen activity driving the capture interval (0 idle, 1 busy).",
+            fn=lambda: getattr(self.policy, "activity", lambda: None)(),
+        )
+
+    def record_inference(self, seconds: float) -> None:
+        """
+        Record what embedding one frame cost, smoothed like the change signal.
+
+        Args:
+            seconds (float): Embedding time per frame.
+        """
+        with self._lock:
+            if self._inference_seconds == 0:
+                self._inference_seconds = seconds
+            else:
+                alpha = settings.SCHEDULER_EWMA_ALPHA
+                self._inference_seconds = (
+                    alpha * seconds + (1 - alpha) * self._inference_seconds
+                )
+
+    def observe(self, similarity: float) -> float:
+        """
+        Update the policy after a capture.
+
+        Args:
+            similarity (float): Similarity of the new frame to the previous ones.
+        Returns:
+            float: The next capture interval in minutes.
+        """
+        sample = Sample(
+            similarity=similarity,
+            load=cpu_load(),
+            on_battery=on_battery(),
+            inference_seconds=self._inference_seconds,
+        )
+        with self._lock:
+            self.interval = self.policy.next_interval(sample)
+        logger.debug(f"{sample}; next capture in {self.interval:.2f} minutes.")
+        return self.interval
+
+    def observe_unchanged(self) -> float:
+        """
+        Update the policy after a capture the change detector found unchanged
+        (see `UNCHANGED_SIMILARITY`).
+
+        Returns:
+            float: The next capture interval in minutes.
+        """
+        return self.observe(UNCHANGED_SIMILARITY)
@@ -0,0 +1,114 @@
+import logging
+
+import numpy as np
+from PIL import Image
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Size of the grayscale image the comparison runs on, and the tile grid laid over it.
+_SAMPLE_SIZE = (128, 72)
+_TILE_GRID = (16, 9)
+
+
+class ChangeDetector:
+    """
+    Cheap pixel-level change detector used to skip inference on unchanged screens.
+
+    Each frame is downsampled to a small grayscale image which is split into a grid
+    of tiles. A tile counts as changed when its mean absolute difference from the
+    same tile in the reference frame exceeds `pixel_threshold`. The change score is
+    the fraction of changed tiles, so a blinking cursor or a ticking clock changes
+    one tile while switching windows changes most of them.
+
+    The reference is the last frame that was embedded, not the last frame seen,
+    so a screen that drifts a little every interval (typing in an editor) is
+    embedded once the drift adds up instead of being skipped forever. The caller
+    `commit`s a frame once its embedding has succeeded: a frame that is dropped
+    or fails to embed leaves the reference as it was, so the next capture of the
+    same screen is not skipped as unchanged.
+    """
+
+    def __init__(
+        self,
+        threshold: float = settings.CHANGE_THRESHOLD,
+        pixel_threshold: float = settings.CHANGE_PIXEL_THRESHOLD,
+    ):
+        """
+        Args:
+            threshold (float): Minimum fraction of changed tiles for a frame to count as changed.
+            pixel_threshold (float): Minimum mean absolute difference (0-255) for a tile to count as changed.
+        """
+        self.threshold = threshold
+        self.pixel_threshold = pixel_threshold
+        self._prev: np.ndarray | None = None
+
+    def change_score(self, img: Image.Image) -> float:
+        """
+        Compute the fraction of tiles that changed since the reference frame. The
+        reference is left as it is.
+
+        Args:
+            img (Image.Image): The current frame.
+        Returns:
+            float: The change score in [0, 1]; 1.0 when there is no reference frame.
+        """
+        return self._score(_sample(img))
+
+    def _score(self, curr: np.ndarray) -> float:
+        prev = self._prev
+        if prev is None or prev.shape != curr.shape:
+            return 1.0
+
+        cols, rows = _TILE_GRID
+        diff = np.abs(curr - prev)
+        tile_h, tile_w = diff.shape[0] // rows, diff.shape[1] // cols
+        tiles = diff.reshape(rows, tile_h, cols, tile_w).mean(axis=(1, 3))
+        return float(np.count_nonzero(tiles > self.pixel_threshold)) / tiles.size
+
+    def sample(self, img: Image.Image) -> np.ndarray:
+        """
+        Downsample a frame to what `has_changed` and `commit` compare.
+
+        Args:
+            img (Image.Image): The frame.
+        Returns:
+            np.ndarray: The small grayscale sample.
+        """
+        return _sample(img)
+
+    def has_changed(self, sample: np.ndarray) -> tuple[bool, float]:
+        """
+        Check whether a frame differs enough from the reference to be embedded.
+        The reference is left as it is.
+
+        Args:
+            sample (np.ndarray): The frame's `sample`.
+        Returns:
+            tuple[bool, float]: Whether the frame changed, and its change score.
+        """
+        score = self._score(sample)
+        changed = score >= self.threshold
+        if not changed:
+            logger.info(f"Screen unchanged (change score {score:.3f}).")
+        return changed, score
+
+    def commit(self, sample: np.ndarray) -> None:
+        """
+        Make an embedded frame the reference of the next comparisons.
+
+        Args:
+            sample (np.ndarray): The frame's `sample`.
+        """
+        self._prev = sample
+
+    def reset(self) -> None:
+        """Forget the reference frame; the next frame always counts as changed."""
+        self._prev = None
+
+
+def _sample(img: Image.Image) -> np.ndarray:
+    """Downsample an image to a small grayscale float array."""
+    small = img.resize(_SAMPLE_SIZE, Image.BILINEAR, reducing_gap=2.0).convert("L")
+    return np.asarray(small, dtype=np.float32)
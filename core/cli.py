@@ -0,0 +1,117 @@
+"""
+Command-line client of the smarn daemon.
+
+Usage: python -m core.cli search QUERY [--since 2h|3d|1w|ISO] [--until 2h|ISO]
+                                       [--apps A,B] [--pages N] [--json]
+       python -m core.cli embed TEXT
+       python -m core.cli ingest IMAGE [IMAGE ...] [--app NAME]
+       python -m core.cli ping
+
+Needs a running daemon (the capture service, or `python -m core.daemon`), whose
+loaded model answers instantly instead of being loaded for each command.
+"""
+
+import argparse
+import json
+import re
+import sys
+from datetime import datetime, timedelta, timezone
+
+from config import settings
+
+from .client import DaemonClient, DaemonError
+
+_DURATION = re.compile(r"^(\d+(?:\.\d+)?)([mhdw])$")
+_UNITS = {"m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
+
+
+def parse_time(value: str) -> datetime:
+    """
+    Parse `--since`/`--until`: a duration back from now ("90m", "2h", "3d", "1w")
+    or an ISO date/time in local time.
+    """
+    match = _DURATION.match(value)
+    if match:
+        amount, unit = match.groups()
+        ago = timedelta(**{_UNITS[unit]: float(amount)})
+        return datetime.now(timezone.utc) - ago
+    try:
+        return datetime.fromisoformat(value).astimezone(timezone.utc)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid time: {value}")
+
+
+def _search(client: DaemonClient, args: argparse.Namespace) -> None:
+    apps = [app.strip() for app in (args.apps or "").split(",") if app.strip()]
+    cursor = client.open_search(
+        " ".join(args.query), since=args.since, until=args.until, apps=apps or None
+    )
+    results = []
+    for _ in range(args.pages):
+        if cursor is None or not cursor.has_more:
+            break
+        results += cursor.next_page()
+    if cursor is not None:
+        cursor.close()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for item in results:
+        app = item["application_name"] or "-"
+        print(f"{item['timestamp']}  {app:<20} {item['image_path']}")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--socket", default=settings.DAEMON_SOCKET)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    search = commands.add_parser("search", help="Search the screenshot history.")
+    search.add_argument("query", nargs="+")
+    search.add_argument("--since", type=parse_time)
+    search.add_argument("--until", type=parse_time)
+    search.add_argument("--apps", help="Comma-separated application names.")
+    search.add_argument("--pages", type=int, default=1)
+    search.add_argument("--json", action="store_true")
+
+    embed = commands.add_parser("embed", help="Print the embedding of a text.")
+    embed.add_argument("text", nargs="+")
+
+    ingest = commands.add_parser("ingest", help="Index screenshot files.")
+    ingest.add_argument("images", nargs="+")
+    ingest.add_argument("--app", default="", help="Application shown.")
+
+    commands.add_parser("ping", help="Check that the daemon is running.")
+    args = parser.parse_args(argv)
+
+    client = DaemonClient(args.socket)
+    try:
+        if args.command == "search":
+            _search(client, args)
+        elif args.command == "embed":
+            text_emb = client.embed_text(" ".join(args.text))
+            print(json.dumps(text_emb.ravel().tolist()))
+        elif args.command == "ingest":
+            for image in args.images:
+                entry_id = client.ingest(image, args.app)
+                print(f"{image}: {'not indexed' if entry_id is None else entry_id}")
+        else:
+            state = "loaded" if client.ping() else "loading"
+            print(f"Daemon on {args.socket}: model {state}.")
+    except DaemonError as e:
+        print(
+            f"smarn daemon error ({args.socket}): {e}\n"
+            "Start it with `python -m core.daemon`.",
+            file=sys.stderr,
+        )
+        return 1
+    finally:
+        client.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,256 @@
+"""
+Client of the smarn daemon (see `core.daemon`).
+
+The GUI and the CLI search through the daemon when one is running, so they start
+instantly and share its loaded model instead of loading their own.
+"""
+
+import logging
+import os
+import socket
+import threading
+from datetime import datetime
+from typing import Any, Dict, List
+
+import numpy as np
+
+from config import settings
+
+from . import protocol
+from .protocol import Reader, Writer
+
+logger = logging.getLogger(__name__)
+
+
+class DaemonError(Exception):
+    """Raised when the daemon is unreachable or fails a request."""
+
+
+class RemoteError(DaemonError):
+    """Raised when the daemon received a request and answered with an error."""
+
+
+class DaemonClient:
+    """
+    One connection to the daemon. Thread-safe: requests are sent one at a time.
+    """
+
+    def __init__(
+        self, socket_path: str = settings.DAEMON_SOCKET, timeout: float = 60
+    ):
+        """
+        Args:
+            socket_path (str): The daemon's Unix socket.
+            timeout (float): Seconds to wait for a reply; the first search may wait
+                for the daemon's model to load.
+        """
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._sock: socket.socket | None = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def connect(
+        cls, socket_path: str = settings.DAEMON_SOCKET
+    ) -> "DaemonClient | None":
+        """
+        Connect to a running daemon.
+
+        Args:
+            socket_path (str): The daemon's Unix socket.
+        Returns:
+            DaemonClient | None: The client, or None if no daemon is running.
+        """
+        client = cls(socket_path)
+        try:
+            client.ping()
+        except DaemonError as e:
+            logger.info(f"No smarn daemon on {socket_path}: {e}")
+            return None
+        return client
+
+    def _request(self, type_: int, body: Writer | None = None) -> Reader:
+        with self._lock:
+            try:
+                if self._sock is None:
+                    self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                    self._sock.settimeout(self.timeout)
+                    self._sock.connect(self.socket_path)
+                protocol.send_message(
+                    self._sock, type_, body.bytes() if body is not None else b""
+                )
+                reply = protocol.recv_message(self._sock)
+            except (OSError, protocol.ProtocolError) as e:
+                self._close()
+                raise DaemonError(str(e)) from e
+        if reply is None:
+            self.close()
+            raise DaemonError("The daemon closed the connection.")
+        reply_type, reader = reply
+        if reply_type == protocol.ERROR:
+            raise RemoteError(reader.str())
+        return reader
+
+    def _close(self) -> None:
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def close(self) -> None:
+        with self._lock:
+            self._close()
+
+    def ping(self) -> bool:
+        """
+        Check the daemon is up.
+
+        Returns:
+            bool: Whether its model has been loaded.
+        """
+        return bool(self._request(protocol.PING).u8())
+
+    def is_ready(self) -> bool:
+        """
+        Whether the daemon's model is loaded (False if it is unreachable).
+
+        Pings over a connection of its own, so it answers at once even while a
+        search waits for the model on the shared one.
+
+        Raises:
+            RemoteError: If the daemon's model failed to load.
+        """
+        probe = DaemonClient(self.socket_path, timeout=1)
+        try:
+            return probe.ping()
+        except RemoteError:
+            raise
+        except DaemonError:
+            return False
+        finally:
+            probe.close()
+
+    def embed_text(self, text: str) -> np.ndarray:
+        """
+        Embed a text query with the daemon's model.
+
+        Args:
+            text (str): The text.
+        Returns:
+            np.ndarray: The embedding, shaped like `model.get_text_embs` output.
+        """
+        reply = self._request(protocol.EMBED_TEXT, Writer().str(text))
+        return reply.embedding()[np.newaxis]
+
+    def open_search(
+        self,
+        text_query: str,
+        page_size: int = settings.SEARCH_PAGE_SIZE,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        apps: List[str] | None = None,
+    ) -> "RemoteSearchCursor | None":
+        """
+        Open a cursor over the results of a text query; see `core.main.open_search`.
+
+        Args:
+            text_query (str): The text query.
+            page_size (int): Results per page.
+            since (datetime, optional): Only images captured at or after this time.
+            until (datetime, optional): Only images captured before this time.
+            apps (List[str], optional): Only images of these applications.
+        Returns:
+            RemoteSearchCursor | None: The cursor, or None for an empty query.
+        """
+        if not text_query or not text_query.strip():
+            return None
+        apps = apps or []
+        body = Writer().str(text_query).u16(page_size).time(since).time(until)
+        body.u8(len(apps))
+        for app in apps:
+            body.str(app)
+        return RemoteSearchCursor(self, self._request(protocol.SEARCH, body))
+
+    def search(
+        self,
+        text_query: str,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        apps: List[str] | None = None,
+    ) -> List[Dict[str, Any]]:
+        """The first page of results of a query; see `core.main.search_images`."""
+        cursor = self.open_search(text_query, since=since, until=until, apps=apps)
+        if cursor is None:
+            return []
+        page = cursor.next_page()
+        cursor.close()
+        return page
+
+    def ingest(
+        self,
+        image_path: str,
+        application_name: str = "",
+        timestamp: datetime | None = None,
+    ) -> int | None:
+        """
+        Have the daemon embed and index a screenshot file.
+
+        Args:
+            image_path (str): The screenshot; the daemon must be able to read it.
+                A relative path is resolved against this process's working
+                directory, not the daemon's.
+            application_name (str): The application shown.
+            timestamp (datetime, optional): When it was captured. Defaults to now.
+        Returns:
+            int | None: The id of the new entry, or None if it was not inserted.
+        """
+        body = (
+            Writer()
+            .str(os.path.abspath(image_path))
+            .str(application_name)
+            .time(timestamp)
+        )
+        entry_id = self._request(protocol.INGEST, body).i64()
+        return None if entry_id < 0 else entry_id
+
+
+class RemoteSearchCursor:
+    """A search cursor held by the daemon; pages like `core.main.SearchCursor`."""
+
+    def __init__(self, client: DaemonClient, first_reply: Reader):
+        self._client = client
+        self._cursor_id, self._has_more, self._pending = self._read(first_reply)
+
+    @staticmethod
+    def _read(reader: Reader) -> tuple[int, bool, List[Dict[str, Any]]]:
+        return reader.u32(), bool(reader.u8()), reader.results()
+
+    @property
+    def has_more(self) -> bool:
+        return self._pending is not None or self._has_more
+
+    def next_page(self) -> List[Dict[str, Any]]:
+        """
+        Get the next page of results.
+
+        Returns:
+            List[Dict[str, Any]]: Up to a page of results; empty once exhausted.
+        """
+        # The daemon answers the search with the first page.
+        if self._pending is not None:
+            page, self._pending = self._pending, None
+            return page
+        if not self._has_more:
+            return []
+        reply = self._client._request(
+            protocol.NEXT_PAGE, Writer().u32(self._cursor_id)
+        )
+        self._cursor_id, self._has_more, page = self._read(reply)
+        return page
+
+    def close(self) -> None:
+        """Release the daemon's cursor early."""
+        if self._has_more:
+            self._client._request(
+                protocol.CLOSE_CURSOR, Writer().u32(self._cursor_id)
+            )
+            self._has_more = False
@@ -0,0 +1,275 @@
+"""
+Serves search, text embedding and ingest requests over a Unix domain socket.
+
+The daemon runs inside the capture service, so the model and the database are
+loaded once per machine: the GUI and `python -m core.cli` connect to it instead
+of loading their own model (see `core.client`). The wire format is described in
+`core.protocol`.
+
+Usage: python -m core.daemon [--no-capture] [--socket PATH]
+"""
+
+import argparse
+import collections
+import itertools
+import logging
+import os
+import socket
+import socketserver
+import stat
+import threading
+
+from PIL import Image
+
+from config import settings
+from config.log_config import setup_logging
+
+from . import protocol
+from .main import PAGE_SIZE, SearchCursor, open_search, query_cache
+from .metrics import registry
+from .model import inference, model
+from .protocol import ProtocolError, Reader, Writer
+from .shards import ShardedDatabase
+from .thumbnails import make_thumbnail
+
+logger = logging.getLogger(__name__)
+
+_REQUEST_SECONDS = {
+    type_: registry.histogram(
+        "smarn_daemon_request_seconds",
+        "Time to handle a daemon request, by message type.",
+        {"type": name},
+    )
+    for type_, name in protocol.MESSAGE_NAMES.items()
+    if type_ != protocol.ERROR
+}
+
+
+def socket_in_use(socket_path: str) -> bool:
+    """Whether a live process is accepting connections on a socket path."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+            return True
+        except OSError:
+            return False
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    """Serves the requests of one client connection, one at a time."""
+
+    def handle(self) -> None:
+        daemon: SmarnDaemon = self.server.smarn
+        while True:
+            try:
+                message = protocol.recv_message(self.request)
+            except (ProtocolError, ConnectionError) as e:
+                logger.warning(f"Dropping daemon client: {e}")
+                return
+            if message is None:
+                return
+            type_, reader = message
+            reply_type, body = daemon.dispatch(type_, reader)
+            try:
+                protocol.send_message(self.request, reply_type, body)
+            except OSError:
+                return
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class SmarnDaemon:
+    """The server side of the socket; owns the search cursors of its clients."""
+
+    def __init__(
+        self,
+        socket_path: str = settings.DAEMON_SOCKET,
+        max_cursors: int = settings.DAEMON_MAX_CURSORS,
+    ):
+        """
+        Args:
+            socket_path (str): Where to bind the Unix socket.
+            max_cursors (int): Search cursors kept open across all clients.
+        """
+        self.socket_path = socket_path
+        self.max_cursors = max_cursors
+        self.db = ShardedDatabase()
+        self._cursors: collections.OrderedDict[int, SearchCursor] = (
+            collections.OrderedDict()
+        )
+        self._cursor_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server: _Server | None = None
+        self._handlers = {
+            protocol.PING: self._ping,
+            protocol.EMBED_TEXT: self._embed_text,
+            protocol.SEARCH: self._search,
+            protocol.NEXT_PAGE: self._next_page,
+            protocol.CLOSE_CURSOR: self._close_cursor,
+            protocol.INGEST: self._ingest,
+        }
+
+    def start(self) -> bool:
+        """
+        Bind the socket and serve it on a background thread.
+
+        Returns:
+            bool: False if another daemon already serves the socket.
+        """
+        if os.path.exists(self.socket_path):
+            if socket_in_use(self.socket_path):
+                logger.warning(f"A smarn daemon already serves {self.socket_path}.")
+                return False
+            if not stat.S_ISSOCK(os.stat(self.socket_path).st_mode):
+                raise FileExistsError(f"{self.socket_path} is not a socket.")
+            # Left behind by a daemon that did not shut down cleanly.
+            os.unlink(self.socket_path)
+
+        old_umask = os.umask(0o177)
+        try:
+            self._server = _Server(self.socket_path, _Handler)
+        finally:
+            os.umask(old_umask)
+        self._server.smarn = self
+        threading.Thread(
+            target=self._server.serve_forever, name="smarn-daemon", daemon=True
+        ).start()
+        model.warm_up()
+        logger.info(f"Serving requests on {self.socket_path}.")
+        return True
+
+    def stop(self) -> None:
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
+        try:
+            os.unlink(self.socket_path)
+        except OSError:
+            pass
+
+    def dispatch(self, type_: int, reader: Reader) -> tuple[int, bytes]:
+        """
+        Handle one request.
+
+        Args:
+            type_ (int): The request's message type.
+            reader (Reader): Its fields.
+        Returns:
+            tuple[int, bytes]: The reply's message type and packed fields.
+        """
+        handler = self._handlers.get(type_)
+        if handler is None:
+            return protocol.ERROR, Writer().str(f"Unknown request {type_}.").bytes()
+        try:
+            with _REQUEST_SECONDS[type_].time():
+                return type_, handler(reader).bytes()
+        except Exception as e:
+            logger.error(f"Error handling {protocol.MESSAGE_NAMES[type_]}: {e}")
+            return protocol.ERROR, Writer().str(str(e)).bytes()
+
+    def _ping(self, reader: Reader) -> Writer:
+        return Writer().u8(int(model.is_ready()))
+
+    def _embed_text(self, reader: Reader) -> Writer:
+        text_emb = query_cache.get_or_compute(reader.str(), inference.embed_text)
+        return Writer().embedding(text_emb)
+
+    def _search(self, reader: Reader) -> Writer:
+        text_query = reader.str()
+        page_size = reader.u16() or PAGE_SIZE
+        since, until = reader.time(), reader.time()
+        apps = [reader.str() for _ in range(reader.u8())]
+        cursor = open_search(
+            text_query, page_size, since=since, until=until, apps=apps or None
+        )
+        if cursor is None:
+            return Writer().u32(0).u8(0).results([])
+        with self._lock:
+            cursor_id = next(self._cursor_ids)
+            self._cursors[cursor_id] = cursor
+            while len(self._cursors) > self.max_cursors:
+                self._cursors.popitem(last=False)
+        return self._page(cursor_id, cursor)
+
+    def _next_page(self, reader: Reader) -> Writer:
+        cursor_id = reader.u32()
+        with self._lock:
+            cursor = self._cursors.get(cursor_id)
+            if cursor is not None:
+                self._cursors.move_to_end(cursor_id)
+        if cursor is None:
+            raise KeyError(f"Search cursor {cursor_id} has expired.")
+        return self._page(cursor_id, cursor)
+
+    def _page(self, cursor_id: int, cursor: SearchCursor) -> Writer:
+        page = cursor.next_page()
+        has_more = cursor.has_more
+        if not has_more:
+            with self._lock:
+                self._cursors.pop(cursor_id, None)
+        return Writer().u32(cursor_id).u8(int(has_more)).results(page)
+
+    def _close_cursor(self, reader: Reader) -> Writer:
+        with self._lock:
+            self._cursors.pop(reader.u32(), None)
+        return Writer()
+
+    def _ingest(self, reader: Reader) -> Writer:
+        image_path = reader.str()
+        application_name = reader.str()
+        timestamp = reader.time()
+        # The daemon's working directory is not the client's; `DaemonClient`
+        # resolves paths before sending them.
+        if not os.path.isabs(image_path):
+            raise ValueError(f"Ingest needs an absolute path, got {image_path!r}.")
+        with Image.open(image_path) as src:
+            img = src.convert("RGB")
+        thumbnail_path = make_thumbnail(image_path, img)
+        emb = inference.embed_image(img).result()
+        entry_id = self.db.insert_entry(
+            image_path,
+            emb,
+            application_name,
+            timestamp=timestamp,
+            thumbnail_path=thumbnail_path,
+        )
+        return Writer().i64(-1 if entry_id is None else entry_id)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--no-capture",
+        action="store_true",
+        help="Only serve requests; do not run the capture pipeline.",
+    )
+    parser.add_argument("--socket", default=settings.DAEMON_SOCKET)
+    args = parser.parse_args()
+
+    setup_logging()
+    if not args.no_capture:
+        from .screenshot import service
+
+        service(socket_path=args.socket)
+        return
+
+    ShardedDatabase().create_tables()
+    daemon = SmarnDaemon(args.socket)
+    if not daemon.start():
+        raise SystemExit(1)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.stop()
+
+
+if __name__ == "__main__":
+    main()
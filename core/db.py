@@ -1,77 +1,346 @@
 import logging
+import os
 import sqlite3
 import threading
+import weakref
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from functools import partial
 
 import numpy as np
 import sqlite_vec
 
+from config import settings
+
+from .ann_index import HnswIndex, hnsw_available, index_path
+from .db_writer import DbWriter, Job
+from .metrics import registry
+from .migrations import MIGRATIONS, Migration, migrate
+from .utils import deserialize, reciprocal_rank_fusion
+
 logger = logging.getLogger(__name__)
 
 
+def format_timestamp(timestamp: datetime | None = None) -> str:
+    """
+    Format a timestamp the way SQLite's `datetime('now')` does (UTC, second precision).
+
+    Args:
+        timestamp (datetime, optional): The timestamp to format. Defaults to now.
+    Returns:
+        str: The formatted timestamp.
+    """
+    if timestamp is None:
+        timestamp = datetime.now(timezone.utc)
+    elif timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc)
+    return timestamp.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def as_utc(timestamp: datetime | None) -> datetime | None:
+    """
+    Make a search bound timezone-aware and UTC. Naive times are taken as local
+    time, as `datetime.timestamp()` does, so the KNN and the OCR text filters
+    select the same window.
+    """
+    if timestamp is None:
+        return None
+    return timestamp.astimezone(timezone.utc)
+
+
+def _metadata_filters(
+    since: datetime | None, until: datetime | None
+) -> tuple[list[str], list[int]]:
+    """Build vec0 metadata constraints for a capture time range."""
+    filters, params = [], []
+    if since is not None:
+        filters.append("captured_at >= ?")
+        params.append(int(since.timestamp()))
+    if until is not None:
+        filters.append("captured_at < ?")
+        params.append(int(until.timestamp()))
+    return filters, params
+
+
+# Duration of the steps of a search query, by index.
+_SEARCH_SECONDS = {
+    (step, index): registry.histogram(
+        "smarn_search_step_seconds",
+        "Duration of each step of a search query.",
+        {"step": step, "index": index},
+    )
+    for step, index in (
+        ("knn", "float"),
+        ("knn", "binary"),
+        ("knn", "hnsw"),
+        ("rerank", "binary"),
+        ("join", "float"),
+        ("join", "binary"),
+        ("bm25", "fts"),
+        ("join", "fts"),
+    )
+}
+
+
+def fts_match_expression(text_query: str) -> str:
+    """
+    Turn a free-text query into an FTS5 MATCH expression.
+
+    Every whitespace-separated term becomes a quoted phrase, so punctuation in
+    error codes, paths and URLs is matched as token boundaries instead of being
+    parsed as FTS5 syntax, and all terms must occur.
+
+    Args:
+        text_query (str): The user's query.
+    Returns:
+        str: The MATCH expression; empty if the query has no terms.
+    """
+    terms = text_query.split()
+    return " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def _log_cache_error(future: Future) -> None:
+    """Log a failed query cache write; the cache is best effort."""
+    if future.exception() is not None:
+        logger.debug(f"Query cache write failed: {future.exception()}")
+
+
+class _Connection(sqlite3.Connection):
+    """A connection that can be weakly referenced, so `Database` can track them."""
+
+
 class Database:
-    _instance = None
+    # One instance per database file, shared by every `Database(db_file)` call.
+    _instances: dict[str, "Database"] = {}
     _lock = threading.Lock()
 
     def __init__(self, db_file: str = "database.sqlite"):
+        # `__new__` hands out existing instances; keep their open connections.
+        if getattr(self, "_initialized", False):
+            return
         self.db_file = db_file
         self.thread_local = threading.local()
+        # Every thread's read connection, so `close()` can reach them all; a
+        # connection drops out once its thread has exited.
+        self._connections: weakref.WeakSet[_Connection] = weakref.WeakSet()
+        self._writer: DbWriter | None = None
+        self._ann: HnswIndex | None = None
+        self._ann_lock = threading.Lock()
+        self._ann_unavailable = False
+        self._initialized = True
 
-    def __new__(cls, *args, **kwargs):
+    def __new__(cls, db_file: str = "database.sqlite"):
+        key = os.path.abspath(db_file)
         with cls._lock:
-            if cls._instance is None:
-                logger.info("SQLite Vector Database singleton created.")
-                cls._instance = super().__new__(cls)
-        return cls._instance
+            if key not in cls._instances:
+                logger.info(f"SQLite Vector Database created for {db_file}.")
+                cls._instances[key] = super().__new__(cls)
+        return cls._instances[key]
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Open a connection with sqlite-vec loaded and the pragmas applied.
+
+        WAL lets searches read while the writer commits, and with WAL
+        `synchronous=NORMAL` only syncs at checkpoints instead of every commit.
+        """
+        # Not bound to the opening thread, so `close()` can close any of them.
+        conn = sqlite3.connect(
+            self.db_file,
+            timeout=settings.DB_BUSY_TIMEOUT,
+            check_same_thread=False,
+            factory=_Connection,
+        )
+        conn.enable_load_extension(True)
+        sqlite_vec.load(conn)
+        conn.enable_load_extension(False)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA mmap_size = {int(settings.DB_MMAP_SIZE)}")
+        # A negative cache size is in KiB rather than pages.
+        conn.execute(f"PRAGMA cache_size = {-(int(settings.DB_CACHE_SIZE) // 1024)}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        return conn
 
     def _get_connection(self):
-        """Get a thread-local database connection."""
+        """Get a thread-local database connection for reads."""
         if not hasattr(self.thread_local, "conn"):
             try:
-                conn = sqlite3.connect(self.db_file)
-                conn.enable_load_extension(True)
-                sqlite_vec.load(conn)
-                conn.enable_load_extension(False)
-                self.thread_local.conn = conn
+                self.thread_local.conn = self._connect()
+                with self._lock:
+                    self._connections.add(self.thread_local.conn)
                 logger.info(f"New DB connection for thread {threading.get_ident()}")
             except sqlite3.Error as e:
                 logger.error(f"Error initializing the database connection: {e}")
                 raise
         return self.thread_local.conn
 
-    def create_tables(self) -> None:
-        """Create required tables if they do not exist."""
+    def _write(self, job: Job) -> Future:
+        """
+        Queue a write on the writer thread, which owns the only write connection.
+
+        Never wait on the returned future from inside a job or a future callback:
+        both run on the writer thread.
+
+        Args:
+            job (Callable[[sqlite3.Connection], Any]): Runs the statements; must not
+                commit or roll back.
+        Returns:
+            Future: Resolves to the job's return value once committed.
+        """
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = DbWriter(self._connect)
+        return self._writer.submit(job)
+
+    def flush(self) -> None:
+        """Block until every queued write has been committed; save the HNSW graph."""
+        if self._writer is not None:
+            self._writer.flush()
+        if self._ann is not None:
+            self._ann.save()
+
+    def close(self) -> None:
+        """
+        Commit the queued writes, stop the writer and close every thread's read
+        connection, so the file can be deleted. The instance is forgotten, so a
+        later `Database(db_file)` opens the file afresh.
+        """
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        with self._lock:
+            connections = list(self._connections)
+            self._connections = weakref.WeakSet()
+            # Threads still holding this instance open a new connection next time.
+            self.thread_local = threading.local()
+            self._instances.pop(os.path.abspath(self.db_file), None)
+        for conn in connections:
+            conn.close()
+
+    def ann_index(self, enabled: bool | None = None) -> HnswIndex | None:
+        """
+        Get the HNSW graph of this database, loading it on first use.
+
+        A graph saved by an earlier run is caught up with `vec_idx`, so inserts
+        and deletions it missed are applied.
+
+        Args:
+            enabled (bool, optional): Load the graph even if the HNSW_INDEX setting
+                is off. Defaults to the setting.
+        Returns:
+            HnswIndex | None: The graph, or None if it is disabled or hnswlib is not
+                installed.
+        """
+        if self._ann is not None:
+            return self._ann
+        if not (settings.HNSW_INDEX if enabled is None else enabled):
+            return None
+        if self._ann_unavailable or not hnsw_available():
+            if not self._ann_unavailable:
+                logger.warning("The HNSW index needs hnswlib; searching exactly.")
+                self._ann_unavailable = True
+            return None
+        with self._ann_lock:
+            if self._ann is None:
+                ann = HnswIndex(index_path(self.db_file))
+                ann.load()
+                # Published first, so inserts committed during the catch-up are
+                # added by `_index_inserted` rather than missed.
+                self._ann = ann
+                ann.sync(self._vector_ids, self._get_embeddings)
+        return self._ann
+
+    def build_ann_index(self, batch_size: int = 10_000) -> int:
+        """
+        Rebuild the HNSW graph from `vec_idx` and save it.
+
+        Args:
+            batch_size (int): Number of embeddings read at a time.
+        Returns:
+            int: Number of entries indexed.
+        """
+        with self._ann_lock:
+            if self._ann is None:
+                self._ann = HnswIndex(index_path(self.db_file))
         conn = self._get_connection()
-        try:
-            conn.execute(
-                """
-                    CREATE TABLE IF NOT EXISTS img_info (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        image_path TEXT NOT NULL,
-                        application_name TEXT,
-                        timestamp TIMESTAMP NOT NULL
-                    );
-                """
-            )
-            conn.execute(
-                """
-                    CREATE VIRTUAL TABLE IF NOT EXISTS vec_idx USING vec0 (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        embedding FLOAT[768] distance_metric=cosine
-                    );
-                """
+
+        def batches():
+            cursor = conn.execute("SELECT id, embedding FROM vec_idx")
+            while rows := cursor.fetchmany(batch_size):
+                yield [row[0] for row in rows], np.vstack(
+                    [deserialize(row[1]) for row in rows]
+                )
+
+        indexed = self._ann.rebuild(batches())
+        self._ann.sync(self._vector_ids, self._get_embeddings)
+        return indexed
+
+    def ann_size(self) -> int:
+        """Number of entries in the HNSW graph; 0 if it is disabled."""
+        ann = self.ann_index()
+        return len(ann) if ann is not None else 0
+
+    def _vector_ids(self) -> set[int]:
+        conn = self._get_connection()
+        return {row[0] for row in conn.execute("SELECT id FROM vec_idx")}
+
+    def _get_embeddings(self, ids: list[int]) -> tuple[list[int], np.ndarray]:
+        """The ids found among `ids` and their embeddings."""
+        placeholders = ",".join("?" * len(ids))
+        rows = (
+            self._get_connection()
+            .execute(
+                f"SELECT id, embedding FROM vec_idx WHERE id IN ({placeholders})", ids
             )
-            conn.commit()
+            .fetchall()
+        )
+        if not rows:
+            return [], np.empty((0, 0), dtype=np.float32)
+        embs = np.vstack([deserialize(row[1]) for row in rows])
+        return [row[0] for row in rows], embs
+
+    def _index_inserted(self, ids: list[int], embs: np.ndarray) -> None:
+        """Add committed entries to the HNSW graph, if it is loaded."""
+        ann = self._ann
+        if ann is None:
+            return
+        try:
+            ann.add(ids, embs)
+        except Exception as e:
+            # The next load catches the graph up with vec_idx.
+            logger.error(f"Error adding entries to the HNSW index: {e}")
+
+    def _on_inserted(self, emb: np.ndarray, future: Future) -> None:
+        if future.exception() is None:
+            self._index_inserted([future.result()], emb)
+
+    def create_tables(self, migrations: list[Migration] = MIGRATIONS) -> None:
+        """
+        Create the tables, or upgrade an existing database to the current schema.
+
+        Args:
+            migrations (list[Migration]): The schema to apply. Defaults to the
+                entries' schema.
+        """
+        try:
+            applied = self._write(partial(migrate, migrations=migrations)).result()
+            if applied:
+                logger.info(f"Applied {applied} schema migrations.")
             logger.info("Tables created.")
         except sqlite3.Error as e:
             logger.error(f"Error creating tables: {e}")
-            conn.rollback()
 
     def insert_entry(
         self,
         image_path: str,
         img_emb: np.ndarray,
         application_name: str = "",
-    ) -> None:
+        timestamp: datetime | None = None,
+        thumbnail_path: str | None = None,
+    ) -> int | None:
         """
         Insert an image entry to the database using an image path or the image embedding if provided.
 
@@ -79,66 +348,286 @@ class Database:
             image_path (str): The image path.
             application_name (str): The application name.
             embedding (np.ndarray, optional): The image embedding.
+            timestamp (datetime, optional): When the image was captured. Defaults to now.
+            thumbnail_path (str, optional): The path of the image's thumbnail.
+        Returns:
+            int | None: The id of the new entry, or None if it was not inserted.
         """
-        conn = self._get_connection()
         try:
-            conn.execute(
+            entry_id = self.insert_entry_async(
+                image_path, img_emb, application_name, timestamp, thumbnail_path
+            ).result()
+            logger.info("Entry inserted into Vector Database.")
+            return entry_id
+        except sqlite3.Error as e:
+            logger.error(f"Error inserting entry: {e}")
+        except ValueError:
+            logger.error("The model or processor may not have been loaded properly.")
+        except Exception as e:
+            logger.error(f"Unexpected error while inserting entry: {e}")
+            raise
+
+    def insert_entry_async(
+        self,
+        image_path: str,
+        img_emb: np.ndarray,
+        application_name: str = "",
+        timestamp: datetime | None = None,
+        thumbnail_path: str | None = None,
+    ) -> Future:
+        """
+        Queue an entry for insertion with the writer's next group commit.
+
+        Args:
+            image_path (str): The image path.
+            img_emb (np.ndarray): The image embedding.
+            application_name (str): The application name.
+            timestamp (datetime, optional): When the image was captured. Defaults to now.
+            thumbnail_path (str, optional): The path of the image's thumbnail.
+        Returns:
+            Future: Resolves to the id of the new entry once it has been committed.
+        """
+        if timestamp is None:
+            timestamp = datetime.now(timezone.utc)
+        vec_row = (
+            img_emb.astype(np.float32),
+            int(timestamp.timestamp()),
+            application_name.lower(),
+        )
+
+        def insert(conn: sqlite3.Connection) -> int:
+            cursor = conn.execute(
                 """
-                    INSERT INTO img_info (image_path, application_name, timestamp)
-                    VALUES (?, ?, datetime('now'))
+                    INSERT INTO img_info (
+                        image_path, application_name, timestamp, thumbnail_path
+                    )
+                    VALUES (?, ?, ?, ?)
                 """,
                 (
                     image_path,
                     application_name,
+                    format_timestamp(timestamp),
+                    thumbnail_path,
                 ),
             )
             conn.execute(
                 """
-                    INSERT INTO vec_idx (embedding)
-                    VALUES (?)
+                    INSERT INTO vec_idx (id, embedding, captured_at, application_name)
+                    VALUES (?, ?, ?, ?)
                 """,
-                (img_emb.astype(np.float32),),
+                (cursor.lastrowid, *vec_row),
             )
-            conn.commit()
-            logger.info("Entry inserted into Vector Database.")
+            conn.execute(
+                """
+                    INSERT INTO vec_idx_bin (id, embedding, captured_at, application_name)
+                    VALUES (?, vec_quantize_binary(?), ?, ?)
+                """,
+                (cursor.lastrowid, *vec_row),
+            )
+            return cursor.lastrowid
+
+        future = self._write(insert)
+        future.add_done_callback(partial(self._on_inserted, vec_row[0]))
+        return future
+
+    def insert_entries(
+        self,
+        entries: list[tuple[str, np.ndarray, str, datetime, str | None]],
+    ) -> int:
+        """
+        Insert many entries in a single transaction.
+
+        Args:
+            entries (list[tuple]): (image_path, img_emb, application_name, timestamp,
+                thumbnail_path) tuples.
+        Returns:
+            int: Number of entries inserted (0 if the transaction was rolled back).
+        """
+        if not entries:
+            return 0
+        inserted_ids: list[int] = []
+
+        def insert(conn: sqlite3.Connection) -> int:
+            # Row by row, so SQLite assigns each id (`executemany` does not report
+            # them); it is still one transaction.
+            ids = [
+                conn.execute(
+                    """
+                        INSERT INTO img_info (
+                            image_path, application_name, timestamp, thumbnail_path
+                        )
+                        VALUES (?, ?, ?, ?)
+                    """,
+                    (path, app, format_timestamp(timestamp), thumb),
+                ).lastrowid
+                for path, _, app, timestamp, thumb in entries
+            ]
+            vec_rows = [
+                (
+                    id_,
+                    emb.astype(np.float32),
+                    int(timestamp.timestamp()),
+                    app.lower(),
+                )
+                for id_, (_, emb, app, timestamp, _) in zip(ids, entries)
+            ]
+            inserted_ids.extend(ids)
+            conn.executemany(
+                """
+                    INSERT INTO vec_idx (id, embedding, captured_at, application_name)
+                    VALUES (?, ?, ?, ?)
+                """,
+                vec_rows,
+            )
+            conn.executemany(
+                """
+                    INSERT INTO vec_idx_bin (id, embedding, captured_at, application_name)
+                    VALUES (?, vec_quantize_binary(?), ?, ?)
+                """,
+                vec_rows,
+            )
+            return len(entries)
+
+        try:
+            inserted = self._write(insert).result()
+            logger.info(f"{inserted} entries inserted into Vector Database.")
         except sqlite3.Error as e:
-            logger.error(f"Error inserting entry: {e}")
-            conn.rollback()
-        except ValueError:
-            logger.error("The model or processor may not have been loaded properly.")
-        except Exception as e:
-            logger.error(f"Unexpected error while inserting entry: {e}")
-            raise
+            logger.error(f"Error inserting entries: {e}")
+            return 0
+        self._index_inserted(inserted_ids, np.vstack([emb for _, emb, *_ in entries]))
+        return inserted
+
+    def get_time_range(self) -> tuple[datetime, datetime] | None:
+        """
+        Get the capture times of the oldest and the newest entry.
+
+        Returns:
+            tuple[datetime, datetime] | None: The range (UTC), or None if the
+                database is empty.
+        """
+        conn = self._get_connection()
+        try:
+            first, last = conn.execute(
+                "SELECT MIN(timestamp), MAX(timestamp) FROM img_info"
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Error fetching the time range: {e}")
+            return None
+        if first is None:
+            return None
+        return tuple(
+            datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+            for value in (first, last)
+        )
+
+    def get_entry_paths(self) -> list[tuple[str, str | None]]:
+        """
+        Get the files of every entry.
+
+        Returns:
+            list[tuple[str, str | None]]: (image_path, thumbnail_path) pairs.
+        """
+        conn = self._get_connection()
+        try:
+            return conn.execute(
+                "SELECT image_path, thumbnail_path FROM img_info"
+            ).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Error fetching entry paths: {e}")
+            return []
+
+    def get_indexed_paths(self) -> set[str]:
+        """
+        Get the image paths of every entry.
+
+        Returns:
+            set[str]: The indexed image paths.
+        """
+        conn = self._get_connection()
+        try:
+            return {row[0] for row in conn.execute("SELECT image_path FROM img_info")}
+        except sqlite3.Error as e:
+            logger.error(f"Error fetching indexed paths: {e}")
+            return set()
+
+    def get_thumbnails_in_use(self, thumbnail_paths: list[str]) -> set[str]:
+        """
+        Get which of some thumbnails an entry still points at. Thumbnails are
+        keyed by content, so entries of identical screens share one.
+
+        Args:
+            thumbnail_paths (list[str]): The thumbnail paths.
+        Returns:
+            set[str]: The paths that are still referenced.
+        """
+        conn = self._get_connection()
+        in_use: set[str] = set()
+        try:
+            # Chunked to stay under SQLite's limit on bound parameters.
+            for start in range(0, len(thumbnail_paths), 500):
+                chunk = thumbnail_paths[start : start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                in_use.update(
+                    row[0]
+                    for row in conn.execute(
+                        f"""
+                            SELECT DISTINCT thumbnail_path FROM img_info
+                            WHERE thumbnail_path IN ({placeholders})
+                        """,
+                        chunk,
+                    )
+                )
+            return in_use
+        except sqlite3.Error as e:
+            logger.error(f"Error checking thumbnail references: {e}")
+            # Keep the files rather than risk deleting a shared thumbnail.
+            return set(thumbnail_paths)
 
     def get_top_k_entries(
-        self, text_emb: np.ndarray, k: int
-    ) -> list[tuple[str, str, str, float]] | None:
+        self,
+        text_emb: np.ndarray,
+        k: int,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        apps: list[str] | None = None,
+        quantized: bool | None = None,
+        approximate: bool | None = None,
+    ) -> list[tuple[str, str, str, float, str | None]] | None:
         """
         Get top k similar image entries given a text query.
 
+        The filters are applied by sqlite-vec during the KNN scan, so a narrow query
+        still returns up to `k` matches instead of filtering a global top k.
+
+        With the quantized index, the binary `vec_idx_bin` table is scanned for
+        `k * RERANK_FACTOR` candidates by Hamming distance, and only those candidates
+        are re-ranked by exact cosine distance against `vec_idx`.
+
         Args:
             query (str): Text query against which the top `k` similar images are retrieved.
             k (int): Number of images to retrieve from the database.
+            since (datetime, optional): Only images captured at or after this time.
+            until (datetime, optional): Only images captured before this time.
+            apps (list[str], optional): Only images of these applications (case-insensitive).
+            quantized (bool, optional): Use the two-tier quantized index. Defaults to
+                the QUANTIZED_INDEX setting.
+            approximate (bool, optional): Search the HNSW graph; only unfiltered
+                searches can. Defaults to doing so when the HNSW_INDEX setting is on
+                and the graph holds at least HNSW_MIN_ROWS entries.
         Returns:
             tuple | None: A tuple having info of top k entries or None if the database is empty.
         """
+        if quantized is None:
+            quantized = settings.QUANTIZED_INDEX
+        since, until = as_utc(since), as_utc(until)
         conn = self._get_connection()
         try:
-            top_k_entries = conn.execute(
-                """
-                    SELECT
-                        img_info.image_path,
-                        img_info.application_name,
-                        img_info.timestamp,
-                        distance
-                    FROM vec_idx
-                    LEFT JOIN img_info ON vec_idx.id = img_info.id
-                    WHERE embedding MATCH ?
-                        AND k = ?
-                    ORDER BY distance
-                """,
-                (text_emb.astype(np.float32), k),
-            ).fetchall()
+            hits = self._vector_hits(
+                conn, text_emb, k, since, until, apps, quantized, approximate
+            )
+            with _SEARCH_SECONDS["join", "binary" if quantized else "float"].time():
+                top_k_entries = self._fetch_entries(conn, hits)
+
             if top_k_entries:
                 logger.info(f"Fetched top {k} entries from the database.")
             else:
@@ -153,6 +642,317 @@ class Database:
             logger.error(f"Unexpected error during query execution: {e}")
             raise
 
+    def get_top_k_hybrid(
+        self,
+        text_emb: np.ndarray,
+        text_query: str,
+        k: int,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        apps: list[str] | None = None,
+        quantized: bool | None = None,
+        approximate: bool | None = None,
+    ) -> list[tuple[str, str, str, float | None, str | None]] | None:
+        """
+        Get the top k entries for a text query by both embedding and OCR text.
+
+        The KNN ranking and the BM25 ranking of the recognized text are fused with
+        reciprocal rank fusion, so exact strings (error codes, file names, URLs)
+        found by the inverted index rank high even when CLIP misses them.
+
+        Args:
+            text_emb (np.ndarray): The encoded text query.
+            text_query (str): The raw text query, matched against the OCR text.
+            k (int): Number of images to retrieve from the database.
+            since (datetime, optional): Only images captured at or after this time.
+            until (datetime, optional): Only images captured before this time.
+            apps (list[str], optional): Only images of these applications (case-insensitive).
+            quantized (bool, optional): Use the two-tier quantized index. Defaults to
+                the QUANTIZED_INDEX setting.
+            approximate (bool, optional): Search the HNSW graph; only unfiltered
+                searches can. Defaults to doing so when the HNSW_INDEX setting is on
+                and the graph holds at least HNSW_MIN_ROWS entries.
+        Returns:
+            list | None: Entries like `get_top_k_entries`, with the KNN distance, or
+                None for entries found by their text only.
+        """
+        if quantized is None:
+            quantized = settings.QUANTIZED_INDEX
+        since, until = as_utc(since), as_utc(until)
+        conn = self._get_connection()
+        try:
+            vector_hits = self._vector_hits(
+                conn, text_emb, k, since, until, apps, quantized, approximate
+            )
+            with _SEARCH_SECONDS["bm25", "fts"].time():
+                text_hits = self._text_hits(conn, text_query, k, since, until, apps)
+            distances = dict(vector_hits)
+            fused = reciprocal_rank_fusion(
+                [[id_ for id_, _ in vector_hits], [id_ for id_, _ in text_hits]],
+                settings.RRF_K,
+            )[:k]
+            with _SEARCH_SECONDS["join", "fts"].time():
+                top_k_entries = self._fetch_entries(
+                    conn, [(id_, distances.get(id_)) for id_, _ in fused]
+                )
+            logger.info(
+                f"Fetched top {k} entries ({len(text_hits)} matched the OCR text)."
+            )
+            return top_k_entries
+        except sqlite3.Error as e:
+            logger.error(f"Error fetching top {k} hybrid entries: {e}")
+            return None
+
+    def get_top_k_text(
+        self,
+        text_query: str,
+        k: int,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        apps: list[str] | None = None,
+    ) -> list[tuple[str, str, str, float, str | None]] | None:
+        """
+        Get the top k entries whose OCR text matches a query.
+
+        Args:
+            text_query (str): The raw text query, matched against the OCR text.
+            k (int): Number of images to retrieve from the database.
+            since (datetime, optional): Only images captured at or after this time.
+            until (datetime, optional): Only images captured before this time.
+            apps (list[str], optional): Only images of these applications (case-insensitive).
+        Returns:
+            list | None: Entries like `get_top_k_entries`, with the BM25 score (lower
+                is better) in place of the distance.
+        """
+        since, until = as_utc(since), as_utc(until)
+        conn = self._get_connection()
+        try:
+            with _SEARCH_SECONDS["bm25", "fts"].time():
+                hits = self._text_hits(conn, text_query, k, since, until, apps)
+            with _SEARCH_SECONDS["join", "fts"].time():
+                return self._fetch_entries(conn, hits)
+        except sqlite3.Error as e:
+            logger.error(f"Error fetching top {k} text entries: {e}")
+            return None
+
+    def _vector_hits(
+        self,
+        conn: sqlite3.Connection,
+        text_emb: np.ndarray,
+        k: int,
+        since: datetime | None,
+        until: datetime | None,
+        apps: list[str] | None,
+        quantized: bool,
+        approximate: bool | None = None,
+    ) -> list[tuple[int, float]]:
+        """(id, distance) pairs of the `k` nearest entries, closest first."""
+        query_emb = text_emb.astype(np.float32)
+        ann = self._ann_for_search(approximate, bool(since or until or apps))
+        if ann is not None:
+            try:
+                with _SEARCH_SECONDS["knn", "hnsw"].time():
+                    return ann.search(query_emb, k)
+            except RuntimeError as e:
+                logger.warning(f"HNSW search failed; searching exactly: {e}")
+
+        if not quantized:
+            with _SEARCH_SECONDS["knn", "float"].time():
+                return self._knn(conn, "vec_idx", query_emb, k, since, until, apps)
+
+        with _SEARCH_SECONDS["knn", "binary"].time():
+            candidates = self._knn(
+                conn,
+                "vec_idx_bin",
+                query_emb,
+                k * settings.RERANK_FACTOR,
+                since,
+                until,
+                apps,
+            )
+        candidate_ids = [id_ for id_, _ in candidates]
+        with _SEARCH_SECONDS["rerank", "binary"].time():
+            return self._rerank(conn, query_emb, candidate_ids)[:k]
+
+    def _ann_for_search(
+        self, approximate: bool | None, filtered: bool
+    ) -> HnswIndex | None:
+        """The HNSW graph, if a search should use it."""
+        # The graph has no metadata, so filters are left to sqlite-vec.
+        if filtered or approximate is False:
+            return None
+        ann = self.ann_index(enabled=True if approximate else None)
+        if ann is None:
+            return None
+        if approximate is None and len(ann) < settings.HNSW_MIN_ROWS:
+            return None
+        return ann
+
+    @staticmethod
+    def _text_hits(
+        conn: sqlite3.Connection,
+        text_query: str,
+        k: int,
+        since: datetime | None,
+        until: datetime | None,
+        apps: list[str] | None,
+    ) -> list[tuple[int, float]]:
+        """(id, bm25) pairs of the `k` best OCR text matches, best first."""
+        match = fts_match_expression(text_query)
+        if not match:
+            return []
+        filters, params = ["ocr_text MATCH ?"], [match]
+        if since is not None:
+            filters.append("img_info.timestamp >= ?")
+            params.append(format_timestamp(since))
+        if until is not None:
+            filters.append("img_info.timestamp < ?")
+            params.append(format_timestamp(until))
+        if apps:
+            placeholders = ",".join("?" * len(apps))
+            # Uses idx_img_info_application_name, which is case-insensitive.
+            filters.append(
+                f"img_info.application_name COLLATE NOCASE IN ({placeholders})"
+            )
+            params += apps
+        return conn.execute(
+            f"""
+                SELECT ocr_text.rowid, bm25(ocr_text) AS score
+                FROM ocr_text
+                JOIN img_info ON img_info.id = ocr_text.rowid
+                WHERE {" AND ".join(filters)}
+                ORDER BY score
+                LIMIT ?
+            """,
+            [*params, k],
+        ).fetchall()
+
+    @staticmethod
+    def _knn(
+        conn: sqlite3.Connection,
+        table: str,
+        query_emb: np.ndarray,
+        k: int,
+        since: datetime | None,
+        until: datetime | None,
+        apps: list[str] | None,
+    ) -> list[tuple[int, float]]:
+        """Run a filtered KNN over a vec0 table and return (id, distance) pairs."""
+        filters, params = _metadata_filters(since, until)
+        # vec_idx_bin stores sign bits, so the query is quantized the same way.
+        match = "vec_quantize_binary(?)" if table == "vec_idx_bin" else "?"
+        # sqlite-vec only supports comparisons on metadata columns, so each
+        # application gets its own KNN and the results are merged.
+        app_filters = [None] if not apps else [app.lower() for app in apps]
+
+        hits = []
+        for app in app_filters:
+            query_filters, query_params = filters, params
+            if app is not None:
+                query_filters = filters + ["application_name = ?"]
+                query_params = params + [app]
+            where = "".join(f" AND {f}" for f in query_filters)
+            hits += conn.execute(
+                f"""
+                    SELECT id, distance
+                    FROM {table}
+                    WHERE embedding MATCH {match}
+                        AND k = ?{where}
+                """,
+                [query_emb, k, *query_params],
+            ).fetchall()
+        return sorted(hits, key=lambda hit: hit[1])[:k]
+
+    @staticmethod
+    def _rerank(
+        conn: sqlite3.Connection, query_emb: np.ndarray, ids: list[int]
+    ) -> list[tuple[int, float]]:
+        """Exact cosine distances for a set of candidate ids, closest first."""
+        if not ids:
+            return []
+        placeholders = ",".join("?" * len(ids))
+        hits = conn.execute(
+            f"""
+                SELECT id, vec_distance_cosine(embedding, ?) AS distance
+                FROM vec_idx
+                WHERE id IN ({placeholders})
+            """,
+            [query_emb, *ids],
+        ).fetchall()
+        return sorted(hits, key=lambda hit: hit[1])
+
+    @staticmethod
+    def _fetch_entries(
+        conn: sqlite3.Connection, hits: list[tuple[int, float | None]]
+    ) -> list[tuple[str, str, str, float | None, str | None]]:
+        """Join (id, distance) pairs with `img_info`, keeping their order."""
+        if not hits:
+            return []
+        placeholders = ",".join("?" * len(hits))
+        rows = {
+            row[0]: row[1:]
+            for row in conn.execute(
+                f"""
+                    SELECT id, image_path, application_name, timestamp, thumbnail_path
+                    FROM img_info
+                    WHERE id IN ({placeholders})
+                """,
+                [id_ for id_, _ in hits],
+            )
+        }
+        return [
+            (*rows[id_][:3], distance, rows[id_][3])
+            for id_, distance in hits
+            if id_ in rows
+        ]
+
+    def build_quantized_index(self, batch_size: int = 5000) -> int:
+        """
+        Fill `vec_idx_bin` with the binary quantization of every row of `vec_idx`
+        that is missing from it. Safe to re-run; each batch is its own write.
+
+        Args:
+            batch_size (int): Number of rows copied per write.
+        Returns:
+            int: Number of rows added.
+        """
+        conn = self._get_connection()
+        added = 0
+        try:
+            missing = [
+                row[0]
+                for row in conn.execute(
+                    """
+                        SELECT id FROM img_info
+                        WHERE id NOT IN (SELECT id FROM vec_idx_bin)
+                        ORDER BY id
+                    """
+                )
+            ]
+            for start in range(0, len(missing), batch_size):
+                batch = missing[start : start + batch_size]
+                placeholders = ",".join("?" * len(batch))
+                self._write(
+                    lambda conn, batch=batch, placeholders=placeholders: conn.execute(
+                        f"""
+                            INSERT INTO vec_idx_bin (id, embedding, captured_at, application_name)
+                            SELECT
+                                id,
+                                vec_quantize_binary(embedding),
+                                captured_at,
+                                application_name
+                            FROM vec_idx
+                            WHERE id IN ({placeholders})
+                        """,
+                        batch,
+                    )
+                ).result()
+                added += len(batch)
+                logger.info(f"Quantized {added}/{len(missing)} embeddings.")
+        except sqlite3.Error as e:
+            logger.error(f"Error building the quantized index: {e}")
+        return added
+
     def get_last_entry(self) -> tuple[bytes, str] | None:
         """
         Get last entry ordered by timestamp.
@@ -162,15 +962,18 @@ class Database:
         """
         conn = self._get_connection()
         try:
+            # Walks idx_img_info_timestamp backwards instead of sorting the join.
             last_entry = conn.execute(
                 """
                     SELECT
                         vec_idx.embedding,
                         img_info.image_path
-                    FROM vec_idx
-                    LEFT JOIN img_info ON vec_idx.id = img_info.id
-                    ORDER BY img_info.timestamp DESC
-                    LIMIT 1;
+                    FROM (
+                        SELECT id, image_path FROM img_info
+                        ORDER BY timestamp DESC
+                        LIMIT 1
+                    ) AS img_info
+                    JOIN vec_idx ON vec_idx.id = img_info.id;
                 """
             ).fetchone()
             if last_entry:
@@ -185,21 +988,329 @@ class Database:
             logger.error(f"Unexpected error while fetching the last entry: {e}")
             raise
 
+    def set_thumbnail_path(self, image_path: str, thumbnail_path: str) -> None:
+        """
+        Record the thumbnail of an image created after the image was inserted.
+
+        Args:
+            image_path (str): The image path.
+            thumbnail_path (str): The path of the image's thumbnail.
+        """
+        try:
+            self._write(
+                lambda conn: conn.execute(
+                    "UPDATE img_info SET thumbnail_path = ? WHERE image_path = ?",
+                    (thumbnail_path, image_path),
+                )
+            ).result()
+        except sqlite3.Error as e:
+            logger.error(f"Error recording thumbnail for {image_path}: {e}")
+
+    def get_last_embeddings(self, n: int) -> list[np.ndarray]:
+        """
+        Get the embeddings of the last `n` entries, oldest first.
+
+        Rows are ordered by id, which follows insertion order and is the primary key
+        of both tables, so no sort over `img_info.timestamp` is needed.
+
+        Args:
+            n (int): Number of embeddings to fetch.
+        Returns:
+            list[np.ndarray]: The embeddings (empty if the database is empty or on error).
+        """
+        conn = self._get_connection()
+        try:
+            rows = conn.execute(
+                """
+                    SELECT embedding
+                    FROM vec_idx
+                    WHERE id IN (SELECT id FROM img_info ORDER BY id DESC LIMIT ?)
+                    ORDER BY id
+                """,
+                (n,),
+            ).fetchall()
+            return [deserialize(row[0]) for row in rows]
+        except sqlite3.Error as e:
+            logger.error(f"Error retrieving the last {n} embeddings: {e}")
+            return []
+
+    def get_cached_query_emb(self, model_id: str, query: str) -> np.ndarray | None:
+        """
+        Get a cached text query embedding.
+
+        Args:
+            model_id (str): Identity of the model that produced the embedding.
+            query (str): The normalized text query.
+        Returns:
+            np.ndarray | None: The embedding, or None if it is not cached.
+        """
+        conn = self._get_connection()
+        try:
+            row = conn.execute(
+                """
+                    SELECT embedding FROM query_cache
+                    WHERE model_id = ? AND query = ?
+                """,
+                (model_id, query),
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.debug(f"Query cache lookup failed: {e}")
+            return None
+        if row is None:
+            return None
+        # The search does not wait for the recency update to commit.
+        self._write(
+            lambda conn: conn.execute(
+                """
+                    UPDATE query_cache SET last_used = datetime('now')
+                    WHERE model_id = ? AND query = ?
+                """,
+                (model_id, query),
+            )
+        ).add_done_callback(_log_cache_error)
+        return deserialize(row[0])
+
+    def put_cached_query_emb(
+        self,
+        model_id: str,
+        query: str,
+        text_emb: np.ndarray,
+        max_entries: int = 10000,
+    ) -> None:
+        """
+        Store a text query embedding, evicting the least recently used entries beyond `max_entries`.
+
+        The write is queued and not waited for.
+
+        Args:
+            model_id (str): Identity of the model that produced the embedding.
+            query (str): The normalized text query.
+            text_emb (np.ndarray): The text embedding.
+            max_entries (int): Maximum number of cached embeddings kept on disk.
+        """
+        embedding = text_emb.astype(np.float32).tobytes()
+
+        def put(conn: sqlite3.Connection) -> None:
+            conn.execute(
+                """
+                    INSERT OR REPLACE INTO query_cache (model_id, query, embedding, last_used)
+                    VALUES (?, ?, ?, datetime('now'))
+                """,
+                (model_id, query, embedding),
+            )
+            conn.execute(
+                """
+                    DELETE FROM query_cache WHERE rowid NOT IN (
+                        SELECT rowid FROM query_cache ORDER BY last_used DESC LIMIT ?
+                    )
+                """,
+                (max_entries,),
+            )
+
+        self._write(put).add_done_callback(_log_cache_error)
+
+    def get_retention_batch(
+        self,
+        below_level: int,
+        before: datetime,
+        limit: int,
+        with_embeddings: bool = False,
+    ) -> list[tuple]:
+        """
+        Get the oldest entries that the compactor has not yet brought to a retention level.
+
+        Args:
+            below_level (int): Only entries whose retention level is below this.
+            before (datetime): Only entries captured before this time.
+            limit (int): Maximum number of entries.
+            with_embeddings (bool): Also return each entry's embedding.
+        Returns:
+            list[tuple]: (id, image_path, thumbnail_path, application_name[, embedding])
+                rows in id order.
+        """
+        conn = self._get_connection()
+        try:
+            rows = conn.execute(
+                """
+                    SELECT id, image_path, thumbnail_path, application_name
+                    FROM img_info
+                    WHERE retention_level < ? AND timestamp < ?
+                    ORDER BY id
+                    LIMIT ?
+                """,
+                (below_level, format_timestamp(before), limit),
+            ).fetchall()
+            if not with_embeddings or not rows:
+                return rows
+
+            placeholders = ",".join("?" * len(rows))
+            embs = dict(
+                conn.execute(
+                    f"SELECT id, embedding FROM vec_idx WHERE id IN ({placeholders})",
+                    [row[0] for row in rows],
+                ).fetchall()
+            )
+            return [
+                (*row, deserialize(embs[row[0]])) for row in rows if row[0] in embs
+            ]
+        except sqlite3.Error as e:
+            logger.error(f"Error fetching entries for retention: {e}")
+            return []
+
+    def set_retention_level(self, ids: list[int], level: int) -> None:
+        """
+        Record that entries have been processed up to a retention level.
+
+        Args:
+            ids (list[int]): The entry ids.
+            level (int): The retention level reached.
+        """
+        if not ids:
+            return
+        try:
+            self._write(
+                lambda conn: conn.executemany(
+                    "UPDATE img_info SET retention_level = ? WHERE id = ?",
+                    [(level, id_) for id_ in ids],
+                )
+            ).result()
+        except sqlite3.Error as e:
+            logger.error(f"Error updating retention levels: {e}")
+
+    def archive_entry(self, id_: int, archived_path: str, level: int) -> None:
+        """
+        Point an entry at its archived copy once the full screenshot is deleted.
+
+        Args:
+            id_ (int): The entry id.
+            archived_path (str): Path of the archived (thumbnail-sized) image.
+            level (int): The retention level reached.
+        """
+        try:
+            self._write(
+                lambda conn: conn.execute(
+                    """
+                        UPDATE img_info
+                        SET image_path = ?, thumbnail_path = ?, retention_level = ?
+                        WHERE id = ?
+                    """,
+                    (archived_path, archived_path, level, id_),
+                )
+            ).result()
+        except sqlite3.Error as e:
+            logger.error(f"Error archiving entry {id_}: {e}")
+            raise
+
+    def delete_entries(self, ids: list[int]) -> list[tuple[str, str | None]]:
+        """
+        Delete entries from every table in a single transaction.
+
+        The image files are left in place; the caller removes them once the
+        transaction has committed.
+
+        Args:
+            ids (list[int]): The entry ids.
+        Returns:
+            list[tuple[str, str | None]]: (image_path, thumbnail_path) of the deleted entries.
+        """
+        if not ids:
+            return []
+        placeholders = ",".join("?" * len(ids))
+
+        def delete(conn: sqlite3.Connection) -> list[tuple[str, str | None]]:
+            paths = conn.execute(
+                f"""
+                    SELECT image_path, thumbnail_path
+                    FROM img_info
+                    WHERE id IN ({placeholders})
+                """,
+                ids,
+            ).fetchall()
+            conn.execute(f"DELETE FROM vec_idx WHERE id IN ({placeholders})", ids)
+            conn.execute(f"DELETE FROM vec_idx_bin WHERE id IN ({placeholders})", ids)
+            conn.execute(f"DELETE FROM ocr_text WHERE rowid IN ({placeholders})", ids)
+            conn.execute(f"DELETE FROM img_info WHERE id IN ({placeholders})", ids)
+            return paths
+
+        try:
+            paths = self._write(delete).result()
+        except sqlite3.Error as e:
+            logger.error(f"Error deleting entries: {e}")
+            return []
+        if self._ann is not None:
+            self._ann.remove(ids)
+        return paths
+
+    def set_ocr_text(self, id_: int, text: str) -> None:
+        """
+        Store the text recognized in an entry's screenshot.
+
+        Args:
+            id_ (int): The entry id.
+            text (str): The recognized text; empty marks the entry as processed.
+        """
+
+        def store(conn: sqlite3.Connection) -> None:
+            # FTS5 tables have no unique constraint to upsert on.
+            conn.execute("DELETE FROM ocr_text WHERE rowid = ?", (id_,))
+            conn.execute(
+                "INSERT INTO ocr_text (rowid, text) VALUES (?, ?)", (id_, text)
+            )
+
+        try:
+            self._write(store).result()
+        except sqlite3.Error as e:
+            logger.error(f"Error storing OCR text of entry {id_}: {e}")
+
+    def get_entries_without_text(self, limit: int) -> list[tuple[int, str]]:
+        """
+        Get entries whose full screenshot has not been through OCR yet.
+
+        Args:
+            limit (int): Maximum number of entries.
+        Returns:
+            list[tuple[int, str]]: (id, image_path) pairs, oldest first.
+        """
+        conn = self._get_connection()
+        try:
+            # Entries reduced to a thumbnail by the compactor are too small to read.
+            return conn.execute(
+                """
+                    SELECT id, image_path
+                    FROM img_info
+                    WHERE id NOT IN (SELECT rowid FROM ocr_text)
+                        AND retention_level < 2
+                    ORDER BY id
+                    LIMIT ?
+                """,
+                (limit,),
+            ).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Error fetching entries without OCR text: {e}")
+            return []
+
     def purge_entries(self) -> None:
         """
         Purge all entries from the database.
 
         Clears all records from both `img_info` and `vec_idx` tables.
         """
-        conn = self._get_connection()
-        try:
+
+        def purge(conn: sqlite3.Connection) -> None:
             conn.execute("DELETE FROM img_info;")
             conn.execute("DELETE FROM vec_idx;")
-            conn.commit()
+            conn.execute("DELETE FROM vec_idx_bin;")
+            conn.execute("DELETE FROM ocr_text;")
+
+        try:
+            self._write(purge).result()
+            if self._ann is not None:
+                self._ann.clear()
+            elif os.path.exists(index_path(self.db_file)):
+                os.remove(index_path(self.db_file))
             logger.info("All entries purged from the database.")
         except sqlite3.Error as e:
             logger.error(f"Error purging entries: {e}")
-            conn.rollback()
         except Exception as e:
             logger.error(f"Unexpected error during purge: {e}")
             raise
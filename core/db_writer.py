@@ -0,0 +1,174 @@
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable
+
+from config import settings
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+_COMMIT_SECONDS = registry.histogram(
+    "smarn_db_commit_seconds", "Duration of a group commit, jobs included."
+)
+_COMMIT_JOBS = registry.histogram(
+    "smarn_db_commit_jobs",
+    "Write jobs per group commit.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+
+Job = Callable[[sqlite3.Connection], Any]
+
+
+class DbWriter:
+    """
+    The single thread that writes to a database.
+
+    Write jobs are queued from any thread. The writer runs every job queued at
+    the time (waiting up to `max_delay` for stragglers) in one transaction, so a
+    burst of inserts costs one commit and one WAL sync. Each job runs in its own
+    savepoint: a failing job is rolled back alone and only its future fails.
+
+    Jobs get the writer's connection and must not commit or roll back themselves.
+
+    If the write connection cannot be opened, the queued jobs fail with the
+    error and so does every later `submit`.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], sqlite3.Connection],
+        max_batch: int = settings.DB_COMMIT_BATCH,
+        max_delay: float = settings.DB_COMMIT_DELAY,
+    ):
+        """
+        Args:
+            connect (Callable[[], sqlite3.Connection]): Opens the write connection.
+            max_batch (int): Maximum number of jobs per transaction.
+            max_delay (float): Seconds to wait for more jobs before committing.
+        """
+        self._connect = connect
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: queue.Queue = queue.Queue()
+        # Set when the thread could not open its connection; guarded by `_lock`
+        # so no job is queued after the queue has been failed.
+        self._error: sqlite3.Error | None = None
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(
+            target=self._run, name="smarn-db-writer", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, job: Job) -> Future:
+        """
+        Queue a write job.
+
+        Args:
+            job (Callable[[sqlite3.Connection], Any]): Runs the statements.
+        Returns:
+            Future: Resolves to the job's return value once it has been committed.
+        Raises:
+            sqlite3.Error: If the writer could not open the database.
+        """
+        future: Future = Future()
+        with self._lock:
+            if self._error is not None:
+                raise self._error
+            self._queue.put((job, future))
+        return future
+
+    def flush(self) -> None:
+        """Block until every job queued so far has been committed (or has failed)."""
+        try:
+            self.submit(lambda conn: None).result()
+        except sqlite3.Error:
+            # A writer that failed to start has failed every job already.
+            if self._error is None:
+                raise
+
+    def close(self) -> None:
+        """Commit the queued jobs, then stop the thread and close its connection."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        try:
+            conn = self._connect()
+        except Exception as e:
+            logger.error(f"Could not open the database for writing: {e}")
+            self._fail(e)
+            return
+        closing = False
+        while not closing:
+            job = self._queue.get()
+            if job is None:
+                break
+            batch = [job]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        job = self._queue.get(timeout=remaining)
+                    else:
+                        job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    closing = True
+                    break
+                batch.append(job)
+            with _COMMIT_SECONDS.time():
+                self._commit(conn, batch)
+            _COMMIT_JOBS.observe(len(batch))
+        conn.close()
+
+    def _fail(self, cause: Exception) -> None:
+        """Fail the queued jobs and refuse new ones."""
+        error = sqlite3.OperationalError(f"The database writer is not running: {cause}")
+        error.__cause__ = cause
+        with self._lock:
+            self._error = error
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if job is not None:
+                job[1].set_exception(error)
+
+    @staticmethod
+    def _commit(conn: sqlite3.Connection, batch: list[tuple[Job, Future]]) -> None:
+        results = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for job, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                conn.execute("SAVEPOINT job")
+                try:
+                    result = job(conn)
+                except Exception as e:
+                    conn.execute("ROLLBACK TO job")
+                    conn.execute("RELEASE job")
+                    future.set_exception(e)
+                    continue
+                conn.execute("RELEASE job")
+                results.append((future, result))
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Error committing {len(batch)} database writes: {e}")
+            if conn.in_transaction:
+                conn.rollback()
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for future, result in results:
+            future.set_result(result)
@@ -1,31 +1,171 @@
+from datetime import datetime
 from typing import List, Dict, Any
-from .db import Database
-from .model import model
 
-db = Database()
+import numpy as np
 
+from config import settings
 
-def search_images(text_query: str) -> List[Dict[str, Any]]:
+from .metrics import registry
+from .model import inference, model
+from .query_cache import QueryEmbeddingCache
+from .shards import ShardedDatabase
+
+db = ShardedDatabase()
+query_cache = QueryEmbeddingCache(model.model_id)
+
+_TEXT_ENCODE_SECONDS = registry.histogram(
+    "smarn_search_text_encode_seconds",
+    "Time to embed a text query, including query cache lookups.",
+)
+_PAGE_SECONDS = registry.histogram(
+    "smarn_search_page_seconds",
+    "Time to fetch a page of search results, including any index query.",
+)
+
+PAGE_SIZE = settings.SEARCH_PAGE_SIZE
+# sqlite-vec caps the k of a KNN query.
+MAX_K = 4096
+
+
+class SearchCursor:
     """
-    Search for images based on a text query.
+    Pages through the results of a text query.
+
+    The query is encoded once. sqlite-vec KNN queries have no offset, so the cursor
+    fetches several pages per query and serves pages from that buffer; only when it
+    runs dry is the KNN re-run with a doubled `k`, skipping results already served.
+    Browsing `n` pages therefore costs O(log n) index scans and no extra encoding.
+    """
+
+    def __init__(
+        self,
+        text_emb: np.ndarray,
+        page_size: int = PAGE_SIZE,
+        prefetch_pages: int = 4,
+        text_query: str | None = None,
+        **filters,
+    ):
+        """
+        Args:
+            text_emb (np.ndarray): The encoded text query.
+            page_size (int): Results per page.
+            prefetch_pages (int): Pages fetched by the first KNN query.
+            text_query (str, optional): The raw query; when given, results are also
+                ranked by the OCR text and the two rankings are fused.
+            **filters: `since`/`until`/`apps` filters passed to the database.
+        """
+        self.text_emb = text_emb
+        self.text_query = text_query
+        self.page_size = page_size
+        self.filters = filters
+        self.exhausted = False
+        self._k = page_size * prefetch_pages
+        self._buffer: List[Dict[str, Any]] = []
+        self._served: set[str] = set()
+
+    def next_page(self) -> List[Dict[str, Any]]:
+        """
+        Get the next page of results.
+
+        Returns:
+            List[Dict[str, Any]]: Up to `page_size` results; empty once exhausted.
+        """
+        with _PAGE_SECONDS.time():
+            if len(self._buffer) < self.page_size and not self.exhausted:
+                self._refill()
+
+        page, self._buffer = (
+            self._buffer[: self.page_size],
+            self._buffer[self.page_size :],
+        )
+        self._served.update(item["image_path"] for item in page)
+        return page
+
+    @property
+    def has_more(self) -> bool:
+        return bool(self._buffer) or not self.exhausted
+
+    def _refill(self) -> None:
+        if self.text_query:
+            results = db.get_top_k_hybrid(
+                self.text_emb, self.text_query, self._k, **self.filters
+            )
+        else:
+            results = db.get_top_k_entries(self.text_emb, self._k, **self.filters)
+        results = results or []
+        if len(results) < self._k or self._k >= MAX_K:
+            self.exhausted = True
+
+        buffered = {item["image_path"] for item in self._buffer}
+        self._buffer += [
+            item
+            for item in map(_to_metadata, results)
+            if item["image_path"] not in self._served
+            and item["image_path"] not in buffered
+        ]
+        self._k = min(self._k * 2, MAX_K)
+
+
+def open_search(
+    text_query: str,
+    page_size: int = PAGE_SIZE,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    apps: List[str] | None = None,
+) -> SearchCursor | None:
+    """
+    Encode a text query and open a cursor over its results.
+
+    Args:
+        text_query (str): The text query.
+        page_size (int): Results per page.
+        since (datetime, optional): Only images captured at or after this time.
+        until (datetime, optional): Only images captured before this time.
+        apps (List[str], optional): Only images of these applications (case-insensitive).
+    Returns:
+        SearchCursor | None: The cursor, or None for an empty query.
     """
     if not text_query or not text_query.strip():
-        return []
+        return None
 
-    text_emb = model.get_text_embs(text_query)
-    results = db.get_top_k_entries(text_emb, 9)
+    with _TEXT_ENCODE_SECONDS.time():
+        text_emb = query_cache.get_or_compute(text_query, inference.embed_text)
+    return SearchCursor(
+        text_emb,
+        page_size=page_size,
+        text_query=text_query if settings.HYBRID_SEARCH else None,
+        since=since,
+        until=until,
+        apps=apps,
+    )
 
-    if not results:
+
+def search_images(
+    text_query: str,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    apps: List[str] | None = None,
+) -> List[Dict[str, Any]]:
+    """
+    Search for images based on a text query.
+
+    Args:
+        text_query (str): The text query.
+        since (datetime, optional): Only images captured at or after this time.
+        until (datetime, optional): Only images captured before this time.
+        apps (List[str], optional): Only images of these applications (case-insensitive).
+    """
+    cursor = open_search(text_query, since=since, until=until, apps=apps)
+    if cursor is None:
         return []
+    return cursor.next_page()
+
 
-    image_list_with_metadata = []
-    for entry in results:
-        metadata = {
-            "image_path": entry[0],
-            "application_name": entry[1],
-            "timestamp": entry[2],
-            "distance": entry[3],
-        }
-        image_list_with_metadata.append(metadata)
-
-    return image_list_with_metadata
+def _to_metadata(entry: tuple) -> Dict[str, Any]:
+    return {
+        "image_path": entry[0],
+        "application_name": entry[1],
+        "timestamp": entry[2],
+        "distance": entry[3],
+        "thumbnail_path": entry[4],
+    }
@@ -0,0 +1,303 @@
+"""
+A small in-process metrics registry with a Prometheus text file exporter.
+
+Metrics are cheap to update from any thread. `MetricsWriter` renders the registry
+to a `.prom` file every few seconds, which node_exporter's textfile collector (or
+a plain `cat`) can pick up; nothing listens on the network.
+"""
+
+import logging
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets.
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60,
+)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: dict[str, str], extra: dict[str, str] | None = None) -> str:
+    merged = {**labels, **(extra or {})}
+    if not merged:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in merged.items()) + "}"
+
+
+class Counter:
+    """A monotonically increasing count, or one read from a function when rendered."""
+
+    kind = "counter"
+
+    def __init__(self, labels: dict[str, str], fn: Callable[[], float] | None = None):
+        self.labels = labels
+        self._value = 0.0
+        self._fn = fn
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._fn() if self._fn is not None else self._value
+
+    def samples(self, name: str) -> Iterator[str]:
+        yield f"{name}{_format_labels(self.labels)} {self.value}"
+
+
+class Gauge:
+    """A value that can go up and down, or is read from a function when rendered."""
+
+    kind = "gauge"
+
+    def __init__(self, labels: dict[str, str], fn: Callable[[], float] | None = None):
+        self.labels = labels
+        self._value = 0.0
+        self._fn = fn
+
+    def set(self, value: float) -> None:
+        self._value = value
+
+    @property
+    def value(self) -> float | None:
+        return self._fn() if self._fn is not None else self._value
+
+    def samples(self, name: str) -> Iterator[str]:
+        value = self.value
+        if value is not None:
+            yield f"{name}{_format_labels(self.labels)} {value}"
+
+
+class Histogram:
+    """Distribution of observed values (latencies in seconds, by default)."""
+
+    kind = "histogram"
+
+    def __init__(self, labels: dict[str, str], buckets: tuple = LATENCY_BUCKETS):
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * len(self.buckets)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self._sum += value
+            self._count += 1
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self._counts[i] += 1
+                    break
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """Observe the duration of a `with` block."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def samples(self, name: str) -> Iterator[str]:
+        with self._lock:
+            counts, total, count = list(self._counts), self._sum, self._count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.labels, {"le": f"{bound}"})
+            yield f"{name}_bucket{labels} {cumulative}"
+        yield f"{name}_bucket{_format_labels(self.labels, {'le': '+Inf'})} {count}"
+        yield f"{name}_sum{_format_labels(self.labels)} {total}"
+        yield f"{name}_count{_format_labels(self.labels)} {count}"
+
+
+class MetricsRegistry:
+    """
+    Named metrics, each optionally split by labels.
+
+    `counter`, `gauge` and `histogram` return the existing metric for a name and
+    label set, so call sites can look metrics up instead of holding on to them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # name -> (kind, help, {sorted label items: metric})
+        self._families: dict[str, tuple[str, str, dict]] = {}
+
+    def _get(self, cls, name: str, help: str, labels: dict | None, **kwargs):
+        labels = labels or {}
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            kind, _, metrics = self._families.setdefault(name, (cls.kind, help, {}))
+            if kind != cls.kind:
+                raise ValueError(f"Metric {name} is a {kind}, not a {cls.kind}")
+            if key not in metrics or kwargs.get("fn") is not None:
+                metrics[key] = cls(labels, **kwargs)
+            return metrics[key]
+
+    def counter(
+        self,
+        name: str,
+        help: str = "",
+        labels: dict | None = None,
+        fn: Callable[[], float] | None = None,
+    ) -> Counter:
+        return self._get(Counter, name, help, labels, fn=fn)
+
+    def gauge(
+        self,
+        name: str,
+        help: str = "",
+        labels: dict | None = None,
+        fn: Callable[[], float] | None = None,
+    ) -> Gauge:
+        """
+        Args:
+            name (str): Metric name.
+            help (str): Description shown in the exported file.
+            labels (dict, optional): Label values of this series.
+            fn (Callable[[], float], optional): Read the value from this function at
+                render time; replaces an existing series with the same labels.
+        Returns:
+            Gauge: The gauge.
+        """
+        return self._get(Gauge, name, help, labels, fn=fn)
+
+    def histogram(
+        self,
+        name: str,
+        help: str = "",
+        labels: dict | None = None,
+        buckets: tuple = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        with self._lock:
+            families = [
+                (name, kind, help, list(metrics.values()))
+                for name, (kind, help, metrics) in sorted(self._families.items())
+            ]
+        lines = []
+        for name, kind, help, metrics in families:
+            if help:
+                lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for metric in metrics:
+                try:
+                    lines.extend(metric.samples(name))
+                except Exception as e:
+                    logger.debug(f"Could not read metric {name}: {e}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str) -> None:
+        """
+        Atomically write the rendered metrics to a file.
+
+        Args:
+            path (str): Destination, conventionally ending in `.prom`.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+
+registry = MetricsRegistry()
+
+
+def process_rss_bytes() -> int:
+    """Resident set size of this process (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is in KiB on Linux.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _register_process_metrics() -> None:
+    registry.gauge(
+        "smarn_process_resident_memory_bytes",
+        "Resident memory of the process.",
+        fn=process_rss_bytes,
+    )
+    registry.counter(
+        "smarn_process_cpu_seconds_total",
+        "User and system CPU time of the process.",
+        fn=lambda: sum(os.times()[:2]),
+    )
+
+
+_register_process_metrics()
+
+
+class MetricsWriter:
+    """Periodically writes the registry to `<METRICS_DIR>/smarn-<role>.prom`."""
+
+    def __init__(
+        self,
+        role: str,
+        metrics_dir: str = settings.METRICS_DIR,
+        interval: float = settings.METRICS_INTERVAL,
+    ):
+        """
+        Args:
+            role (str): Name of the process ("service", "gui"), so processes do not
+                overwrite each other's file.
+            metrics_dir (str): Output directory; empty disables the writer.
+            interval (float): Seconds between writes.
+        """
+        self.path = None
+        if metrics_dir:
+            self.path = os.path.join(metrics_dir, f"smarn-{role}.prom")
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def write(self) -> None:
+        if self.path is None:
+            return
+        try:
+            registry.write_textfile(self.path)
+        except OSError as e:
+            logger.error(f"Error writing metrics to {self.path}: {e}")
+
+    def start(self) -> None:
+        if self.path is None:
+            return
+
+        def loop():
+            while not self._stop_event.wait(self.interval):
+                self.write()
+
+        self._thread = threading.Thread(target=loop, name="smarn-metrics", daemon=True)
+        self._thread.start()
+        logger.info(f"Writing metrics to {self.path} every {self.interval:g}s.")
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        # Leave the final values behind.
+        self.write()
@@ -0,0 +1,252 @@
+"""
+Schema migrations, tracked with SQLite's `user_version`.
+
+Each migration upgrades the schema by one version and runs in the same
+transaction as the version bump, so a database is never left half-upgraded.
+Databases created before versioning (user_version 0) may already have some of
+the tables, so the early migrations only create what is missing.
+
+To change the schema, append a migration; never edit one that has shipped.
+"""
+
+import logging
+import sqlite3
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+Migration = Callable[[sqlite3.Connection], None]
+
+# Rows copied per statement by `_quantized_index`; stays under SQLite's limit on
+# bound parameters.
+_QUANTIZE_BATCH = 500
+
+
+def _ensure_column(conn: sqlite3.Connection, table: str, column: str, decl: str) -> None:
+    """Add a column to a table created by an older version, if it is missing."""
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+    if column not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+        logger.info(f"Added column {column} to {table}.")
+
+
+def _create_vec_idx(conn: sqlite3.Connection) -> None:
+    """
+    Create the vector index, rebuilding one created by an older version.
+
+    `captured_at` (unix seconds) and `application_name` (lowercased) are vec0
+    metadata columns, so KNN queries can filter on them during the scan.
+    """
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'vec_idx'").fetchone()
+    if row is not None and "captured_at" in row[0]:
+        return
+
+    if row is not None:
+        # vec0 tables cannot be altered; copy the embeddings out and back in.
+        logger.info("Rebuilding vec_idx with metadata columns.")
+        conn.execute(
+            "CREATE TEMP TABLE vec_idx_backup AS SELECT id, embedding FROM vec_idx"
+        )
+        conn.execute("DROP TABLE vec_idx")
+
+    conn.execute(
+        """
+            CREATE VIRTUAL TABLE vec_idx USING vec0 (
+                id INTEGER PRIMARY KEY,
+                embedding FLOAT[768] distance_metric=cosine,
+                captured_at INTEGER,
+                application_name TEXT
+            );
+        """
+    )
+
+    if row is not None:
+        conn.execute(
+            """
+                INSERT INTO vec_idx (id, embedding, captured_at, application_name)
+                SELECT
+                    vec_idx_backup.id,
+                    vec_idx_backup.embedding,
+                    CAST(strftime('%s', img_info.timestamp) AS INTEGER),
+                    lower(COALESCE(img_info.application_name, ''))
+                FROM vec_idx_backup
+                JOIN img_info ON vec_idx_backup.id = img_info.id
+            """
+        )
+        conn.execute("DROP TABLE vec_idx_backup")
+
+
+def _base_schema(conn: sqlite3.Connection) -> None:
+    """Entries, the vector index and the query cache."""
+    conn.execute(
+        """
+            CREATE TABLE IF NOT EXISTS img_info (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                image_path TEXT NOT NULL,
+                application_name TEXT,
+                timestamp TIMESTAMP NOT NULL,
+                thumbnail_path TEXT,
+                retention_level INTEGER NOT NULL DEFAULT 0
+            );
+        """
+    )
+    _ensure_column(conn, "img_info", "thumbnail_path", "TEXT")
+    _ensure_column(conn, "img_info", "retention_level", "INTEGER NOT NULL DEFAULT 0")
+    _create_vec_idx(conn)
+    _create_query_cache(conn)
+
+
+def _create_query_cache(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+            CREATE TABLE IF NOT EXISTS query_cache (
+                model_id TEXT NOT NULL,
+                query TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                last_used TIMESTAMP NOT NULL,
+                PRIMARY KEY (model_id, query)
+            );
+        """
+    )
+
+
+def _quantized_index(conn: sqlite3.Connection) -> None:
+    """The binary-quantized coarse index used by two-tier search."""
+    conn.execute(
+        """
+            CREATE VIRTUAL TABLE IF NOT EXISTS vec_idx_bin USING vec0 (
+                id INTEGER PRIMARY KEY,
+                embedding BIT[768],
+                captured_at INTEGER,
+                application_name TEXT
+            );
+        """
+    )
+    # vec0 rejects a float vector in an INSERT ... SELECT whose WHERE clause
+    # scans the BIT table, so look up the missing ids first (as
+    # `Database.build_quantized_index` does) and copy them over by id.
+    missing = [
+        row[0]
+        for row in conn.execute(
+            "SELECT id FROM vec_idx WHERE id NOT IN (SELECT id FROM vec_idx_bin)"
+        )
+    ]
+    for start in range(0, len(missing), _QUANTIZE_BATCH):
+        batch = missing[start : start + _QUANTIZE_BATCH]
+        placeholders = ",".join("?" * len(batch))
+        conn.execute(
+            f"""
+                INSERT INTO vec_idx_bin (id, embedding, captured_at, application_name)
+                SELECT id, vec_quantize_binary(embedding), captured_at, application_name
+                FROM vec_idx
+                WHERE id IN ({placeholders})
+            """,
+            batch,
+        )
+
+
+def _ocr_text(conn: sqlite3.Connection) -> None:
+    """Text recognized in each screenshot, keyed by img_info id (rowid)."""
+    conn.execute(
+        """
+            CREATE VIRTUAL TABLE IF NOT EXISTS ocr_text USING fts5 (
+                text,
+                tokenize = "unicode61 remove_diacritics 2"
+            );
+        """
+    )
+
+
+def _indexes(conn: sqlite3.Connection) -> None:
+    """Indexes for the lookups that used to scan `img_info` and `query_cache`."""
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_img_info_timestamp ON img_info (timestamp)"
+    )
+    conn.execute(
+        """
+            CREATE INDEX IF NOT EXISTS idx_img_info_application_name
+            ON img_info (application_name COLLATE NOCASE, timestamp)
+        """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_img_info_image_path ON img_info (image_path)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_query_cache_last_used ON query_cache (last_used)"
+    )
+
+
+def _thumbnail_index(conn: sqlite3.Connection) -> None:
+    """Index of the thumbnail paths, which identical screens share."""
+    conn.execute(
+        """
+            CREATE INDEX IF NOT EXISTS idx_img_info_thumbnail_path
+            ON img_info (thumbnail_path)
+        """
+    )
+
+
+def _catalog_schema(conn: sqlite3.Connection) -> None:
+    """The shard list and the query cache of a sharded data directory."""
+    conn.execute(
+        """
+            CREATE TABLE IF NOT EXISTS shards (
+                key INTEGER PRIMARY KEY,
+                path TEXT NOT NULL,
+                start INTEGER NOT NULL,
+                end INTEGER NOT NULL
+            );
+        """
+    )
+    _create_query_cache(conn)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_query_cache_last_used ON query_cache (last_used)"
+    )
+
+
+# MIGRATIONS[i] upgrades a database from version i to version i + 1.
+MIGRATIONS: list[Migration] = [
+    _base_schema,
+    _quantized_index,
+    _ocr_text,
+    _indexes,
+    _thumbnail_index,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+# The schema of a shard catalog (see `core.shards`), which holds no entries.
+CATALOG_MIGRATIONS: list[Migration] = [
+    _catalog_schema,
+]
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection, migrations: list[Migration] = MIGRATIONS) -> int:
+    """
+    Upgrade a database to the current schema version.
+
+    Runs inside the caller's transaction; the caller commits.
+
+    Args:
+        conn (sqlite3.Connection): The database connection.
+        migrations (list[Migration]): The migration chain of the database's kind.
+    Returns:
+        int: Number of migrations applied.
+    """
+    version = schema_version(conn)
+    if version > len(migrations):
+        logger.warning(
+            f"Database schema version {version} is newer than this version of "
+            f"smarn ({len(migrations)}); leaving it as is."
+        )
+        return 0
+
+    for target, migration in enumerate(migrations[version:], start=version + 1):
+        logger.info(f"Migrating database to version {target}: {migration.__doc__}")
+        migration(conn)
+        # PRAGMA arguments cannot be bound; `target` is an int.
+        conn.execute(f"PRAGMA user_version = {target}")
+    return len(migrations) - version
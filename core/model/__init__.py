@@ -1,6 +1,78 @@
-from .jina_clip import JinaClipModel
+from config import settings
 
-# Create a single, shared instance of the model
-model = JinaClipModel()
+from .base import BaseModel, ModelLoadError
+from .executor import InferenceExecutor
+from .lazy import LazyModel
+from .scheduler import InferenceScheduler
 
-__all__ = ["model"]
+HF_MODEL_ID = "jinaai/jina-clip-v1"
+
+
+def model_id_for(backend: str = settings.MODEL_BACKEND) -> str:
+    """
+    Identity of the model a backend produces, without loading it.
+
+    Args:
+        backend (str): "torch", "torch-int8" or "onnx".
+    Returns:
+        str: The model identity.
+    """
+    if backend == "torch":
+        return HF_MODEL_ID
+    if backend == "torch-int8":
+        return f"{HF_MODEL_ID}:int8"
+    if backend == "onnx":
+        return f"{HF_MODEL_ID}:onnx{'-int8' if settings.ONNX_QUANTIZED else ''}"
+    raise ValueError(f"Unknown model backend: {backend}")
+
+
+def load_model(backend: str = settings.MODEL_BACKEND) -> BaseModel:
+    """
+    Create the embedding model for the configured backend.
+
+    The backend modules are imported here rather than at the top of the package so
+    that importing `core.model` does not pull in torch or transformers.
+
+    Args:
+        backend (str): "torch", "torch-int8" or "onnx".
+    Returns:
+        BaseModel: The loaded model.
+    """
+    if backend == "torch":
+        from .jina_clip import JinaClipModel
+
+        return JinaClipModel()
+    if backend == "torch-int8":
+        from .jina_clip import JinaClipModel
+
+        return JinaClipModel(quantize=True)
+    if backend == "onnx":
+        from .onnx_clip import OnnxClipModel
+
+        return OnnxClipModel()
+    raise ValueError(f"Unknown model backend: {backend}")
+
+
+# A single, shared handle to the model; the weights are loaded on first use or by
+# `model.warm_up()`.
+model = LazyModel(load_model, model_id_for())
+
+# Low-priority thread for capture and import embeddings.
+background = InferenceExecutor()
+
+# Serializes and batches all embedding requests: text queries run first, on the
+# caller's thread, and images on `background`.
+inference = InferenceScheduler(model, background)
+
+__all__ = [
+    "model",
+    "background",
+    "inference",
+    "load_model",
+    "model_id_for",
+    "BaseModel",
+    "InferenceExecutor",
+    "InferenceScheduler",
+    "LazyModel",
+    "ModelLoadError",
+]
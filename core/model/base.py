@@ -4,9 +4,18 @@ import numpy as np
 from PIL import Image
 
 
+class ModelLoadError(RuntimeError):
+    """The model could not be loaded."""
+
+
 class BaseModel(ABC):
     """Abstract base class for a generic model."""
 
+    # Identifies the weights producing the embeddings; used to key cached embeddings.
+    model_id: str = ""
+    # Upper bound on the number of items passed to a single forward pass.
+    max_batch_size: int = 16
+
     @abstractmethod
     def get_text_embs(self, text: str) -> np.ndarray:
         """
@@ -32,3 +41,33 @@ class BaseModel(ABC):
             np.ndarray: The image embeddings.
         """
         pass
+
+    def get_text_embs_batch(self, texts: list[str]) -> np.ndarray:
+        """
+        Get the text embeddings for a list of texts.
+
+        The default implementation embeds one text at a time; subclasses should
+        override it with a real batched forward pass.
+
+        Args:
+            texts (list[str]): The texts to get the embeddings for.
+
+        Returns:
+            np.ndarray: The text embeddings, one row per text, in input order.
+        """
+        return np.vstack([self.get_text_embs(text) for text in texts])
+
+    def get_img_embs_batch(self, imgs: list[Image.Image]) -> np.ndarray:
+        """
+        Get the image embeddings for a list of images.
+
+        The default implementation embeds one image at a time; subclasses should
+        override it with a real batched forward pass.
+
+        Args:
+            imgs (list[Image.Image]): The images to get the embeddings for.
+
+        Returns:
+            np.ndarray: The image embeddings, one row per image, in input order.
+        """
+        return np.vstack([self.get_img_embs(img) for img in imgs])
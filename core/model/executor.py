@@ -0,0 +1,246 @@
+import contextlib
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Iterator
+
+from config import settings
+
+from ..capture_scheduler import cpu_load
+from ..metrics import registry
+
+logger = logging.getLogger(__name__)
+
+_WAIT_SECONDS = registry.histogram(
+    "smarn_background_inference_wait_seconds",
+    "Time background inference jobs waited to run, idle gating included.",
+)
+
+
+def lower_thread_priority(nice: int, sched_idle: bool) -> None:
+    """
+    Lower the OS priority of the calling thread only.
+
+    On Linux, niceness and the scheduling policy are per thread, and threads the
+    caller starts later (such as a runtime's intra-op pool) inherit them.
+
+    Args:
+        nice (int): Niceness of the thread (0-19); never raises the priority.
+        sched_idle (bool): Also switch the thread to SCHED_IDLE.
+    """
+    tid = threading.get_native_id()
+    if sched_idle and hasattr(os, "SCHED_IDLE"):
+        try:
+            os.sched_setscheduler(tid, os.SCHED_IDLE, os.sched_param(0))
+        except OSError as e:
+            logger.warning(f"Could not switch inference to SCHED_IDLE: {e}")
+    try:
+        if nice > os.getpriority(os.PRIO_PROCESS, tid):
+            os.setpriority(os.PRIO_PROCESS, tid, nice)
+    except OSError as e:
+        logger.warning(f"Could not lower the inference priority: {e}")
+
+
+@contextlib.contextmanager
+def thread_budget(threads: int) -> Iterator[None]:
+    """
+    Run torch with `threads` intra-op threads for the duration of the block.
+
+    torch's thread count is process-wide, not per thread, so the caller must hold
+    the model gate (see `ModelGate`) for the whole block: no other forward pass
+    may run meanwhile. The interactive count is restored on exit, so text
+    queries keep INFERENCE_THREADS. ONNX Runtime sizes its pools per session
+    instead (see `OnnxClipModel`).
+
+    Args:
+        threads (int): Intra-op threads; 0 leaves the runtime's choice.
+    """
+    torch = None
+    if threads > 0 and settings.MODEL_BACKEND.startswith("torch"):
+        try:
+            import torch
+        except ImportError:
+            # The forward pass itself reports the missing backend.
+            pass
+    if torch is None:
+        yield
+        return
+
+    # A model loaded inside the block sets INFERENCE_THREADS itself; restore that
+    # rather than the count from before it was loaded.
+    interactive = settings.INFERENCE_THREADS or torch.get_num_threads()
+    torch.set_num_threads(threads)
+    try:
+        yield
+    finally:
+        torch.set_num_threads(interactive)
+
+
+class IdleDetector:
+    """Decides whether the machine is idle enough for deferred work."""
+
+    def __init__(
+        self,
+        max_load: float = settings.IDLE_MAX_LOAD,
+        input_seconds: float = settings.IDLE_INPUT_SECONDS,
+    ):
+        """
+        Args:
+            max_load (float): Highest per-CPU 1-minute load average that is idle.
+            input_seconds (float): Seconds without keyboard or mouse input that
+                count as idle; ignored where input idle time cannot be read.
+        """
+        self.max_load = max_load
+        self.input_seconds = input_seconds
+        self._monitor = None
+        self._monitor_failed = False
+
+    def input_idle_seconds(self) -> float | None:
+        """Seconds since the last input; None where it cannot be read (Wayland)."""
+        if self._monitor_failed:
+            return None
+        try:
+            if self._monitor is None:
+                from ..x11_capture import X11IdleMonitor
+
+                self._monitor = X11IdleMonitor()
+            return self._monitor.idle_seconds()
+        except Exception as e:
+            logger.info(f"Input idle time unavailable; using the load only: {e}")
+            self._monitor_failed = True
+            return None
+
+    def is_idle(self) -> bool:
+        if cpu_load() > self.max_load:
+            return False
+        idle_seconds = self.input_idle_seconds()
+        return idle_seconds is None or idle_seconds >= self.input_seconds
+
+
+class InferenceExecutor:
+    """
+    Runs background inference on one dedicated low-priority thread.
+
+    Capture and import embeddings are submitted here, so they run niced (and
+    optionally under SCHED_IDLE), while interactive text queries keep running on
+    the caller's thread at normal priority. `threads` is the intra-op budget of
+    the jobs; `InferenceScheduler` applies it around each forward pass (see
+    `thread_budget`). Jobs submitted with `when_idle=True` (backlogs) wait until the
+    machine is idle, or until they have waited `max_defer` seconds; other jobs
+    always run first.
+
+    The thread is started on first use.
+    """
+
+    def __init__(
+        self,
+        threads: int = settings.BACKGROUND_THREADS,
+        nice: int = settings.BACKGROUND_NICE,
+        sched_idle: bool = settings.BACKGROUND_SCHED_IDLE,
+        idle: IdleDetector | None = None,
+        poll_seconds: float = settings.IDLE_POLL_SECONDS,
+        max_defer: float = settings.IDLE_MAX_DEFER,
+    ):
+        """
+        Args:
+            threads (int): Intra-op thread budget (0 lets the runtime decide).
+            nice (int): Niceness of the inference thread.
+            sched_idle (bool): Run the inference thread under SCHED_IDLE.
+            idle (IdleDetector, optional): Gate of the deferred jobs.
+            poll_seconds (float): Seconds between idle checks of deferred jobs.
+            max_defer (float): Seconds after which a deferred job runs regardless
+                (0 waits for idle indefinitely).
+        """
+        self.threads = threads
+        self.nice = nice
+        self.sched_idle = sched_idle
+        self.idle = idle if idle is not None else IdleDetector()
+        self.poll_seconds = poll_seconds
+        self.max_defer = max_defer
+        # (deferred, sequence, submitted, fn, args, future); live jobs sort first.
+        self._jobs: list[tuple] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._stopping = False
+        registry.gauge(
+            "smarn_background_inference_queued",
+            "Background inference jobs waiting, deferred ones included.",
+            fn=lambda: len(self._jobs),
+        )
+
+    def submit(self, fn: Callable, *args, when_idle: bool = False) -> Future:
+        """
+        Queue an inference call.
+
+        Args:
+            fn (Callable): The call, e.g. `model.get_img_embs_batch`.
+            *args: Its arguments.
+            when_idle (bool): Hold the call until the machine is idle.
+        Returns:
+            Future: Resolves to the call's result.
+        """
+        future: Future = Future()
+        with self._cond:
+            if self._stopping:
+                raise RuntimeError("The inference executor has been shut down.")
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="smarn-inference", daemon=True
+                )
+                self._thread.start()
+            heapq.heappush(
+                self._jobs,
+                (when_idle, next(self._seq), time.monotonic(), fn, args, future),
+            )
+            self._cond.notify()
+        return future
+
+    def run(self, fn: Callable, *args) -> Any:
+        """Run an inference call on the executor and wait for its result."""
+        return self.submit(fn, *args).result()
+
+    def shutdown(self) -> None:
+        """Run the queued jobs, deferred ones included, and stop the thread."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def _ready(self, job: tuple) -> bool:
+        deferred, _, submitted, *_ = job
+        if not deferred or self._stopping:
+            return True
+        if self.max_defer and time.monotonic() - submitted >= self.max_defer:
+            return True
+        return self.idle.is_idle()
+
+    def _run(self) -> None:
+        lower_thread_priority(self.nice, self.sched_idle)
+        while True:
+            with self._cond:
+                while not self._jobs and not self._stopping:
+                    self._cond.wait()
+                if not self._jobs:
+                    return
+                if not self._ready(self._jobs[0]):
+                    # Woken early by a new live job, which then sorts first.
+                    self._cond.wait(self.poll_seconds)
+                    continue
+                _, _, submitted, fn, args, future = heapq.heappop(self._jobs)
+
+            _WAIT_SECONDS.observe(time.monotonic() - submitted)
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args))
+            except BaseException as e:
+                # Even a SystemExit from a model must not end the thread with its
+                # callers waiting on their futures.
+                future.set_exception(e)
@@ -1,10 +1,14 @@
 import logging
 
 import numpy as np
+import torch
 from PIL import Image
 from transformers import AutoModel, PreTrainedModel
 
-from .base import BaseModel
+from config import settings
+
+from . import HF_MODEL_ID
+from .base import BaseModel, ModelLoadError
 
 logger = logging.getLogger(__name__)
 
@@ -12,24 +16,50 @@ logger = logging.getLogger(__name__)
 class JinaClipModel(BaseModel):
     """Jina-CLIP model implementation."""
 
-    def __init__(self):
+    model_id = HF_MODEL_ID
+
+    def __init__(
+        self,
+        max_batch_size: int = settings.MAX_BATCH_SIZE,
+        quantize: bool = False,
+    ):
+        """
+        Args:
+            max_batch_size (int): Maximum number of items per forward pass.
+            quantize (bool): Dynamically quantize the linear layers to int8 after loading.
+        """
         self.model: PreTrainedModel | None = None
+        self.max_batch_size = max_batch_size
+        self.quantize = quantize
+        if quantize:
+            self.model_id = f"{HF_MODEL_ID}:int8"
         self._load_model()
 
     def _load_model(self) -> None:
-        """Load the model if it hasn't been loaded yet."""
+        """
+        Load the model if it hasn't been loaded yet.
+
+        Raises:
+            ModelLoadError: If the weights cannot be loaded.
+        """
         if self.model is None:
             logger.info("Loading Pretrained JinaAI from Huggingface Transformers.")
             try:
                 self.model = AutoModel.from_pretrained(
-                    "jinaai/jina-clip-v1", trust_remote_code=True
-                )
+                    HF_MODEL_ID, trust_remote_code=True
+                ).eval()
             except (RuntimeError, OSError) as e:
-                logger.debug(f"There was an error in loading the model - {e}")
+                logger.error(f"Error loading the model: {e}")
+                raise ModelLoadError(f"The model could not be loaded ({e}).") from e
+
+            if settings.INFERENCE_THREADS > 0:
+                torch.set_num_threads(settings.INFERENCE_THREADS)
 
-            if self.model is None:
-                logger.error("Model was not loaded properly.")
-                exit(1)
+            if self.quantize:
+                self.model = torch.quantization.quantize_dynamic(
+                    self.model, {torch.nn.Linear}, dtype=torch.qint8
+                )
+                logger.info("Quantized the model's linear layers to int8.")
 
     def get_text_embs(self, text: str) -> np.ndarray:
         """
@@ -56,3 +86,56 @@ class JinaClipModel(BaseModel):
         """
         img_embs = self.model.encode_image([img])
         return img_embs
+
+    def get_text_embs_batch(self, texts: list[str]) -> np.ndarray:
+        """
+        Get the text embeddings for a list of texts.
+
+        Texts are sorted by length before being split into batches so that each
+        batch is padded to a similar length, then returned in input order.
+
+        Args:
+            texts (list[str]): The texts to get the embeddings for.
+
+        Returns:
+            np.ndarray: The text embeddings, one row per text, in input order.
+        """
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        chunks = [
+            self.model.encode_text(
+                [texts[i] for i in batch], batch_size=len(batch)
+            )
+            for batch in _chunks(order, self.max_batch_size)
+        ]
+        sorted_embs = np.vstack(chunks)
+
+        text_embs = np.empty_like(sorted_embs)
+        text_embs[order] = sorted_embs
+        return text_embs
+
+    def get_img_embs_batch(self, imgs: list[Image.Image]) -> np.ndarray:
+        """
+        Get the image embeddings for a list of images.
+
+        Args:
+            imgs (list[Image.Image]): The images to get the embeddings for.
+
+        Returns:
+            np.ndarray: The image embeddings, one row per image, in input order.
+        """
+        if not imgs:
+            return np.empty((0, 0), dtype=np.float32)
+
+        chunks = [
+            self.model.encode_image(batch, batch_size=len(batch))
+            for batch in _chunks(imgs, self.max_batch_size)
+        ]
+        return np.vstack(chunks)
+
+
+def _chunks(items: list, size: int) -> list[list]:
+    """Split a list into consecutive chunks of at most `size` items."""
+    return [items[i : i + size] for i in range(0, len(items), size)]
@@ -0,0 +1,131 @@
+import logging
+import threading
+import time
+from typing import Callable
+
+import numpy as np
+from PIL import Image
+
+from ..metrics import registry
+from .base import BaseModel, ModelLoadError
+
+logger = logging.getLogger(__name__)
+
+
+class LazyModel(BaseModel):
+    """
+    Handle to a model that is only constructed when first needed.
+
+    Loading the weights (and importing torch/transformers) takes seconds, so the
+    handle lets callers start a background warm-up and check readiness without
+    blocking. Any embedding call blocks until the model has been loaded.
+
+    If loading fails, the error is kept: every later call, `is_ready()` and
+    `wait_ready()` raise it instead of waiting for a model that will never come.
+    """
+
+    def __init__(self, factory: Callable[[], BaseModel], model_id: str = ""):
+        """
+        Args:
+            factory (Callable[[], BaseModel]): Builds the real model.
+            model_id (str): Identity of the model the factory builds, known before loading.
+        """
+        self._factory = factory
+        self._model: BaseModel | None = None
+        self._lock = threading.Lock()
+        # Set once loading has finished, whether it succeeded or not.
+        self._loaded = threading.Event()
+        self._error: ModelLoadError | None = None
+        self.model_id = model_id
+        self.load_seconds: float | None = None
+
+    def _get(self) -> BaseModel:
+        if self._model is None:
+            with self._lock:
+                if self._error is not None:
+                    raise self._error
+                if self._model is None:
+                    started = time.monotonic()
+                    try:
+                        self._model = self._factory()
+                    except ModelLoadError as e:
+                        self._failed(e)
+                        raise
+                    except Exception as e:
+                        error = ModelLoadError(f"The model could not be loaded: {e}")
+                        self._failed(error)
+                        raise error from e
+                    self.load_seconds = time.monotonic() - started
+                    registry.gauge(
+                        "smarn_model_load_seconds",
+                        "Time taken to load the embedding model.",
+                    ).set(self.load_seconds)
+                    self.model_id = self._model.model_id
+                    self._loaded.set()
+                    logger.info(f"Model loaded in {self.load_seconds:.1f}s.")
+        return self._model
+
+    def _failed(self, error: ModelLoadError) -> None:
+        # Called with the lock held.
+        self._error = error
+        self._loaded.set()
+
+    def warm_up(self) -> threading.Thread:
+        """
+        Load the model on a background thread.
+
+        Returns:
+            threading.Thread: The warm-up thread.
+        """
+        thread = threading.Thread(
+            target=self._warm_up, name="smarn-model-warmup", daemon=True
+        )
+        thread.start()
+        return thread
+
+    def _warm_up(self) -> None:
+        try:
+            self._get()
+        except ModelLoadError as e:
+            logger.error(f"Model warm-up failed: {e}")
+
+    def is_ready(self) -> bool:
+        """
+        Whether the model has been loaded.
+
+        Raises:
+            ModelLoadError: If loading failed.
+        """
+        if self._error is not None:
+            raise self._error
+        return self._loaded.is_set()
+
+    def wait_ready(self, timeout: float | None = None) -> bool:
+        """
+        Block until the model has been loaded.
+
+        Args:
+            timeout (float, optional): Maximum number of seconds to wait.
+        Returns:
+            bool: Whether the model is ready.
+        Raises:
+            ModelLoadError: If loading failed.
+        """
+        self._loaded.wait(timeout)
+        return self.is_ready()
+
+    @property
+    def max_batch_size(self) -> int:
+        return self._get().max_batch_size
+
+    def get_text_embs(self, text: str) -> np.ndarray:
+        return self._get().get_text_embs(text)
+
+    def get_img_embs(self, img: Image.Image) -> np.ndarray:
+        return self._get().get_img_embs(img)
+
+    def get_text_embs_batch(self, texts: list[str]) -> np.ndarray:
+        return self._get().get_text_embs_batch(texts)
+
+    def get_img_embs_batch(self, imgs: list[Image.Image]) -> np.ndarray:
+        return self._get().get_img_embs_batch(imgs)
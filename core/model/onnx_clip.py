@@ -0,0 +1,259 @@
+import logging
+import os
+
+import numpy as np
+from PIL import Image
+
+from config import settings
+
+from . import HF_MODEL_ID
+from .base import BaseModel, ModelLoadError
+
+logger = logging.getLogger(__name__)
+
+TEXT_TOWER = "text"
+VISION_TOWER = "vision"
+
+
+def _tower_path(model_dir: str, tower: str, quantized: bool) -> str:
+    suffix = ".int8.onnx" if quantized else ".onnx"
+    return os.path.join(model_dir, tower + suffix)
+
+
+class OnnxClipModel(BaseModel):
+    """
+    Jina-CLIP running on ONNX Runtime.
+
+    The text and vision towers are exported once with `export_onnx` (optionally
+    dynamically quantized to int8) and loaded into CPU inference sessions with an
+    explicit thread count. Tokenization and image preprocessing reuse the
+    Hugging Face processors, so the inputs match the PyTorch model exactly.
+    """
+
+    def __init__(
+        self,
+        model_dir: str = settings.ONNX_MODEL_DIR,
+        quantized: bool = settings.ONNX_QUANTIZED,
+        num_threads: int = settings.INFERENCE_THREADS,
+        vision_threads: int = settings.BACKGROUND_THREADS,
+        max_batch_size: int = settings.MAX_BATCH_SIZE,
+    ):
+        """
+        Args:
+            model_dir (str): Directory holding the exported towers.
+            quantized (bool): Load the int8 towers instead of the fp32 ones.
+            num_threads (int): Intra-op threads of the text session (0 lets ONNX
+                Runtime decide).
+            vision_threads (int): Intra-op threads of the vision session.
+            max_batch_size (int): Maximum number of items per forward pass.
+        """
+        self.model_dir = model_dir
+        self.quantized = quantized
+        self.num_threads = num_threads
+        self.vision_threads = vision_threads
+        self.max_batch_size = max_batch_size
+        self.model_id = f"{HF_MODEL_ID}:onnx{'-int8' if quantized else ''}"
+        self.text_session = None
+        self.vision_session = None
+        self.tokenizer = None
+        self.image_processor = None
+        self._load_model()
+
+    def _load_model(self) -> None:
+        """
+        Create the inference sessions and the pre-processors.
+
+        Raises:
+            ModelLoadError: If a tower is missing or cannot be loaded.
+        """
+        import onnxruntime as ort
+        from transformers import AutoImageProcessor, AutoTokenizer
+
+        def session_options(num_threads: int) -> ort.SessionOptions:
+            options = ort.SessionOptions()
+            options.intra_op_num_threads = num_threads
+            options.inter_op_num_threads = 1
+            options.graph_optimization_level = (
+                ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            )
+            return options
+
+        logger.info(f"Loading ONNX towers from {self.model_dir}.")
+        try:
+            self.text_session = ort.InferenceSession(
+                _tower_path(self.model_dir, TEXT_TOWER, self.quantized),
+                session_options(self.num_threads),
+                providers=["CPUExecutionProvider"],
+            )
+            self.vision_session = ort.InferenceSession(
+                _tower_path(self.model_dir, VISION_TOWER, self.quantized),
+                # Images are embedded in the background; keep to its thread budget.
+                session_options(self.vision_threads),
+                providers=["CPUExecutionProvider"],
+            )
+            self.tokenizer = AutoTokenizer.from_pretrained(
+                HF_MODEL_ID, trust_remote_code=True
+            )
+            self.image_processor = AutoImageProcessor.from_pretrained(
+                HF_MODEL_ID, trust_remote_code=True
+            )
+        except Exception as e:
+            logger.error(f"Error loading the ONNX model from {self.model_dir}: {e}")
+            raise ModelLoadError(
+                f"The ONNX model could not be loaded ({e}). "
+                "Export it first with `python -m core.model.onnx_clip`."
+            ) from e
+
+    def get_text_embs(self, text: str) -> np.ndarray:
+        """
+        Get the text embeddings for a given text.
+
+        Args:
+            text (str): The text to get the embeddings for.
+
+        Returns:
+            np.ndarray: The text embeddings.
+        """
+        return self.get_text_embs_batch([text])
+
+    def get_img_embs(self, img: Image.Image) -> np.ndarray:
+        """
+        Get the image embeddings for a given image.
+
+        Args:
+            img (Image.Image): The image to get the embeddings for.
+
+        Returns:
+            np.ndarray: The image embeddings.
+        """
+        return self.get_img_embs_batch([img])
+
+    def get_text_embs_batch(self, texts: list[str]) -> np.ndarray:
+        """
+        Get the text embeddings for a list of texts.
+
+        Texts are sorted by length before batching so each batch pads to a similar
+        length, then returned in input order.
+
+        Args:
+            texts (list[str]): The texts to get the embeddings for.
+
+        Returns:
+            np.ndarray: The text embeddings, one row per text, in input order.
+        """
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        chunks = []
+        for start in range(0, len(order), self.max_batch_size):
+            batch = [texts[i] for i in order[start : start + self.max_batch_size]]
+            input_ids = self.tokenizer(
+                batch, padding=True, truncation=True, return_tensors="np"
+            )["input_ids"].astype(np.int64)
+            chunks.append(self.text_session.run(None, {"input_ids": input_ids})[0])
+        sorted_embs = _normalize(np.vstack(chunks))
+
+        text_embs = np.empty_like(sorted_embs)
+        text_embs[order] = sorted_embs
+        return text_embs
+
+    def get_img_embs_batch(self, imgs: list[Image.Image]) -> np.ndarray:
+        """
+        Get the image embeddings for a list of images.
+
+        Args:
+            imgs (list[Image.Image]): The images to get the embeddings for.
+
+        Returns:
+            np.ndarray: The image embeddings, one row per image, in input order.
+        """
+        chunks = []
+        for start in range(0, len(imgs), self.max_batch_size):
+            batch = [
+                img.convert("RGB")
+                for img in imgs[start : start + self.max_batch_size]
+            ]
+            pixel_values = self.image_processor(batch, return_tensors="np")[
+                "pixel_values"
+            ].astype(np.float32)
+            chunks.append(
+                self.vision_session.run(None, {"pixel_values": pixel_values})[0]
+            )
+        return _normalize(np.vstack(chunks))
+
+
+def _normalize(embs: np.ndarray) -> np.ndarray:
+    """L2-normalize each row, matching `encode_text`/`encode_image`."""
+    norms = np.linalg.norm(embs, axis=1, keepdims=True)
+    return embs / np.maximum(norms, 1e-12)
+
+
+def export_onnx(
+    model_dir: str = settings.ONNX_MODEL_DIR, quantize: bool = True
+) -> None:
+    """
+    Export the Jina-CLIP text and vision towers to ONNX.
+
+    Args:
+        model_dir (str): Directory to write the towers to.
+        quantize (bool): Also write dynamically int8-quantized copies of both towers.
+    """
+    import torch
+    from transformers import AutoModel
+
+    class _TextTower(torch.nn.Module):
+        def __init__(self, clip):
+            super().__init__()
+            self.clip = clip
+
+        def forward(self, input_ids):
+            return self.clip.get_text_features(input_ids)
+
+    class _VisionTower(torch.nn.Module):
+        def __init__(self, clip):
+            super().__init__()
+            self.clip = clip
+
+        def forward(self, pixel_values):
+            return self.clip.get_image_features(pixel_values)
+
+    os.makedirs(model_dir, exist_ok=True)
+    clip = AutoModel.from_pretrained(HF_MODEL_ID, trust_remote_code=True).eval()
+    size = clip.config.vision_config.image_size
+
+    with torch.no_grad():
+        torch.onnx.export(
+            _TextTower(clip),
+            (torch.ones(1, 16, dtype=torch.long),),
+            _tower_path(model_dir, TEXT_TOWER, False),
+            input_names=["input_ids"],
+            output_names=["embedding"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "embedding": {0: "batch"},
+            },
+            opset_version=17,
+        )
+        torch.onnx.export(
+            _VisionTower(clip),
+            (torch.zeros(1, 3, size, size),),
+            _tower_path(model_dir, VISION_TOWER, False),
+            input_names=["pixel_values"],
+            output_names=["embedding"],
+            dynamic_axes={"pixel_values": {0: "batch"}, "embedding": {0: "batch"}},
+            opset_version=17,
+        )
+    logger.info(f"Exported ONNX towers to {model_dir}.")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        for tower in (TEXT_TOWER, VISION_TOWER):
+            quantize_dynamic(
+                _tower_path(model_dir, tower, False),
+                _tower_path(model_dir, tower, True),
+                weight_type=QuantType.QInt8,
+            )
+        logger.info("Wrote int8-quantized ONNX towers.")
+
+
+if __name__ == "__main__":
+    export_onnx()
@@ -0,0 +1,78 @@
+"""
+Check that an alternative backend produces the same embeddings as the fp32 model.
+
+Usage: python -m core.model.parity [backend] [image ...]
+"""
+
+import logging
+import sys
+
+import numpy as np
+from PIL import Image
+
+from . import load_model
+
+logger = logging.getLogger(__name__)
+
+PARITY_TEXTS = [
+    "red sneakers website",
+    "a guy explaining quantum mechanics",
+    "terminal showing a python traceback",
+    "spreadsheet with quarterly revenue",
+]
+# Minimum per-item cosine agreement with the fp32 model.
+MIN_COSINE = 0.98
+
+
+def _synthetic_images(n: int = 4, size: tuple[int, int] = (640, 400)) -> list:
+    rng = np.random.default_rng(0)
+    imgs = []
+    for _ in range(n):
+        pixels = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+        for _ in range(12):
+            x0, y0 = rng.integers(0, size[0] - 40), rng.integers(0, size[1] - 40)
+            w, h = rng.integers(20, size[0] // 2), rng.integers(10, size[1] // 3)
+            pixels[y0 : y0 + h, x0 : x0 + w] = rng.integers(0, 256, 3)
+        imgs.append(Image.fromarray(pixels))
+    return imgs
+
+
+def _row_cosines(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return np.sum(a * b, axis=1)
+
+
+def check_parity(backend: str, imgs: list[Image.Image] | None = None) -> bool:
+    """
+    Compare `backend` against the fp32 torch model on texts and images.
+
+    Args:
+        backend (str): The backend under test.
+        imgs (list[Image.Image], optional): Images to compare on. Defaults to synthetic screens.
+    Returns:
+        bool: Whether every embedding agrees to at least `MIN_COSINE`.
+    """
+    imgs = imgs or _synthetic_images()
+    reference = load_model("torch")
+    candidate = load_model(backend)
+
+    text_cos = _row_cosines(
+        reference.get_text_embs_batch(PARITY_TEXTS),
+        candidate.get_text_embs_batch(PARITY_TEXTS),
+    )
+    img_cos = _row_cosines(
+        reference.get_img_embs_batch(imgs), candidate.get_img_embs_batch(imgs)
+    )
+    logger.info(
+        f"{backend} vs torch: text cosine min={text_cos.min():.4f}, "
+        f"image cosine min={img_cos.min():.4f}"
+    )
+    return bool(text_cos.min() >= MIN_COSINE and img_cos.min() >= MIN_COSINE)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    backend = sys.argv[1] if len(sys.argv) > 1 else "onnx"
+    imgs = [Image.open(path) for path in sys.argv[2:]] or None
+    sys.exit(0 if check_parity(backend, imgs) else 1)
@@ -0,0 +1,223 @@
+import contextlib
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Iterator
+
+import numpy as np
+from PIL import Image
+
+from config import settings
+
+from ..metrics import registry
+from .base import BaseModel
+from .executor import InferenceExecutor, thread_budget
+
+logger = logging.getLogger(__name__)
+
+_QUEUE_WAIT_SECONDS = {
+    kind: registry.histogram(
+        "smarn_inference_queue_wait_seconds",
+        "Time embedding requests waited for the model, by kind.",
+        {"kind": kind},
+    )
+    for kind in ("text", "image")
+}
+_BATCH_SIZE = {
+    kind: registry.histogram(
+        "smarn_inference_batch_size",
+        "Requests coalesced into one forward pass, by kind.",
+        {"kind": kind},
+        buckets=(1, 2, 4, 8, 16, 32, 64),
+    )
+    for kind in ("text", "image")
+}
+
+
+class ModelGate:
+    """
+    Exclusive access to the model, granted to interactive holders first.
+
+    A background holder is never preempted, so an interactive request waits at
+    most for the forward pass in progress, and the two never run concurrently
+    (which would oversubscribe the CPU with both runtimes' thread pools).
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._busy = False
+        self._interactive_waiting = 0
+
+    @contextlib.contextmanager
+    def hold(self, interactive: bool = False) -> Iterator[None]:
+        with self._cond:
+            if interactive:
+                self._interactive_waiting += 1
+            try:
+                while self._busy or (not interactive and self._interactive_waiting):
+                    self._cond.wait()
+            finally:
+                if interactive:
+                    self._interactive_waiting -= 1
+            self._busy = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+
+
+@dataclass
+class _Request:
+    """Items to embed together, and the future of their embeddings."""
+
+    items: list
+    submitted: float = field(default_factory=time.monotonic)
+    future: Future = field(default_factory=Future)
+
+
+class InferenceScheduler:
+    """
+    The one way into the model for concurrent callers.
+
+    Text queries run on the caller's thread, ahead of any queued image work;
+    images are embedded on the low-priority `InferenceExecutor`. Only one forward
+    pass runs at a time (see `ModelGate`). Requests of the same kind that arrive
+    within `batch_window` seconds of each other, or while the model is busy, are
+    coalesced into one batched forward pass. The time each request waited for the
+    model is recorded in `smarn_inference_queue_wait_seconds`.
+    """
+
+    def __init__(
+        self,
+        model: BaseModel,
+        executor: InferenceExecutor,
+        batch_window: float = settings.INFERENCE_BATCH_WINDOW,
+        max_batch: int = settings.MAX_BATCH_SIZE,
+    ):
+        """
+        Args:
+            model (BaseModel): The model, usually the shared `LazyModel`.
+            executor (InferenceExecutor): Runs the image forward passes.
+            batch_window (float): Seconds to wait for more requests before a
+                forward pass (0 only coalesces requests that queued up meanwhile).
+            max_batch (int): Most items coalesced into one forward pass; a larger
+                single request still runs whole.
+        """
+        self.model = model
+        self.executor = executor
+        self.batch_window = batch_window
+        self.max_batch = max(max_batch, 1)
+        self.gate = ModelGate()
+        self._lock = threading.Lock()
+        self._texts: list[_Request] = []
+        # Pending image requests, live and deferred apart, and whether an
+        # executor job is already on its way to embed them.
+        self._images: dict[bool, list[_Request]] = {False: [], True: []}
+        self._draining: dict[bool, bool] = {False: False, True: False}
+
+    def embed_text(self, text: str) -> np.ndarray:
+        """
+        Embed a text query, with priority over image work.
+
+        Args:
+            text (str): The query.
+        Returns:
+            np.ndarray: The embedding, as `model.get_text_embs` returns it.
+        """
+        request = _Request([text])
+        with self._lock:
+            self._texts.append(request)
+        # Give concurrent queries a chance to join this forward pass.
+        if self.batch_window:
+            time.sleep(self.batch_window)
+        with self.gate.hold(interactive=True):
+            # A caller that got the model first may have embedded this one too.
+            if not request.future.done():
+                with self._lock:
+                    batch = self._take(self._texts)
+                self._forward(
+                    batch,
+                    "text",
+                    self.model.get_text_embs,
+                    self.model.get_text_embs_batch,
+                )
+        return request.future.result()
+
+    def embed_images(
+        self, imgs: list[Image.Image], when_idle: bool = False
+    ) -> Future:
+        """
+        Queue images for embedding on the background executor.
+
+        Args:
+            imgs (list[Image.Image]): The images.
+            when_idle (bool): Hold them until the machine is idle (see
+                `InferenceExecutor`).
+        Returns:
+            Future: Resolves to their embeddings, one row per image.
+        """
+        request = _Request(list(imgs))
+        with self._lock:
+            self._images[when_idle].append(request)
+            if not self._draining[when_idle]:
+                self._draining[when_idle] = True
+                self.executor.submit(
+                    self._drain_images, when_idle, when_idle=when_idle
+                )
+        return request.future
+
+    def embed_image(self, img: Image.Image, when_idle: bool = False) -> Future:
+        """Queue one image; see `embed_images`."""
+        return self.embed_images([img], when_idle=when_idle)
+
+    def _take(self, queue: list[_Request]) -> list[_Request]:
+        """Pop requests off a queue up to one forward pass worth of items."""
+        batch, size = [], 0
+        while queue and (not batch or size + len(queue[0].items) <= self.max_batch):
+            request = queue.pop(0)
+            batch.append(request)
+            size += len(request.items)
+        return batch
+
+    def _drain_images(self, deferred: bool) -> None:
+        # Runs on the executor thread, once per wake-up of the pending queue.
+        if self.batch_window:
+            time.sleep(self.batch_window)
+        while True:
+            with self._lock:
+                batch = self._take(self._images[deferred])
+                if not batch:
+                    self._draining[deferred] = False
+                    return
+            # Holding the gate makes the process-wide torch thread count ours.
+            with self.gate.hold(), thread_budget(self.executor.threads):
+                self._forward(
+                    batch,
+                    "image",
+                    self.model.get_img_embs,
+                    self.model.get_img_embs_batch,
+                )
+
+    def _forward(self, batch: list[_Request], kind: str, single, batched) -> None:
+        """Embed the items of some requests in one pass and resolve their futures."""
+        started = time.monotonic()
+        for request in batch:
+            _QUEUE_WAIT_SECONDS[kind].observe(started - request.submitted)
+        _BATCH_SIZE[kind].observe(len(batch))
+        items = [item for request in batch for item in request.items]
+        try:
+            embs = single(items[0]) if len(items) == 1 else batched(items)
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            return
+        if len(batch) > 1:
+            logger.debug(f"Embedded {len(batch)} {kind} requests in one batch.")
+        offset = 0
+        for request in batch:
+            request.future.set_result(embs[offset : offset + len(request.items)])
+            offset += len(request.items)
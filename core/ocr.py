@@ -0,0 +1,136 @@
+"""
+Optional OCR of stored screenshots into the `ocr_text` full-text index.
+
+Needs the tesseract binary and the pytesseract package; both are optional, and
+without them the capture service simply indexes embeddings only.
+
+Usage: python -m core.ocr [--limit N]   (recognize entries captured without OCR)
+"""
+
+import argparse
+import importlib.util
+import logging
+import multiprocessing
+import shutil
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from PIL import Image
+
+from config import settings
+from config.log_config import setup_logging
+
+from .metrics import registry
+from .shards import ShardedDatabase
+
+logger = logging.getLogger(__name__)
+
+_OCR_SECONDS = registry.histogram(
+    "smarn_capture_step_seconds",
+    "Duration of each step of the capture service.",
+    {"step": "ocr"},
+)
+
+
+def ocr_available() -> bool:
+    """Whether pytesseract and the tesseract binary are installed."""
+    if importlib.util.find_spec("pytesseract") is None:
+        return False
+    return shutil.which("tesseract") is not None
+
+
+def extract_text(image_path: str, languages: str = settings.OCR_LANGUAGES) -> str:
+    """
+    Recognize the text of a screenshot.
+
+    Args:
+        image_path (str): The screenshot.
+        languages (str): Tesseract languages, e.g. "eng+deu".
+    Returns:
+        str: The recognized words separated by single spaces.
+    """
+    import pytesseract
+
+    with Image.open(image_path) as img:
+        text = pytesseract.image_to_string(img.convert("L"), lang=languages)
+    return " ".join(text.split())
+
+
+class OcrWorker:
+    """
+    Runs OCR in worker processes and stores the text once it is recognized.
+
+    Tesseract takes around a second per screen, far longer than embedding, so it
+    never runs on a pipeline thread; the capture service only submits entries.
+    """
+
+    def __init__(
+        self,
+        languages: str = settings.OCR_LANGUAGES,
+        workers: int = settings.OCR_WORKERS,
+    ):
+        """
+        Args:
+            languages (str): Tesseract languages, e.g. "eng+deu".
+            workers (int): Number of OCR processes.
+        """
+        self.languages = languages
+        self.db = ShardedDatabase()
+        # Spawned rather than forked: the parent runs model and GUI threads.
+        self._pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        )
+
+    def submit(self, id_: int, image_path: str) -> Future:
+        """
+        Queue an entry's screenshot for OCR.
+
+        Args:
+            id_ (int): The entry id.
+            image_path (str): The stored screenshot.
+        Returns:
+            Future: Resolves to the recognized text once it has been stored.
+        """
+        submitted = time.perf_counter()
+        future = self._pool.submit(extract_text, image_path, self.languages)
+
+        def store(done: Future) -> None:
+            _OCR_SECONDS.observe(time.perf_counter() - submitted)
+            try:
+                text = done.result()
+            except Exception as e:
+                logger.error(f"Error recognizing text in {image_path}: {e}")
+                return
+            self.db.set_ocr_text(id_, text)
+
+        future.add_done_callback(store)
+        return future
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--limit", type=int, default=10_000)
+    args = parser.parse_args()
+
+    setup_logging()
+    if not ocr_available():
+        logger.error("OCR needs the tesseract binary and the pytesseract package.")
+        raise SystemExit(1)
+
+    db = ShardedDatabase()
+    db.create_tables()
+    entries = db.get_entries_without_text(args.limit)
+    logger.info(f"Recognizing text in {len(entries)} screenshots...")
+    worker = OcrWorker()
+    for id_, image_path in entries:
+        worker.submit(id_, image_path)
+    worker.shutdown()
+
+
+if __name__ == "__main__":
+    main()
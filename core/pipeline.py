@@ -0,0 +1,513 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from functools import partial
+
+import numpy as np
+from PIL import Image
+
+from config import settings
+
+from .capture_scheduler import CaptureScheduler
+from .change_detector import ChangeDetector
+from .metrics import registry
+from .model import inference
+from .ocr import OcrWorker, ocr_available
+from .shards import ShardedDatabase
+from .storage import ScreenshotEncoder
+from .thumbnails import make_thumbnail
+from .utils import (
+    EmbeddingWindow,
+    compare_with_prev_img,
+    get_active_application_name,
+)
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()  # Sentinel pushed through the queues on shutdown
+
+# Duration of each step a frame goes through. "encode" runs in the encoder
+# process and is measured from submission, so it includes time spent queued.
+_STEP_SECONDS = {
+    step: registry.histogram(
+        "smarn_capture_step_seconds",
+        "Duration of each step of the capture service.",
+        {"step": step},
+    )
+    for step in (
+        "capture",
+        "change_detect",
+        "app_name",
+        "encode",
+        "thumbnail",
+        "embed",
+        "similarity",
+        "insert",
+    )
+}
+_EMBED_BATCH_SIZE = registry.histogram(
+    "smarn_embed_batch_size",
+    "Number of frames embedded per forward pass.",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+
+
+@dataclass
+class Capture:
+    """A screenshot handed to the pipeline by a capture function."""
+
+    # The raw capture file or, for in-memory captures, where to store the
+    # screenshot (without extension).
+    path: str
+    # The screen, when it was captured in-process; no file is written for it.
+    image: Image.Image | None = None
+    # Class of the focused window, when the capture backend already knows it.
+    application_name: str | None = None
+
+
+@dataclass
+class Frame:
+    """A single screenshot travelling through the pipeline."""
+
+    # Path of the raw capture, removed once the frame has been stored; for
+    # in-memory captures, the storage path without extension.
+    path: str
+    captured_at: datetime
+    application_name: str = ""
+    # The decoded screen, kept until the frame is embedded so it is decoded once.
+    image: Image.Image | None = None
+    in_memory: bool = False
+    embedding: np.ndarray | None = None
+    thumbnail_path: str | None = None
+    # Resolves to the path of the encoded screenshot.
+    stored: Future | None = None
+    # The change detector's sample of the screen, committed as its reference
+    # once the frame has been embedded.
+    sample: np.ndarray | None = None
+
+
+@dataclass
+class StageStats:
+    """Counters for a single pipeline stage."""
+
+    processed: int = 0
+    skipped: int = 0
+    dropped: int = 0
+    errors: int = 0
+    busy_seconds: float = 0.0
+
+
+@dataclass
+class PipelineStats:
+    capture: StageStats = field(default_factory=StageStats)
+    embed: StageStats = field(default_factory=StageStats)
+    write: StageStats = field(default_factory=StageStats)
+
+
+class CapturePipeline:
+    """
+    Capture -> embed -> insert pipeline.
+
+    Each stage runs on its own thread and the stages are connected by bounded
+    queues, so a slow embedding never delays the next capture:
+
+    - capture: takes a screenshot on a fixed schedule (monotonic clock) and skips
+      frames the change detector finds unchanged, so idle screens cost no inference.
+    - embed: computes the image embedding and the similarity with the previous frame.
+    - write: the single thread that inserts entries into the database, and hands
+      stored screenshots to the OCR worker when OCR is enabled.
+
+    When the embed queue is full the oldest waiting frame is dropped (and its file
+    removed) in favour of the newest one, i.e. frames are coalesced while the
+    embedding stage catches up. The write queue applies backpressure on the embed
+    stage instead, since inserts are cheap and frames should not be lost there.
+    """
+
+    def __init__(
+        self,
+        capture_fn,
+        interval: float = settings.INITIAL_INTERVAL,
+        embed_queue_size: int = settings.EMBED_QUEUE_SIZE,
+        write_queue_size: int = settings.WRITE_QUEUE_SIZE,
+    ):
+        """
+        Args:
+            capture_fn (Callable[[], Capture | str]): Takes a screenshot and returns
+                it, or the path of the file it was written to.
+            interval (float): Initial capture interval in minutes.
+            embed_queue_size (int): Maximum number of frames waiting to be embedded.
+            write_queue_size (int): Maximum number of frames waiting to be inserted.
+        """
+        self.capture_fn = capture_fn
+        self.db = ShardedDatabase()
+        self.embed_queue: queue.Queue = queue.Queue(maxsize=embed_queue_size)
+        self.write_queue: queue.Queue = queue.Queue(maxsize=write_queue_size)
+        self.stats = PipelineStats()
+        self.detector = ChangeDetector()
+        self.encoder = ScreenshotEncoder()
+        self.ocr = _make_ocr_worker()
+        # Owned by the embed stage; hydrated from the database once in start().
+        self.window = EmbeddingWindow(settings.SIMILARITY_WINDOW)
+
+        self.scheduler = CaptureScheduler(interval=interval)
+        self._stop_event = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._register_metrics()
+
+    def _register_metrics(self) -> None:
+        for name in ("capture", "embed", "write"):
+            stage: StageStats = getattr(self.stats, name)
+            for outcome in ("processed", "skipped", "dropped", "errors"):
+                registry.counter(
+                    "smarn_pipeline_frames_total",
+                    "Frames handled by each pipeline stage, by outcome.",
+                    {"stage": name, "outcome": outcome},
+                    fn=lambda stage=stage, outcome=outcome: getattr(stage, outcome),
+                )
+            registry.counter(
+                "smarn_pipeline_busy_seconds_total",
+                "Time each pipeline stage spent working.",
+                {"stage": name},
+                fn=lambda stage=stage: stage.busy_seconds,
+            )
+        for name in ("embed", "write"):
+            registry.gauge(
+                "smarn_pipeline_queue_depth",
+                "Frames waiting in front of each pipeline stage.",
+                {"stage": name},
+                fn=lambda name=name: self.queue_depths()[name],
+            )
+        registry.gauge(
+            "smarn_capture_interval_minutes",
+            "Current capture interval.",
+            fn=lambda: self.interval,
+        )
+
+    @property
+    def interval(self) -> float:
+        return self.scheduler.interval
+
+    def start(self) -> None:
+        """Start the embed and write stages followed by the capture stage."""
+        self.db.create_tables()
+        self.window.hydrate(self.db.get_last_embeddings(self.window.size))
+        for name, target in (
+            ("smarn-embed", self._embed_stage),
+            ("smarn-write", self._write_stage),
+            ("smarn-capture", self._capture_stage),
+        ):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info("Capture pipeline started.")
+
+    def stop(self, timeout: float | None = None) -> None:
+        """Stop capturing and let the queued frames drain through the pipeline."""
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads.clear()
+        self.db.flush()
+        self.encoder.shutdown()
+        if self.ocr is not None:
+            self.ocr.shutdown()
+        logger.info("Capture pipeline stopped.")
+
+    def run_forever(self) -> None:
+        """Start the pipeline and block, logging stats periodically."""
+        self.start()
+        try:
+            while not self._stop_event.wait(settings.STATS_LOG_PERIOD):
+                self.log_stats()
+        finally:
+            self.stop()
+
+    def queue_depths(self) -> dict[str, int]:
+        """Current number of frames waiting in front of each stage."""
+        return {
+            "embed": self.embed_queue.qsize(),
+            "write": self.write_queue.qsize(),
+        }
+
+    def log_stats(self) -> None:
+        depths = self.queue_depths()
+        for name in ("capture", "embed", "write"):
+            stage: StageStats = getattr(self.stats, name)
+            logger.info(
+                f"[pipeline:{name}] processed={stage.processed} skipped={stage.skipped} "
+                f"dropped={stage.dropped} "
+                f"errors={stage.errors} busy={stage.busy_seconds:.1f}s "
+                f"queue={depths.get(name, 0)}"
+            )
+
+    # --- Stages ---
+
+    def _capture_stage(self) -> None:
+        next_capture = time.monotonic()
+        while not self._stop_event.is_set():
+            delay = next_capture - time.monotonic()
+            if delay > 0 and self._stop_event.wait(delay):
+                break
+
+            started = time.monotonic()
+            try:
+                logger.info("Capturing screenshot...")
+                frame = self._capture_frame()
+                if frame is not None:
+                    self._offer(frame)
+                self.stats.capture.processed += 1
+            except Exception as e:
+                self.stats.capture.errors += 1
+                logger.error(f"Error capturing screenshot: {e}")
+            self.stats.capture.busy_seconds += time.monotonic() - started
+
+            # Schedule against the previous deadline so the cadence does not drift.
+            # If a capture overran a whole interval, restart the schedule from now.
+            next_capture += self.interval * 60
+            if next_capture < time.monotonic():
+                next_capture = time.monotonic() + self.interval * 60
+
+        self.embed_queue.put(_STOP)
+
+    def _capture_frame(self) -> Frame | None:
+        """
+        Take a screenshot and run it through the change detector.
+
+        Returns:
+            Frame | None: The frame to embed, or None if the screen is unchanged.
+        """
+        with _STEP_SECONDS["capture"].time():
+            capture = self.capture_fn()
+        if not isinstance(capture, Capture):
+            capture = Capture(capture)
+        captured_at = datetime.now(timezone.utc)
+        in_memory = capture.image is not None
+
+        img = capture.image
+        if img is None:
+            with Image.open(capture.path) as src:
+                img = src.convert("RGB")
+        with _STEP_SECONDS["change_detect"].time():
+            sample = self.detector.sample(img)
+            changed, _ = self.detector.has_changed(sample)
+
+        if not changed:
+            # Nothing worth embedding or storing.
+            if not in_memory:
+                _remove_file(capture.path)
+            self.stats.capture.skipped += 1
+            self.scheduler.observe_unchanged()
+            return None
+
+        application_name = capture.application_name
+        if application_name is None:
+            with _STEP_SECONDS["app_name"].time():
+                application_name = get_active_application_name()
+        return Frame(
+            path=capture.path,
+            captured_at=captured_at,
+            application_name=application_name,
+            image=img,
+            in_memory=in_memory,
+            stored=self._submit_encode(capture.path, img if in_memory else None),
+            sample=sample,
+        )
+
+    def _submit_encode(self, path: str, img: Image.Image | None) -> Future:
+        submitted = time.perf_counter()
+        if img is not None:
+            future = self.encoder.submit_image(img, path)
+        else:
+            # The worker decodes the raw file itself, which is cheaper than
+            # pickling the pixels over.
+            future = self.encoder.submit(path)
+        future.add_done_callback(
+            lambda _: _STEP_SECONDS["encode"].observe(time.perf_counter() - submitted)
+        )
+        return future
+
+    def _offer(self, frame: Frame) -> None:
+        """Enqueue a frame for embedding, dropping the oldest waiting frame if full."""
+        while True:
+            try:
+                self.embed_queue.put_nowait(frame)
+                return
+            except queue.Full:
+                try:
+                    stale = self.embed_queue.get_nowait()
+                except queue.Empty:
+                    continue
+                self.stats.embed.dropped += 1
+                logger.warning(
+                    f"Embedding is falling behind; dropping frame {stale.path}"
+                )
+                _discard(stale)
+
+    def _embed_stage(self) -> None:
+        while True:
+            frames = [self.embed_queue.get()]
+            # Drain whatever has piled up so a backlog is embedded in one forward
+            # pass. The model is only touched inside `_embed_batch`, whose errors
+            # are handled, so a model that fails to load cannot end the stage.
+            while frames[-1] is not _STOP and len(frames) < inference.max_batch:
+                try:
+                    frames.append(self.embed_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stopping = frames[-1] is _STOP
+            if stopping:
+                frames.pop()
+            if frames:
+                self._embed_batch(frames)
+            if stopping:
+                self.write_queue.put(_STOP)
+                return
+
+    def _embed_batch(self, frames: list[Frame]) -> None:
+        started = time.monotonic()
+        imgs: list[Image.Image] = []
+        for frame in frames:
+            imgs.append(frame.image)
+            with _STEP_SECONDS["thumbnail"].time():
+                frame.thumbnail_path = make_thumbnail(frame.path, frame.image)
+            # Only the encoder (which has its own copy) needs the pixels now.
+            frame.image = None
+
+        embs = []
+        embed_started = time.perf_counter()
+        try:
+            embs = inference.embed_images(imgs).result()
+            if len(imgs) > 1:
+                logger.info(f"Embedded a backlog of {len(imgs)} frames together.")
+            embed_seconds = time.perf_counter() - embed_started
+            _STEP_SECONDS["embed"].observe(embed_seconds)
+            _EMBED_BATCH_SIZE.observe(len(imgs))
+            self.scheduler.record_inference(embed_seconds / len(imgs))
+        except Exception as e:
+            # Any model error (torch, onnxruntime, I/O) fails the whole batch but
+            # must not end the stage: its frames are discarded below.
+            embs = []
+            self.stats.embed.errors += len(frames)
+            logger.error(f"Error getting image embeddings: {e}")
+        finally:
+            self.stats.embed.busy_seconds += time.monotonic() - started
+
+        for frame, emb in zip(frames, embs):
+            frame.embedding = emb
+            # Only now is the frame the screen later captures are compared with.
+            self.detector.commit(frame.sample)
+            with _STEP_SECONDS["similarity"].time():
+                similarity = compare_with_prev_img(emb, self.window)
+                self.window.push(emb)
+
+            if similarity is not None:
+                self.scheduler.observe(similarity)
+            else:
+                logger.info(
+                    "Similarity value was not returned. The database may be empty."
+                )
+            self.stats.embed.processed += 1
+        logger.info(f"CURRENT INTERVAL is {self.interval}")
+
+        for frame in frames:
+            if frame.embedding is not None:
+                # Blocks when the writer is behind; this is the backpressure point.
+                self.write_queue.put(frame)
+            else:
+                _discard(frame)
+
+    def _write_stage(self) -> None:
+        while True:
+            frame = self.write_queue.get()
+            if frame is _STOP:
+                return
+
+            started = time.monotonic()
+            try:
+                stored_path = self._wait_stored(frame)
+                # Queued for the database writer's next group commit; the stage
+                # moves on to the next frame without waiting for the sync.
+                inserted = self.db.insert_entry_async(
+                    stored_path,
+                    frame.embedding,
+                    frame.application_name,
+                    timestamp=frame.captured_at,
+                    thumbnail_path=frame.thumbnail_path,
+                )
+                inserted.add_done_callback(
+                    partial(
+                        self._on_inserted,
+                        stored_path=stored_path,
+                        submitted=time.perf_counter(),
+                    )
+                )
+            except Exception as e:
+                self.stats.write.errors += 1
+                logger.error(f"Error writing frame {frame.path}: {e}")
+            finally:
+                self.stats.write.busy_seconds += time.monotonic() - started
+
+    def _on_inserted(self, done: Future, stored_path: str, submitted: float) -> None:
+        """Account for a committed insert and queue its OCR (on the writer thread)."""
+        _STEP_SECONDS["insert"].observe(time.perf_counter() - submitted)
+        try:
+            entry_id = done.result()
+        except Exception as e:
+            self.stats.write.errors += 1
+            logger.error(f"Error inserting {stored_path}: {e}")
+            return
+        if self.ocr is not None:
+            self.ocr.submit(entry_id, stored_path)
+        self.stats.write.processed += 1
+
+    @staticmethod
+    def _wait_stored(frame: Frame) -> str:
+        """Wait for a frame's encoding and remove its raw capture."""
+        try:
+            stored_path = frame.stored.result()
+        except Exception as e:
+            if frame.in_memory:
+                raise
+            # Keep the raw capture rather than losing the frame.
+            logger.error(f"Error encoding {frame.path}; storing it raw: {e}")
+            return frame.path
+        if not frame.in_memory:
+            _remove_file(frame.path)
+        return stored_path
+
+
+def _make_ocr_worker() -> OcrWorker | None:
+    if not settings.OCR_ENABLED:
+        return None
+    if not ocr_available():
+        logger.warning("OCR is enabled but tesseract or pytesseract is missing.")
+        return None
+    return OcrWorker()
+
+
+def _discard(frame: Frame) -> None:
+    """Remove every file a frame that will not be stored has produced."""
+    if not frame.in_memory:
+        _remove_file(frame.path)
+    if frame.thumbnail_path:
+        _remove_file(frame.thumbnail_path)
+
+    def remove_stored(future: Future) -> None:
+        if future.exception() is None:
+            _remove_file(future.result())
+
+    if frame.stored is not None:
+        frame.stored.add_done_callback(remove_stored)
+
+
+def _remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError as e:
+        logger.debug(f"Could not remove {path}: {e}")
@@ -0,0 +1,223 @@
+"""
+The binary protocol spoken over the daemon's Unix socket.
+
+Every message is a frame: a 4-byte big-endian payload length, then the payload.
+The payload is a 1-byte message type followed by the message's fields, packed in
+network byte order:
+
+- strings: 2-byte length, then UTF-8 bytes;
+- optional times: float64 unix seconds, NaN for none;
+- embeddings: 2-byte dimension, then little-endian float32 values;
+- search results: 2-byte count, then per result the image path, application
+  name, timestamp and thumbnail path (empty for none) as strings, and the
+  distance as a float32 (NaN for none).
+
+A response carries the type of its request, or ERROR with a message string.
+"""
+
+import math
+import socket
+import struct
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+import numpy as np
+
+# Message types.
+PING = 0x01
+EMBED_TEXT = 0x02
+SEARCH = 0x03
+NEXT_PAGE = 0x04
+CLOSE_CURSOR = 0x05
+INGEST = 0x06
+ERROR = 0xFF
+
+MESSAGE_NAMES = {
+    PING: "ping",
+    EMBED_TEXT: "embed_text",
+    SEARCH: "search",
+    NEXT_PAGE: "next_page",
+    CLOSE_CURSOR: "close_cursor",
+    INGEST: "ingest",
+    ERROR: "error",
+}
+
+# Largest accepted payload; a page of results is a few KiB.
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+_LENGTH = struct.Struct("!I")
+
+
+class ProtocolError(Exception):
+    """Raised on a malformed or oversized message."""
+
+
+class Writer:
+    """Packs the fields of a message body."""
+
+    def __init__(self):
+        self._parts: list[bytes] = []
+
+    def u8(self, value: int) -> "Writer":
+        self._parts.append(struct.pack("!B", value))
+        return self
+
+    def u16(self, value: int) -> "Writer":
+        self._parts.append(struct.pack("!H", value))
+        return self
+
+    def u32(self, value: int) -> "Writer":
+        self._parts.append(struct.pack("!I", value))
+        return self
+
+    def i64(self, value: int) -> "Writer":
+        self._parts.append(struct.pack("!q", value))
+        return self
+
+    def f64(self, value: float) -> "Writer":
+        self._parts.append(struct.pack("!d", value))
+        return self
+
+    def str(self, value: str | None) -> "Writer":
+        data = (value or "").encode()
+        if len(data) > 0xFFFF:
+            raise ProtocolError(f"String of {len(data)} bytes is too long.")
+        self._parts.append(struct.pack("!H", len(data)) + data)
+        return self
+
+    def time(self, value: datetime | None) -> "Writer":
+        return self.f64(math.nan if value is None else value.timestamp())
+
+    def embedding(self, value: np.ndarray) -> "Writer":
+        flat = np.ravel(value).astype("<f4")
+        self._parts.append(struct.pack("!H", flat.size) + flat.tobytes())
+        return self
+
+    def results(self, results: List[Dict[str, Any]]) -> "Writer":
+        self.u16(len(results))
+        for item in results:
+            distance = item["distance"]
+            self.str(item["image_path"])
+            self.str(item["application_name"])
+            self.str(item["timestamp"])
+            self.str(item["thumbnail_path"])
+            self._parts.append(
+                struct.pack("!f", math.nan if distance is None else distance)
+            )
+        return self
+
+    def bytes(self) -> bytes:
+        return b"".join(self._parts)
+
+
+class Reader:
+    """Unpacks the fields of a message body, in the order they were written."""
+
+    def __init__(self, data: bytes):
+        self._data = memoryview(data)
+        self._offset = 0
+
+    def _take(self, size: int) -> memoryview:
+        end = self._offset + size
+        if end > len(self._data):
+            raise ProtocolError("Truncated message.")
+        view = self._data[self._offset : end]
+        self._offset = end
+        return view
+
+    def _unpack(self, fmt: str):
+        return struct.unpack(fmt, self._take(struct.calcsize(fmt)))[0]
+
+    def u8(self) -> int:
+        return self._unpack("!B")
+
+    def u16(self) -> int:
+        return self._unpack("!H")
+
+    def u32(self) -> int:
+        return self._unpack("!I")
+
+    def i64(self) -> int:
+        return self._unpack("!q")
+
+    def f64(self) -> float:
+        return self._unpack("!d")
+
+    def str(self) -> str:
+        return bytes(self._take(self.u16())).decode()
+
+    def time(self) -> datetime | None:
+        value = self.f64()
+        if math.isnan(value):
+            return None
+        return datetime.fromtimestamp(value, timezone.utc)
+
+    def embedding(self) -> np.ndarray:
+        size = self.u16()
+        return np.frombuffer(bytes(self._take(size * 4)), dtype="<f4")
+
+    def results(self) -> List[Dict[str, Any]]:
+        results = []
+        for _ in range(self.u16()):
+            image_path, application_name, timestamp, thumbnail_path = (
+                self.str(),
+                self.str(),
+                self.str(),
+                self.str(),
+            )
+            distance = self._unpack("!f")
+            results.append(
+                {
+                    "image_path": image_path,
+                    "application_name": application_name,
+                    "timestamp": timestamp,
+                    "distance": None if math.isnan(distance) else distance,
+                    "thumbnail_path": thumbnail_path or None,
+                }
+            )
+        return results
+
+
+def send_message(sock: socket.socket, type_: int, body: bytes = b"") -> None:
+    """
+    Send one framed message.
+
+    Args:
+        sock (socket.socket): The connected socket.
+        type_ (int): The message type.
+        body (bytes): The packed fields.
+    """
+    payload = struct.pack("!B", type_) + body
+    sock.sendall(_LENGTH.pack(len(payload)) + payload)
+
+
+def recv_message(sock: socket.socket) -> tuple[int, Reader] | None:
+    """
+    Receive one framed message.
+
+    Args:
+        sock (socket.socket): The connected socket.
+    Returns:
+        tuple[int, Reader] | None: The message type and a reader over its fields,
+            or None if the peer closed the connection between messages.
+    """
+    header = _recv_exact(sock, _LENGTH.size, allow_eof=True)
+    if header is None:
+        return None
+    (length,) = _LENGTH.unpack(header)
+    if not 0 < length <= MAX_FRAME_SIZE:
+        raise ProtocolError(f"Invalid frame length {length}.")
+    payload = _recv_exact(sock, length)
+    return payload[0], Reader(payload[1:])
+
+
+def _recv_exact(sock: socket.socket, size: int, allow_eof: bool = False):
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            if allow_eof and not buf:
+                return None
+            raise ConnectionError("Connection closed mid-message.")
+        buf += chunk
+    return bytes(buf)
@@ -0,0 +1,117 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+import numpy as np
+
+from config import settings
+
+from .shards import ShardedDatabase
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(text_query: str) -> str:
+    """
+    Normalize a text query for use as a cache key.
+
+    Only whitespace is normalized; case and punctuation can change the embedding.
+
+    Args:
+        text_query (str): The raw text query.
+    Returns:
+        str: The normalized query.
+    """
+    return " ".join(text_query.split())
+
+
+class QueryEmbeddingCache:
+    """
+    Cache of text query embeddings.
+
+    Embeddings are kept in an in-memory LRU and, optionally, in the `query_cache`
+    table of the database so they survive restarts. Entries are keyed by the model
+    identity, so switching models never returns a stale embedding.
+    """
+
+    def __init__(
+        self,
+        model_id: str,
+        capacity: int = settings.QUERY_CACHE_SIZE,
+        persist: bool = settings.QUERY_CACHE_PERSIST,
+    ):
+        """
+        Args:
+            model_id (str): Identity of the model producing the embeddings.
+            capacity (int): Maximum number of embeddings kept in memory.
+            persist (bool): Whether to also store embeddings in the database.
+        """
+        self.model_id = model_id
+        self.capacity = capacity
+        self.persist = persist
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(
+        self, text_query: str, compute: Callable[[str], np.ndarray]
+    ) -> np.ndarray:
+        """
+        Return the cached embedding for a query, computing and caching it on a miss.
+
+        Args:
+            text_query (str): The text query.
+            compute (Callable[[str], np.ndarray]): Computes the embedding of a query.
+        Returns:
+            np.ndarray: The (read-only) query embedding.
+        """
+        key = normalize_query(text_query)
+
+        with self._lock:
+            emb = self._entries.get(key)
+            if emb is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return emb
+
+        if self.persist:
+            emb = ShardedDatabase().get_cached_query_emb(self.model_id, key)
+            if emb is not None:
+                self._remember(key, emb)
+                with self._lock:
+                    self.hits += 1
+                return emb
+
+        emb = np.ravel(compute(key)).astype(np.float32)
+        emb.setflags(write=False)
+        self._remember(key, emb)
+        with self._lock:
+            self.misses += 1
+        if self.persist:
+            ShardedDatabase().put_cached_query_emb(
+                self.model_id, key, emb, settings.QUERY_CACHE_DISK_SIZE
+            )
+        return emb
+
+    def stats(self) -> dict[str, int]:
+        """Hit/miss counters and the number of embeddings held in memory."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+            }
+
+    def clear(self) -> None:
+        """Drop the in-memory entries (the on-disk table is left untouched)."""
+        with self._lock:
+            self._entries.clear()
+
+    def _remember(self, key: str, emb: np.ndarray) -> None:
+        with self._lock:
+            self._entries[key] = emb
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
@@ -0,0 +1,237 @@
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from config import settings
+
+from .shards import ShardedDatabase
+from .thumbnails import make_thumbnail
+from .utils import cosine_similarity
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "screenshots", "archive"
+)
+
+# Retention level an entry reaches once a tier's action has been applied to it.
+ACTION_LEVELS = {"dedupe": 1, "thumbnail": 2}
+# Pause between two batches so the capture writer can take the database lock.
+_BATCH_PAUSE = 0.05
+
+
+@dataclass
+class RetentionTier:
+    """
+    Captures older than `min_age` are reduced by `action` ("dedupe" or
+    "thumbnail"), or deleted with their month's shard ("retire").
+    """
+
+    min_age: timedelta
+    action: str
+
+
+@dataclass
+class CompactionReport:
+    deleted: int = 0
+    archived: int = 0
+    bytes_reclaimed: int = 0
+
+
+def default_policy() -> list[RetentionTier]:
+    """
+    The policy built from the settings: keep everything for RETENTION_KEEP_DAYS,
+    then keep one frame per run of near-duplicates per application, and only
+    thumbnails after RETENTION_DEDUPE_DAYS, and drop whole months after
+    RETENTION_RETIRE_DAYS.
+    """
+    policy = [RetentionTier(timedelta(days=settings.RETENTION_KEEP_DAYS), "dedupe")]
+    if settings.RETENTION_DEDUPE_DAYS > 0:
+        policy.append(
+            RetentionTier(timedelta(days=settings.RETENTION_DEDUPE_DAYS), "thumbnail")
+        )
+    if settings.RETENTION_RETIRE_DAYS > 0:
+        policy.append(
+            RetentionTier(timedelta(days=settings.RETENTION_RETIRE_DAYS), "retire")
+        )
+    return policy
+
+
+class Compactor:
+    """
+    Background compactor applying a tiered retention policy to old captures.
+
+    Entries are processed oldest first in batches of `batch_size`, each in its own
+    short transaction, and every entry records the retention level it has reached,
+    so a run can stop at any point and the next one picks up where it left off.
+    Rows in `img_info`, `vec_idx` and `vec_idx_bin` are deleted together and files
+    are removed only once the deleting transaction has committed. Retiring drops
+    a month's shard file in one go.
+    """
+
+    def __init__(
+        self,
+        policy: list[RetentionTier] | None = None,
+        batch_size: int = settings.COMPACT_BATCH_SIZE,
+        duplicate_similarity: float = settings.RETENTION_DUPLICATE_SIMILARITY,
+    ):
+        """
+        Args:
+            policy (list[RetentionTier], optional): Tiers to apply. Defaults to `default_policy()`.
+            batch_size (int): Entries processed per transaction.
+            duplicate_similarity (float): Cosine similarity above which frames are duplicates.
+        """
+        self.policy = sorted(
+            policy if policy is not None else default_policy(),
+            key=lambda tier: tier.min_age,
+        )
+        self.batch_size = batch_size
+        self.duplicate_similarity = duplicate_similarity
+        self.db = ShardedDatabase()
+        # Last kept embedding per application, carried across dedupe batches.
+        self._last_kept: dict[str, np.ndarray] = {}
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def run_once(self) -> CompactionReport:
+        """
+        Apply every tier of the policy to the entries that are old enough.
+
+        Returns:
+            CompactionReport: What was deleted, archived and reclaimed.
+        """
+        report = CompactionReport()
+        now = datetime.now(timezone.utc)
+        for tier in self.policy:
+            if self._stop_event.is_set():
+                break
+            if tier.action == "dedupe":
+                self._dedupe(now - tier.min_age, report)
+            elif tier.action == "thumbnail":
+                self._thumbnail(now - tier.min_age, report)
+            elif tier.action == "retire":
+                self._retire(now - tier.min_age, report)
+            else:
+                raise ValueError(f"Unknown retention action: {tier.action}")
+
+        logger.info(
+            f"Compaction finished: {report.deleted} deleted, "
+            f"{report.archived} archived, "
+            f"{report.bytes_reclaimed / 2**20:.1f} MiB reclaimed."
+        )
+        return report
+
+    def _dedupe(self, before: datetime, report: CompactionReport) -> None:
+        level = ACTION_LEVELS["dedupe"]
+        while not self._stop_event.is_set():
+            rows = self.db.get_retention_batch(
+                level, before, self.batch_size, with_embeddings=True
+            )
+            if not rows:
+                return
+
+            keep, drop = [], []
+            for id_, _, _, application_name, emb in rows:
+                last = self._last_kept.get(application_name)
+                if (
+                    last is not None
+                    and cosine_similarity(emb, last) >= self.duplicate_similarity
+                ):
+                    drop.append(id_)
+                else:
+                    keep.append(id_)
+                    self._last_kept[application_name] = emb
+
+            deleted = self.db.delete_entries(drop)
+            report.deleted += len(deleted)
+            self._remove_files(deleted, report)
+            self.db.set_retention_level(keep, level)
+            time.sleep(_BATCH_PAUSE)
+
+    def _thumbnail(self, before: datetime, report: CompactionReport) -> None:
+        level = ACTION_LEVELS["thumbnail"]
+        while not self._stop_event.is_set():
+            rows = self.db.get_retention_batch(level, before, self.batch_size)
+            if not rows:
+                return
+
+            for id_, image_path, thumbnail_path, _ in rows:
+                archived = None
+                if os.path.exists(image_path):
+                    # The thumbnail cache is size-bounded, so the archived copy
+                    # lives in its own directory that is never evicted.
+                    archived = make_thumbnail(
+                        image_path, thumbnail_dir=ARCHIVE_DIR, evict=False
+                    )
+                if archived is None:
+                    # The screenshot is gone already; keep whatever is left.
+                    self.db.set_retention_level([id_], level)
+                    continue
+
+                self.db.archive_entry(id_, archived, level)
+                report.archived += 1
+                self._remove_files([(image_path, thumbnail_path)], report)
+            time.sleep(_BATCH_PAUSE)
+
+    def _retire(self, before: datetime, report: CompactionReport) -> None:
+        retired = self.db.retire_before(before)
+        report.deleted += len(retired)
+        self._remove_files(retired, report)
+
+    def _remove_files(
+        self, paths: list[tuple[str, str | None]], report: CompactionReport
+    ) -> None:
+        """
+        Remove the files of deleted or archived entries. Thumbnails are keyed by
+        content, so one that another entry still points at is kept.
+        """
+        thumbnails = list({thumbnail for _, thumbnail in paths if thumbnail})
+        in_use = self.db.get_thumbnails_in_use(thumbnails)
+        for image_path, _ in paths:
+            report.bytes_reclaimed += _remove(image_path)
+        for thumbnail_path in thumbnails:
+            if thumbnail_path not in in_use:
+                report.bytes_reclaimed += _remove(thumbnail_path)
+
+    def start(self, interval: float = settings.COMPACT_INTERVAL) -> None:
+        """
+        Run the compactor every `interval` seconds on a background thread.
+
+        Args:
+            interval (float): Seconds between runs.
+        """
+
+        def loop():
+            while not self._stop_event.is_set():
+                try:
+                    self.run_once()
+                except Exception as e:
+                    logger.error(f"Error during compaction: {e}")
+                self._stop_event.wait(interval)
+
+        self._thread = threading.Thread(
+            target=loop, name="smarn-compactor", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def _remove(path: str | None) -> int:
+    """Remove a file and return the number of bytes freed."""
+    if not path:
+        return 0
+    try:
+        size = os.path.getsize(path)
+        os.remove(path)
+        return size
+    except OSError:
+        return 0
@@ -1,28 +1,29 @@
 import logging
 import os
 import subprocess
-import time
 from datetime import datetime
-from PIL import Image
+from typing import Callable
 
-from .db import Database
-from .model import model
-from .utils import (
-    compare_with_prev_img,
-    get_active_application_name,
-    identify_session,
-    modulate_interval,
-)
+from config import settings
+
+from .daemon import SmarnDaemon
+from .metrics import MetricsWriter
+from .pipeline import Capture, CapturePipeline
+from .retention import Compactor
+from .shards import ShardedDatabase
+from .utils import identify_session
+from .x11_capture import X11Error, X11Grabber
 
 logger = logging.getLogger(__name__)
 
 
-def capture() -> str:
-    """
-    A function that captures a screenshot (maim for X11 and grim for Wayland) and returns the path of the screenshot.
+def screenshot_stem() -> str:
     """
-    session_type = identify_session()
+    Get the path, without extension, of a screenshot taken now.
 
+    Returns:
+        str: `core/screenshots/smarn_<local time>`.
+    """
     smarn_dir = os.path.dirname(os.path.abspath(__file__))
     screenshots_dir = os.path.join(smarn_dir, "screenshots")
 
@@ -30,81 +31,138 @@ def capture() -> str:
         os.makedirs(screenshots_dir)
 
     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    filename = f"smarn_{timestamp}.png"
-    filepath = os.path.join(screenshots_dir, filename)
+    return os.path.join(screenshots_dir, f"smarn_{timestamp}")
+
+
+class CaptureError(RuntimeError):
+    """A screenshot could not be taken."""
+
+
+def capture() -> str:
+    """
+    A function that captures a screenshot (maim for X11 and grim for Wayland) and returns the path of the screenshot.
+
+    The capture is written uncompressed (PPM for grim, BMP for maim); it is encoded
+    into the storage format once, by `core.storage`, off the capture thread.
+
+    Raises:
+        CaptureError: If the capture tool failed or is missing, or the session is
+            not supported. The capture stage logs it and retries on its next tick.
+    """
+    session_type = identify_session()
+    filepath = screenshot_stem()
 
     if session_type == "W":  # Wayland session requires grim
-        try:
-            subprocess.run(["grim", filepath], check=True)
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Error executing grim: {e}")
-            exit(1)
-        except FileNotFoundError:
-            logger.error(
-                "grim was not found on this system. Error capturing screenshot."
-            )
-            exit(1)
-        return filepath
+        filepath += ".ppm"
+        command = ["grim", "-t", "ppm", filepath]
     elif session_type == "X":  # X11 session requires maim
-        try:
-            subprocess.run(["maim", filepath], check=True)
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Error executing maim: {e}")
-            exit(1)
-        except FileNotFoundError:
-            logger.error(
-                "maim was not found on this system. Error capturing screenshot."
-            )
-            exit(1)
-
-        compress_image(filepath)
-
-        logger.info(f"SCREENSHOT FILEPATH: {filepath}")
-        return filepath
+        filepath += ".bmp"
+        command = ["maim", "--format", "bmp", filepath]
     # Gnome support to be added
     else:
-        logger.error("Unknown session detected. Screenshot not possible.")
-        exit(1)
+        raise CaptureError("Unknown session detected. Screenshot not possible.")
+
+    try:
+        subprocess.run(command, check=True)
+    except subprocess.CalledProcessError as e:
+        raise CaptureError(f"Error executing {command[0]}: {e}") from e
+    except FileNotFoundError as e:
+        raise CaptureError(
+            f"{command[0]} was not found on this system. Error capturing screenshot."
+        ) from e
+    logger.info(f"SCREENSHOT FILEPATH: {filepath}")
+    return filepath
 
 
-def compress_image(filepath: str, quality: int = 65) -> None:
+class InProcessCapture:
     """
-    Compress the image file while retaining the PNG format.
+    Captures the X11 screen over a persistent display connection.
+
+    Frames stay in memory and the focused window's class is read over the same
+    connection, so a capture spawns no process and writes no file. If grabbing
+    fails, capturing falls back to `capture()` for the rest of the session.
+    """
+
+    def __init__(self, grabber: X11Grabber):
+        self.grabber: X11Grabber | None = grabber
+
+    def __call__(self) -> Capture | str:
+        if self.grabber is not None:
+            try:
+                return Capture(
+                    screenshot_stem(),
+                    image=self.grabber.grab(),
+                    application_name=self.grabber.active_window_class(),
+                )
+            except X11Error as e:
+                logger.warning(f"In-process capture failed; falling back to maim: {e}")
+                self.grabber.close()
+                self.grabber = None
+        return capture()
+
+
+def make_capture_fn(
+    backend: str = settings.CAPTURE_BACKEND,
+) -> Callable[[], Capture | str]:
+    """
+    Pick the capture function for this session.
+
+    Args:
+        backend (str): "auto", "x11" or "subprocess".
+    Returns:
+        Callable[[], Capture | str]: The capture function for `CapturePipeline`.
+    """
+    if backend not in ("auto", "x11", "subprocess"):
+        raise ValueError(f"Unknown capture backend: {backend}")
+    if backend == "subprocess":
+        return capture
+    try:
+        session_type = identify_session()
+    except ValueError:
+        return capture
+    # XWayland cannot see native Wayland windows, so only real X11 sessions.
+    if session_type != "X":
+        return capture
+
+    try:
+        return InProcessCapture(X11Grabber())
+    except X11Error as e:
+        if backend == "x11":
+            raise
+        logger.warning(f"In-process capture unavailable; using maim: {e}")
+        return capture
+
+
+def service(
+    serve: bool = settings.DAEMON_ENABLED, socket_path: str = settings.DAEMON_SOCKET
+) -> None:
+    """
+    Run the capture service.
+
+    Capturing, embedding and database writes run as separate pipeline stages, so the
+    capture cadence does not depend on how long the model takes to embed a frame.
+    Old captures are compacted in the background according to the retention policy,
+    and per-step timings are exported as described in `core.metrics`.
+
+    Args:
+        serve (bool): Also serve search requests on a Unix socket (see `core.daemon`).
+        socket_path (str): The socket to serve.
     """
-    compressed_filepath = filepath
-    with Image.open(filepath) as img:
-        img = img.convert("RGB")
-        img.save(compressed_filepath, "PNG", optimize=True, quality=quality)
-        logger.info(f"Compressed PNG image saved at {compressed_filepath}")
-
-
-def service() -> None:
-    db = Database()
-    db.create_tables()
-    interval: float = 1
-    while True:
-        logger.info("Capturing screenshot...")
-        current_screenshot_path: str = capture()
-        time.sleep(interval * 60)
-
-        try:
-            curr_img_emb = model.get_img_embs(Image.open(current_screenshot_path))
-        except ValueError:
-            logger.error("Error getting image embeddings.")
-            exit(1)
-
-        similarity = compare_with_prev_img(curr_img_emb)
-        active_application_name = get_active_application_name()
-
-        if similarity is not None:
-            interval = modulate_interval(interval, similarity)
-        else:
-            logger.info("Similarity value was not returned. The database may be empty.")
-
-        # Insert the entry into the database
-        db.insert_entry(current_screenshot_path, curr_img_emb, active_application_name)
-
-        logger.info(f"CURRENT INTERVAL is {interval}")
+    ShardedDatabase().create_tables()
+    metrics_writer = MetricsWriter("service")
+    metrics_writer.start()
+    compactor = Compactor()
+    compactor.start()
+    daemon = SmarnDaemon(socket_path) if serve else None
+    if daemon is not None and not daemon.start():
+        daemon = None
+    try:
+        CapturePipeline(make_capture_fn()).run_forever()
+    finally:
+        if daemon is not None:
+            daemon.stop()
+        compactor.stop()
+        metrics_writer.stop()
 
 
 if __name__ == "__main__":
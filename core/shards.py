@@ -0,0 +1,695 @@
+"""
+Time-partitioned storage: one database file per calendar month of captures.
+
+Entries are stored in the shard of the month (UTC) they were captured in, under
+`DATA_DIR/shards/YYYY-MM.sqlite`, and the shards are listed in the catalog
+(`DATA_DIR/catalog.sqlite`, which also holds the query cache). A database from
+before sharding (LEGACY_DB_FILE) is adopted in place as the oldest shard.
+
+Searches only open the shards overlapping their time range and query them in
+parallel, each on its own thread and connection, then merge the per-shard top k.
+Every shard keeps its own indexes (quantized, HNSW), so they stay small, and
+dropping a month is a file delete instead of a long DELETE. Whether a search uses
+the HNSW graphs depends on the entries of all the shards it covers.
+
+Usage: python -m core.shards [list | retire YYYY-MM]
+"""
+
+import argparse
+import logging
+import os
+import sqlite3
+import threading
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import closing
+from datetime import datetime, timezone
+
+import numpy as np
+
+from config import settings
+from config.log_config import setup_logging
+
+from .ann_index import index_path
+from .db import Database
+from .migrations import CATALOG_MIGRATIONS
+from .metrics import registry
+from .utils import reciprocal_rank_fusion
+
+logger = logging.getLogger(__name__)
+
+CATALOG_FILE = "catalog.sqlite"
+SHARD_DIR = "shards"
+# Key of the adopted pre-sharding database, so its ids are unchanged.
+LEGACY_KEY = 0
+# Entry ids are `shard key << 32 | id within the shard`: they stay unique across
+# shards and name the shard an entry lives in.
+_ID_BITS = 32
+_LOCAL_MASK = (1 << _ID_BITS) - 1
+
+
+def month_key(timestamp: datetime | None = None) -> int:
+    """
+    Key of the month a capture time falls in (UTC; naive times are taken as UTC,
+    like `format_timestamp` does).
+
+    Args:
+        timestamp (datetime, optional): The capture time. Defaults to now.
+    Returns:
+        int: `year * 12 + month - 1`.
+    """
+    if timestamp is None:
+        timestamp = datetime.now(timezone.utc)
+    elif timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc)
+    return timestamp.year * 12 + timestamp.month - 1
+
+
+def month_name(key: int) -> str:
+    """The `YYYY-MM` name of a month key."""
+    if key == LEGACY_KEY:
+        return "legacy"
+    return f"{key // 12:04d}-{key % 12 + 1:02d}"
+
+
+def parse_month(name: str) -> int:
+    """The key of a `YYYY-MM` month (or "legacy")."""
+    if name == "legacy":
+        return LEGACY_KEY
+    return month_key(datetime.strptime(name, "%Y-%m"))
+
+
+def month_bounds(key: int) -> tuple[int, int]:
+    """Unix times of the start of a month and of the next one."""
+    start = datetime(key // 12, key % 12 + 1, 1, tzinfo=timezone.utc)
+    end = datetime((key + 1) // 12, (key + 1) % 12 + 1, 1, tzinfo=timezone.utc)
+    return int(start.timestamp()), int(end.timestamp())
+
+
+def global_id(key: int, local_id: int) -> int:
+    """The id of an entry across shards."""
+    return key << _ID_BITS | local_id
+
+
+def split_id(id_: int) -> tuple[int, int]:
+    """The shard key and the id within the shard of an entry."""
+    return id_ >> _ID_BITS, id_ & _LOCAL_MASK
+
+
+class ShardCatalog:
+    """
+    The list of shards, in the `shards` table of the catalog file (created by
+    `CATALOG_MIGRATIONS`).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=settings.DB_BUSY_TIMEOUT)
+
+    def list(self) -> list[tuple[int, str, int, int]]:
+        """(key, path, start, end) rows, oldest first; times are unix seconds."""
+        with closing(self._connect()) as conn:
+            return conn.execute(
+                "SELECT key, path, start, end FROM shards ORDER BY key"
+            ).fetchall()
+
+    def add(self, key: int, path: str, start: int, end: int) -> None:
+        # Another process may have added the same month meanwhile.
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                """
+                    INSERT OR IGNORE INTO shards (key, path, start, end)
+                    VALUES (?, ?, ?, ?)
+                """,
+                (key, path, start, end),
+            )
+
+    def remove(self, key: int) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM shards WHERE key = ?", (key,))
+
+
+class Shard:
+    """
+    One monthly database file, and the thread that reads it.
+
+    Reads run on the shard's own thread, so each shard is searched over one
+    long-lived connection whatever thread the search came from, and searches of
+    several shards run in parallel. Writes go through the `Database` writer.
+    """
+
+    def __init__(self, key: int, path: str, start: int, end: int):
+        self.key = key
+        self.path = path
+        self.start = start
+        self.end = end
+        self.db = Database(path)
+        self._reader = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=f"smarn-shard-{self.name}"
+        )
+
+    @property
+    def name(self) -> str:
+        return month_name(self.key)
+
+    def overlaps(self, since: datetime | None, until: datetime | None) -> bool:
+        """Whether the shard may hold captures in `[since, until)`."""
+        if since is not None and self.end <= since.timestamp():
+            return False
+        if until is not None and self.start >= until.timestamp():
+            return False
+        return True
+
+    def read(self, method: str, *args, **kwargs) -> Future:
+        """Call a `Database` method on the shard's thread."""
+        return self._reader.submit(getattr(self.db, method), *args, **kwargs)
+
+    def close(self) -> None:
+        """Wait for the pending reads and writes, then close the file."""
+        self._reader.submit(self.db.close).result()
+        self._reader.shutdown()
+
+
+def _to_global(key: int, rows: list[tuple]) -> list[tuple]:
+    """Replace the shard-local ids leading some rows by global ones."""
+    return [(global_id(key, row[0]), *row[1:]) for row in rows]
+
+
+def _chain_id(future: Future, key: int) -> Future:
+    """A future of the global id of an entry, from that of its local id."""
+    chained = Future()
+
+    def done(inserted: Future) -> None:
+        if inserted.exception() is not None:
+            chained.set_exception(inserted.exception())
+        elif inserted.result() is None:
+            chained.set_result(None)
+        else:
+            chained.set_result(global_id(key, inserted.result()))
+
+    future.add_done_callback(done)
+    return chained
+
+
+class ShardedDatabase:
+    """
+    The entries of every shard behind the `Database` interface.
+
+    Ids returned by and passed to this class are global (see `global_id`).
+    Shards added or retired by another process are picked up from the catalog
+    on the next call that lists them.
+    """
+
+    # One instance per data directory, like `Database`.
+    _instances: dict[str, "ShardedDatabase"] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, data_dir: str = settings.DATA_DIR):
+        if getattr(self, "_initialized", False):
+            return
+        self.data_dir = data_dir
+        self.catalog = ShardCatalog(os.path.join(data_dir, CATALOG_FILE))
+        # The catalog file, with the shard list and the query cache only.
+        self.cache_db = Database(self.catalog.path)
+        self._shards: dict[int, Shard] = {}
+        self._shards_lock = threading.Lock()
+        registry.gauge(
+            "smarn_db_shards", "Open database shards.", fn=lambda: len(self._shards)
+        )
+        self._initialized = True
+
+    def __new__(cls, data_dir: str = settings.DATA_DIR):
+        key = os.path.abspath(data_dir)
+        with cls._lock:
+            if key not in cls._instances:
+                cls._instances[key] = super().__new__(cls)
+        return cls._instances[key]
+
+    def create_tables(self) -> None:
+        """Create the data directory and the catalog, adopting a legacy database."""
+        os.makedirs(os.path.join(self.data_dir, SHARD_DIR), exist_ok=True)
+        self.cache_db.create_tables(CATALOG_MIGRATIONS)
+        if not self.catalog.list():
+            self._adopt_legacy()
+        for shard in self.shards():
+            shard.db.create_tables()
+
+    def _adopt_legacy(self) -> None:
+        legacy = os.path.abspath(settings.LEGACY_DB_FILE)
+        if not os.path.exists(legacy):
+            return
+        db = Database(legacy)
+        db.create_tables()
+        time_range = db.get_time_range()
+        if time_range is None:
+            return
+        first, last = time_range
+        self.catalog.add(
+            LEGACY_KEY, legacy, int(first.timestamp()), int(last.timestamp()) + 1
+        )
+        logger.info(f"Adopted {legacy} as the shard of captures until {last}.")
+
+    def shards(
+        self, since: datetime | None = None, until: datetime | None = None
+    ) -> list[Shard]:
+        """
+        The shards overlapping a capture time range, oldest first.
+
+        Args:
+            since (datetime, optional): Start of the range.
+            until (datetime, optional): End of the range (exclusive).
+        Returns:
+            list[Shard]: The shards.
+        """
+        rows = self.catalog.list()
+        with self._shards_lock:
+            listed = {key for key, *_ in rows}
+            for key in [key for key in self._shards if key not in listed]:
+                # Retired by another process.
+                self._shards.pop(key).close()
+            for key, path, start, end in rows:
+                if key not in self._shards:
+                    if not os.path.isabs(path):
+                        path = os.path.join(self.data_dir, path)
+                    self._shards[key] = Shard(key, path, start, end)
+            shards = [self._shards[key] for key, *_ in rows]
+        return [shard for shard in shards if shard.overlaps(since, until)]
+
+    def _shard(self, key: int) -> Shard | None:
+        with self._shards_lock:
+            shard = self._shards.get(key)
+        if shard is None:
+            shard = next((s for s in self.shards() if s.key == key), None)
+        return shard
+
+    def _shard_for(self, timestamp: datetime | None) -> Shard:
+        """The shard of a capture time, created if needed."""
+        key = month_key(timestamp)
+        shard = self._shard(key)
+        if shard is None:
+            path = os.path.join(SHARD_DIR, f"{month_name(key)}.sqlite")
+            self.catalog.add(key, path, *month_bounds(key))
+            shard = self._shard(key)
+            shard.db.create_tables()
+            logger.info(f"Created the database shard of {shard.name}.")
+        return shard
+
+    def _by_shard(self, ids: list[int]) -> dict[Shard, list[int]]:
+        """Group global ids by their shard, as local ids."""
+        grouped: dict[Shard, list[int]] = defaultdict(list)
+        for id_ in ids:
+            key, local_id = split_id(id_)
+            shard = self._shard(key)
+            if shard is None:
+                logger.warning(f"Entry {id_} belongs to no shard.")
+                continue
+            grouped[shard].append(local_id)
+        return grouped
+
+    def flush(self) -> None:
+        """Block until every queued write of every shard has been committed."""
+        for shard in self.shards():
+            shard.db.flush()
+        self.cache_db.flush()
+
+    # --- Inserts ---
+
+    def insert_entry(
+        self,
+        image_path: str,
+        img_emb: np.ndarray,
+        application_name: str = "",
+        timestamp: datetime | None = None,
+        thumbnail_path: str | None = None,
+    ) -> int | None:
+        """Insert an entry into its month's shard; see `Database.insert_entry`."""
+        shard = self._shard_for(timestamp)
+        id_ = shard.db.insert_entry(
+            image_path, img_emb, application_name, timestamp, thumbnail_path
+        )
+        return None if id_ is None else global_id(shard.key, id_)
+
+    def insert_entry_async(
+        self,
+        image_path: str,
+        img_emb: np.ndarray,
+        application_name: str,
+        timestamp: datetime | None = None,
+        thumbnail_path: str | None = None,
+    ) -> Future:
+        """Queue an entry for its month's shard; see `Database.insert_entry_async`."""
+        shard = self._shard_for(timestamp)
+        inserted = shard.db.insert_entry_async(
+            image_path, img_emb, application_name, timestamp, thumbnail_path
+        )
+        return _chain_id(inserted, shard.key)
+
+    def insert_entries(self, entries: list[tuple]) -> int:
+        """
+        Insert many entries, in one transaction per month.
+
+        Args:
+            entries (list[tuple]): (image_path, img_emb, application_name, timestamp,
+                thumbnail_path) tuples.
+        Returns:
+            int: Number of entries inserted.
+        """
+        by_month: dict[int, list[tuple]] = defaultdict(list)
+        for entry in entries:
+            by_month[month_key(entry[3])].append(entry)
+        return sum(
+            self._shard_for(rows[0][3]).db.insert_entries(rows)
+            for rows in by_month.values()
+        )
+
+    # --- Search ---
+
+    def get_top_k_entries(
+        self,
+        text_emb: np.ndarray,
+        k: int,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        apps: list[str] | None = None,
+        quantized: bool | None = None,
+        approximate: bool | None = None,
+    ) -> list[tuple[str, str, str, float, str | None]] | None:
+        """
+        Get the top k entries of the shards overlapping `[since, until)`, searched in
+        parallel; see `Database.get_top_k_entries`.
+        """
+        shards = self.shards(since, until)
+        approximate = self._approximate(shards, approximate, since, until, apps)
+        results = [
+            future.result()
+            for future in [
+                shard.read(
+                    "get_top_k_entries",
+                    text_emb,
+                    k,
+                    since,
+                    until,
+                    apps,
+                    quantized,
+                    approximate,
+                )
+                for shard in shards
+            ]
+        ]
+        if all(entries is None for entries in results):
+            return None
+        merged = [entry for entries in results if entries for entry in entries]
+        return sorted(merged, key=lambda entry: entry[3])[:k]
+
+    def get_top_k_hybrid(
+        self,
+        text_emb: np.ndarray,
+        text_query: str,
+        k: int,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        apps: list[str] | None = None,
+        quantized: bool | None = None,
+        approximate: bool | None = None,
+    ) -> list[tuple[str, str, str, float | None, str | None]] | None:
+        """
+        Get the top k entries by both embedding and OCR text; see
+        `Database.get_top_k_hybrid`.
+
+        Over several shards, the merged KNN ranking and the merged BM25 ranking are
+        fused. BM25 scores use each shard's own term statistics, which is close
+        enough to rank matches of the same query.
+        """
+        shards = self.shards(since, until)
+        approximate = self._approximate(shards, approximate, since, until, apps)
+        if len(shards) == 1:
+            return (
+                shards[0]
+                .read(
+                    "get_top_k_hybrid",
+                    text_emb,
+                    text_query,
+                    k,
+                    since,
+                    until,
+                    apps,
+                    quantized,
+                    approximate,
+                )
+                .result()
+            )
+
+        vector_futures = [
+            shard.read(
+                "get_top_k_entries",
+                text_emb,
+                k,
+                since,
+                until,
+                apps,
+                quantized,
+                approximate,
+            )
+            for shard in shards
+        ]
+        text_futures = [
+            shard.read("get_top_k_text", text_query, k, since, until, apps)
+            for shard in shards
+        ]
+        vector_results = [future.result() for future in vector_futures]
+        if all(entries is None for entries in vector_results):
+            return None
+        vector_hits = sorted(
+            (entry for entries in vector_results if entries for entry in entries),
+            key=lambda entry: entry[3],
+        )[:k]
+        text_hits = sorted(
+            (
+                entry
+                for entries in (future.result() for future in text_futures)
+                if entries
+                for entry in entries
+            ),
+            key=lambda entry: entry[3],
+        )[:k]
+
+        entries = {entry[0]: (*entry[:3], None, entry[4]) for entry in text_hits}
+        entries.update((entry[0], entry) for entry in vector_hits)
+        fused = reciprocal_rank_fusion(
+            [[entry[0] for entry in vector_hits], [entry[0] for entry in text_hits]],
+            settings.RRF_K,
+        )[:k]
+        logger.info(
+            f"Fetched top {k} entries from {len(shards)} shards "
+            f"({len(text_hits)} matched the OCR text)."
+        )
+        return [entries[image_path] for image_path, _ in fused]
+
+    def _approximate(
+        self,
+        shards: list[Shard],
+        approximate: bool | None,
+        since: datetime | None,
+        until: datetime | None,
+        apps: list[str] | None,
+    ) -> bool | None:
+        """
+        Whether an unfiltered search of `shards` uses their HNSW graphs.
+
+        HNSW_MIN_ROWS applies to the shards searched together rather than to each
+        one, as a single month rarely holds that many captures.
+        """
+        if approximate is not None or since or until or apps or not settings.HNSW_INDEX:
+            return approximate
+        sizes = [shard.read("ann_size") for shard in shards]
+        return sum(future.result() for future in sizes) >= settings.HNSW_MIN_ROWS
+
+    # --- Capture pipeline ---
+
+    def get_last_entry(self) -> tuple[bytes, str] | None:
+        """Get the last entry of the newest shard that has one."""
+        for shard in reversed(self.shards()):
+            entry = shard.read("get_last_entry").result()
+            if entry is not None:
+                return entry
+        return None
+
+    def get_last_embeddings(self, n: int) -> list[np.ndarray]:
+        """Get the embeddings of the last `n` entries across shards, oldest first."""
+        embs: list[np.ndarray] = []
+        for shard in reversed(self.shards()):
+            if len(embs) >= n:
+                break
+            embs = shard.read("get_last_embeddings", n - len(embs)).result() + embs
+        return embs
+
+    def set_thumbnail_path(self, image_path: str, thumbnail_path: str) -> None:
+        """Record the thumbnail of an image, in whichever shard holds it."""
+        for shard in self.shards():
+            shard.db.set_thumbnail_path(image_path, thumbnail_path)
+
+    def get_indexed_paths(self) -> set[str]:
+        """Get the image path of every entry of every shard."""
+        paths: set[str] = set()
+        for shard in self.shards():
+            paths |= shard.read("get_indexed_paths").result()
+        return paths
+
+    def get_thumbnails_in_use(self, thumbnail_paths: list[str]) -> set[str]:
+        """Get which thumbnails an entry of any shard still points at."""
+        futures = [
+            shard.read("get_thumbnails_in_use", thumbnail_paths)
+            for shard in self.shards()
+        ]
+        return set().union(*(future.result() for future in futures))
+
+    # --- Query cache ---
+
+    def get_cached_query_emb(self, model_id: str, query: str) -> np.ndarray | None:
+        """See `Database.get_cached_query_emb`."""
+        return self.cache_db.get_cached_query_emb(model_id, query)
+
+    def put_cached_query_emb(
+        self,
+        model_id: str,
+        query: str,
+        text_emb: np.ndarray,
+        max_entries: int = settings.QUERY_CACHE_DISK_SIZE,
+    ) -> None:
+        """See `Database.put_cached_query_emb`."""
+        self.cache_db.put_cached_query_emb(model_id, query, text_emb, max_entries)
+
+    # --- Retention and OCR ---
+
+    def get_retention_batch(
+        self,
+        below_level: int,
+        before: datetime,
+        limit: int,
+        with_embeddings: bool = False,
+    ) -> list[tuple]:
+        """Get the oldest entries below a retention level; see `Database`."""
+        rows: list[tuple] = []
+        for shard in self.shards(until=before):
+            if len(rows) >= limit:
+                break
+            batch = shard.read(
+                "get_retention_batch",
+                below_level,
+                before,
+                limit - len(rows),
+                with_embeddings,
+            ).result()
+            rows += _to_global(shard.key, batch)
+        return rows
+
+    def set_retention_level(self, ids: list[int], level: int) -> None:
+        for shard, local_ids in self._by_shard(ids).items():
+            shard.db.set_retention_level(local_ids, level)
+
+    def archive_entry(self, id_: int, archived_path: str, level: int) -> None:
+        for shard, (local_id,) in self._by_shard([id_]).items():
+            shard.db.archive_entry(local_id, archived_path, level)
+
+    def delete_entries(self, ids: list[int]) -> list[tuple[str, str | None]]:
+        """Delete entries; returns the (image_path, thumbnail_path) of the deleted."""
+        deleted = []
+        for shard, local_ids in self._by_shard(ids).items():
+            deleted += shard.db.delete_entries(local_ids)
+        return deleted
+
+    def set_ocr_text(self, id_: int, text: str) -> None:
+        for shard, (local_id,) in self._by_shard([id_]).items():
+            shard.db.set_ocr_text(local_id, text)
+
+    def get_entries_without_text(self, limit: int) -> list[tuple[int, str]]:
+        """Get entries that have not been through OCR yet, oldest first."""
+        rows: list[tuple[int, str]] = []
+        for shard in self.shards():
+            if len(rows) >= limit:
+                break
+            batch = shard.read("get_entries_without_text", limit - len(rows)).result()
+            rows += _to_global(shard.key, batch)
+        return rows
+
+    # --- Maintenance ---
+
+    def build_quantized_index(self) -> int:
+        """Fill the quantized index of every shard; returns the rows added."""
+        return sum(shard.db.build_quantized_index() for shard in self.shards())
+
+    def build_ann_index(self) -> int:
+        """Rebuild the HNSW graph of every shard; returns the entries indexed."""
+        return sum(shard.db.build_ann_index() for shard in self.shards())
+
+    def retire(self, key: int) -> list[tuple[str, str | None]]:
+        """
+        Drop a month: remove it from the catalog and delete its files.
+
+        Args:
+            key (int): The month key (see `month_key`).
+        Returns:
+            list[tuple[str, str | None]]: (image_path, thumbnail_path) of the
+                entries it held; the screenshots themselves are left to the caller.
+        """
+        shard = self._shard(key)
+        if shard is None:
+            return []
+        paths = shard.read("get_entry_paths").result()
+        self.catalog.remove(key)
+        with self._shards_lock:
+            self._shards.pop(key, None)
+        shard.close()
+        for path in (
+            shard.path,
+            f"{shard.path}-wal",
+            f"{shard.path}-shm",
+            index_path(shard.path),
+        ):
+            if os.path.exists(path):
+                os.remove(path)
+        logger.info(f"Retired the shard of {shard.name} ({len(paths)} entries).")
+        return paths
+
+    def retire_before(self, before: datetime) -> list[tuple[str, str | None]]:
+        """Retire every shard whose captures all precede `before`; see `retire`."""
+        paths = []
+        for shard in self.shards(until=before):
+            if shard.end <= before.timestamp():
+                paths += self.retire(shard.key)
+        return paths
+
+    def purge_entries(self) -> None:
+        """Retire every shard."""
+        for shard in self.shards():
+            self.retire(shard.key)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("list", help="List the shards.")
+    retire = commands.add_parser(
+        "retire", help="Delete a month's shard; its screenshot files are kept."
+    )
+    retire.add_argument("month", help='YYYY-MM, or "legacy".')
+    args = parser.parse_args()
+
+    setup_logging()
+    db = ShardedDatabase()
+    db.create_tables()
+    if args.command == "retire":
+        retired = db.retire(parse_month(args.month))
+        print(f"Retired {args.month}: {len(retired)} entries.")
+        return
+    for shard in db.shards():
+        size = os.path.getsize(shard.path) if os.path.exists(shard.path) else 0
+        print(f"{shard.name}\t{size / 2**20:.1f} MiB\t{shard.path}")
+
+
+if __name__ == "__main__":
+    main()
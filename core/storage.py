@@ -0,0 +1,167 @@
+import logging
+import multiprocessing
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from PIL import Image, features
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Codec name -> (file extension, Pillow format)
+CODECS = {
+    "webp": ("webp", "WEBP"),
+    "webp-lossless": ("webp", "WEBP"),
+    "avif": ("avif", "AVIF"),
+    "png": ("png", "PNG"),
+}
+
+
+def _save_options(codec: str, quality: int) -> dict:
+    if codec == "webp":
+        return {"quality": quality, "method": 4}
+    if codec == "webp-lossless":
+        # For lossless WebP, `quality` trades encode time for size instead.
+        return {"lossless": True, "quality": quality, "method": 2}
+    if codec == "avif":
+        return {"quality": quality, "speed": 8}
+    if codec == "png":
+        return {"compress_level": 1}
+    raise ValueError(f"Unknown storage codec: {codec}")
+
+
+def codec_available(codec: str) -> bool:
+    """
+    Check whether the installed Pillow can encode a codec.
+
+    Args:
+        codec (str): The codec name.
+    Returns:
+        bool: Whether the codec can be used.
+    """
+    if codec.startswith("webp"):
+        return features.check("webp")
+    if codec == "avif":
+        return CODECS["avif"][1] in Image.SAVE or features.check("avif")
+    return codec in CODECS
+
+
+def encode_image(img: Image.Image, fp, codec: str, quality: int) -> None:
+    """
+    Encode an image with a storage codec.
+
+    Args:
+        img (Image.Image): The image to encode.
+        fp: A path or writable binary file object.
+        codec (str): The codec name.
+        quality (int): Codec quality (0-100).
+    """
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    img.save(fp, CODECS[codec][1], **_save_options(codec, quality))
+
+
+def encode_screenshot(
+    raw_path: str,
+    codec: str = settings.STORAGE_CODEC,
+    quality: int = settings.STORAGE_QUALITY,
+) -> str:
+    """
+    Encode a raw capture into the storage format, next to the raw file.
+
+    The raw file is left in place; the caller removes it once nothing else needs it.
+
+    Args:
+        raw_path (str): Path of the uncompressed capture.
+        codec (str): The codec name.
+        quality (int): Codec quality (0-100).
+    Returns:
+        str: Path of the encoded screenshot.
+    """
+    extension = CODECS[codec][0]
+    stored_path = f"{os.path.splitext(raw_path)[0]}.{extension}"
+    with Image.open(raw_path) as img:
+        encode_image(img, stored_path, codec, quality)
+    logger.debug(
+        f"Encoded {raw_path} as {codec} ({os.path.getsize(stored_path)} bytes)"
+    )
+    return stored_path
+
+
+def encode_frame(
+    img: Image.Image,
+    stem: str,
+    codec: str = settings.STORAGE_CODEC,
+    quality: int = settings.STORAGE_QUALITY,
+) -> str:
+    """
+    Encode an in-memory capture into the storage format.
+
+    Args:
+        img (Image.Image): The captured screen.
+        stem (str): Path to store the screenshot at, without extension.
+        codec (str): The codec name.
+        quality (int): Codec quality (0-100).
+    Returns:
+        str: Path of the encoded screenshot.
+    """
+    stored_path = f"{stem}.{CODECS[codec][0]}"
+    encode_image(img, stored_path, codec, quality)
+    return stored_path
+
+
+class ScreenshotEncoder:
+    """
+    Encodes captures in a worker process so encoding never blocks the capture loop.
+    """
+
+    def __init__(
+        self,
+        codec: str = settings.STORAGE_CODEC,
+        quality: int = settings.STORAGE_QUALITY,
+        workers: int = settings.ENCODE_WORKERS,
+    ):
+        """
+        Args:
+            codec (str): The codec name.
+            quality (int): Codec quality (0-100).
+            workers (int): Number of encoder processes.
+        """
+        if codec not in CODECS:
+            raise ValueError(f"Unknown storage codec: {codec}")
+        if not codec_available(codec):
+            logger.warning(f"Pillow cannot encode {codec}; falling back to webp.")
+            codec = "webp"
+        self.codec = codec
+        self.quality = quality
+        # Spawned rather than forked: the parent runs model and GUI threads.
+        self._pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        )
+
+    def submit(self, raw_path: str) -> Future:
+        """
+        Queue a raw capture for encoding.
+
+        Args:
+            raw_path (str): Path of the uncompressed capture.
+        Returns:
+            Future: Resolves to the path of the encoded screenshot.
+        """
+        return self._pool.submit(encode_screenshot, raw_path, self.codec, self.quality)
+
+    def submit_image(self, img: Image.Image, stem: str) -> Future:
+        """
+        Queue an in-memory capture for encoding.
+
+        Args:
+            img (Image.Image): The captured screen; pickled to the worker.
+            stem (str): Path to store the screenshot at, without extension.
+        Returns:
+            Future: Resolves to the path of the encoded screenshot.
+        """
+        return self._pool.submit(encode_frame, img, stem, self.codec, self.quality)
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=True)
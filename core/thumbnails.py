@@ -0,0 +1,139 @@
+import hashlib
+import logging
+import os
+import threading
+
+from PIL import Image
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "screenshots", "thumbnails"
+)
+# Bounding box of the result cards in the GUI.
+THUMBNAIL_SIZE = (380, 260)
+
+_evict_lock = threading.Lock()
+_created_since_evict = 0
+# Number of new thumbnails between two eviction passes.
+_EVICT_EVERY = 50
+
+
+def _content_key(image_path: str, img: Image.Image | None = None) -> str:
+    """Hash of the image file's contents, or of the pixels if there is no file."""
+    digest = hashlib.blake2b(digest_size=16)
+    if img is not None and not os.path.exists(image_path):
+        digest.update(img.tobytes())
+        return digest.hexdigest()
+    with open(image_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_thumbnail(
+    image_path: str,
+    img: Image.Image | None = None,
+    thumbnail_dir: str = THUMBNAIL_DIR,
+    evict: bool = True,
+) -> str | None:
+    """
+    Create (or reuse) the thumbnail of a screenshot.
+
+    Thumbnails are keyed by the screenshot's content, so re-creating one for the
+    same file is a hash plus a stat.
+
+    Args:
+        image_path (str): The screenshot path; may not exist yet if `img` is given.
+        img (Image.Image, optional): The already decoded screenshot, to avoid decoding it again.
+        thumbnail_dir (str): Directory to store the thumbnail in.
+        evict (bool): Whether the directory is subject to size-bounded eviction.
+    Returns:
+        str | None: The thumbnail path, or None if the screenshot could not be read.
+    """
+    global _created_since_evict
+
+    try:
+        thumbnail_path = os.path.join(
+            thumbnail_dir,
+            f"{_content_key(image_path, img)}.{settings.THUMBNAIL_FORMAT}",
+        )
+        if os.path.exists(thumbnail_path):
+            os.utime(thumbnail_path)  # Mark as recently used for eviction
+            return thumbnail_path
+
+        os.makedirs(thumbnail_dir, exist_ok=True)
+        if img is None:
+            with Image.open(image_path) as src:
+                thumb = _shrink(src)
+        else:
+            thumb = _shrink(img)
+
+        # Write to a temporary file first so readers never see a partial thumbnail.
+        tmp_path = f"{thumbnail_path}.{threading.get_ident()}.tmp"
+        thumb.save(tmp_path, settings.THUMBNAIL_FORMAT.upper(), quality=75)
+        os.replace(tmp_path, thumbnail_path)
+    except OSError as e:
+        logger.error(f"Error creating thumbnail for {image_path}: {e}")
+        return None
+
+    if evict:
+        with _evict_lock:
+            _created_since_evict += 1
+            run_eviction = _created_since_evict >= _EVICT_EVERY
+            if run_eviction:
+                _created_since_evict = 0
+        if run_eviction:
+            evict_thumbnails(thumbnail_dir)
+    return thumbnail_path
+
+
+def _shrink(img: Image.Image) -> Image.Image:
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    thumb = img.copy()
+    thumb.thumbnail(THUMBNAIL_SIZE, Image.BILINEAR, reducing_gap=2.0)
+    return thumb
+
+
+def evict_thumbnails(
+    thumbnail_dir: str = THUMBNAIL_DIR,
+    max_bytes: int = settings.THUMBNAIL_CACHE_BYTES,
+) -> int:
+    """
+    Delete the least recently used thumbnails until the directory fits in `max_bytes`.
+
+    Evicted thumbnails are re-created on demand from their screenshot.
+
+    Args:
+        thumbnail_dir (str): The thumbnail directory.
+        max_bytes (int): The size budget of the directory.
+    Returns:
+        int: Number of bytes freed.
+    """
+    try:
+        entries = [
+            entry
+            for entry in os.scandir(thumbnail_dir)
+            if entry.is_file() and not entry.name.endswith(".tmp")
+        ]
+    except FileNotFoundError:
+        return 0
+
+    stats = [(entry.path, entry.stat()) for entry in entries]
+    total = sum(stat.st_size for _, stat in stats)
+    freed = 0
+    for path, stat in sorted(stats, key=lambda item: item[1].st_mtime):
+        if total - freed <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            freed += stat.st_size
+        except OSError as e:
+            logger.debug(f"Could not evict thumbnail {path}: {e}")
+
+    if freed:
+        logger.info(f"Evicted {freed} bytes of thumbnails.")
+    return freed
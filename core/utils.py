@@ -1,12 +1,9 @@
 import logging
 import os
-import struct
 import subprocess
 
 import numpy as np
 
-from .db import Database
-
 logger = logging.getLogger(__name__)
 
 
@@ -15,13 +12,14 @@ def deserialize(serialized_data: bytes) -> np.ndarray:
     """
     Deserializes raw bytes back into a numpy array.
 
+    The returned array is a read-only view over `serialized_data`; no copy is made.
+
     Args:
         serialized_data (bytes): Raw bytes from database.
     Returns:
-        np.ndarray: Deserialized numpy array.
+        np.ndarray: Deserialized float32 numpy array.
     """
-    num_floats = len(serialized_data) // struct.calcsize("f")  # number of floats
-    return np.array(list(struct.unpack(f"{num_floats}f", serialized_data)))
+    return np.frombuffer(serialized_data, dtype=np.float32)
 
 
 def cosine_similarity(vec1: np.ndarray, vec2: np.ndarray) -> float:
@@ -34,37 +32,100 @@ def cosine_similarity(vec1: np.ndarray, vec2: np.ndarray) -> float:
     Returns:
         float: The cosine similarity of two vectors.
     """
+    vec1 = np.ravel(vec1)
+    vec2 = np.ravel(vec2)
     vec1_norm = np.linalg.norm(vec1)
     vec2_norm = np.linalg.norm(vec2)
 
     if vec1_norm == 0 or vec2_norm == 0:
         return 0.0
 
-    return np.dot(vec1, vec2) / (vec1_norm * vec2_norm)
+    return float(np.dot(vec1, vec2) / (vec1_norm * vec2_norm))
+
+
+class EmbeddingWindow:
+    """
+    Ring buffer holding the embeddings of the last `size` captured frames.
+
+    Rows are stored L2-normalized in one contiguous float32 matrix, so the cosine
+    similarity against the whole window is a single matrix-vector product.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._buf: np.ndarray | None = None
+        self._count = 0
+        self._next = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def push(self, emb: np.ndarray) -> None:
+        """
+        Add an embedding to the window, evicting the oldest one if the window is full.
+
+        Args:
+            emb (np.ndarray): The embedding to add.
+        """
+        emb = np.ravel(emb).astype(np.float32)
+        if self._buf is None:
+            self._buf = np.zeros((self.size, emb.shape[0]), dtype=np.float32)
+
+        norm = np.linalg.norm(emb)
+        self._buf[self._next] = emb / norm if norm else emb
+        self._next = (self._next + 1) % self.size
+        self._count = min(self._count + 1, self.size)
+
+    def similarities(self, emb: np.ndarray) -> np.ndarray:
+        """
+        Cosine similarity of an embedding against every embedding in the window.
+
+        Args:
+            emb (np.ndarray): The embedding to compare.
+        Returns:
+            np.ndarray: One similarity per stored embedding (empty if the window is empty).
+        """
+        if self._buf is None or self._count == 0:
+            return np.empty(0, dtype=np.float32)
+
+        emb = np.ravel(emb).astype(np.float32)
+        norm = np.linalg.norm(emb)
+        if norm == 0:
+            return np.zeros(self._count, dtype=np.float32)
+        return self._buf[: self._count] @ (emb / norm)
+
+    def hydrate(self, embs: list[np.ndarray]) -> None:
+        """
+        Fill the window from stored embeddings, oldest first.
+
+        Args:
+            embs (list[np.ndarray]): The embeddings to load.
+        """
+        for emb in embs[-self.size :]:
+            self.push(emb)
 
 
 def compare_with_prev_img(
     curr_img_emb: np.ndarray,
+    window: EmbeddingWindow,
 ) -> float | None:
     """
-    Compares a given image to the last entry in the DB.
+    Compares a given image to the recently captured images.
 
     Args:
-        curr_img_emb (np.ndarray): The image emb to compare with the last entry.
+        curr_img_emb (np.ndarray): The image emb to compare with the recent images.
+        window (EmbeddingWindow): Embeddings of the recently captured images.
     Returns:
-        float | None: The cosine similarity between the current image and the last entry.
+        float | None: The highest cosine similarity between the current image and the
+            recent images, or None if there are no recent images.
     """
-    last_entry = Database().get_last_entry()
+    similarities = window.similarities(curr_img_emb)
 
-    if last_entry is None:
+    if similarities.size == 0:
         logger.debug("No last entry detected.")
         return None
 
-    last_entry_emb = deserialize(last_entry[0])
-
-    similarity = cosine_similarity(curr_img_emb, last_entry_emb)
-
-    return similarity
+    return float(similarities.max())
 
 
 def identify_session() -> str:
@@ -129,5 +190,27 @@ def modulate_interval(interval: float, cosine_similarity: float) -> float:
     return interval
 
 
+def reciprocal_rank_fusion(
+    rankings: list[list[int]], k: int = 60
+) -> list[tuple[int, float]]:
+    """
+    Fuse several rankings of the same items with reciprocal rank fusion.
+
+    Each item scores the sum of `1 / (k + rank)` over the rankings it appears in,
+    so items ranked well by several rankings beat items ranked first by only one.
+
+    Args:
+        rankings (list[list[int]]): Item ids, best first, one list per ranking.
+        k (int): Dampens the weight of the top ranks.
+    Returns:
+        list[tuple[int, float]]: (id, score) pairs, best first.
+    """
+    scores: dict[int, float] = {}
+    for ranking in rankings:
+        for rank, id_ in enumerate(ranking, start=1):
+            scores[id_] = scores.get(id_, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
 if __name__ == "__main__":
     print(get_active_application_name())
@@ -0,0 +1,519 @@
+"""
+In-process X11 screen grabbing through libX11 (and MIT-SHM when available).
+
+One display connection is kept open for the life of the grabber, so a capture is
+a single XShmGetImage (or XGetImage) round trip into memory instead of spawning
+maim, writing an image file and decoding it again. The active window's class is
+read over the same connection instead of spawning xdotool.
+
+`X11IdleMonitor` reads the user's input idle time the same way.
+"""
+
+import ctypes
+import ctypes.util
+import logging
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+_ALL_PLANES = ctypes.c_ulong(~0).value
+_Z_PIXMAP = 2
+_XA_WINDOW = 33
+_IPC_PRIVATE = 0
+_IPC_CREAT = 0o1000
+_IPC_RMID = 0
+
+
+class X11Error(Exception):
+    """Raised when the X server cannot be grabbed from."""
+
+
+class _XImage(ctypes.Structure):
+    pass
+
+
+_DestroyImageFunc = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.POINTER(_XImage))
+
+
+class _XImageFuncs(ctypes.Structure):
+    _fields_ = [
+        ("create_image", ctypes.c_void_p),
+        ("destroy_image", _DestroyImageFunc),
+        ("get_pixel", ctypes.c_void_p),
+        ("put_pixel", ctypes.c_void_p),
+        ("sub_image", ctypes.c_void_p),
+        ("add_pixel", ctypes.c_void_p),
+    ]
+
+
+_XImage._fields_ = [
+    ("width", ctypes.c_int),
+    ("height", ctypes.c_int),
+    ("xoffset", ctypes.c_int),
+    ("format", ctypes.c_int),
+    ("data", ctypes.c_void_p),
+    ("byte_order", ctypes.c_int),
+    ("bitmap_unit", ctypes.c_int),
+    ("bitmap_bit_order", ctypes.c_int),
+    ("bitmap_pad", ctypes.c_int),
+    ("depth", ctypes.c_int),
+    ("bytes_per_line", ctypes.c_int),
+    ("bits_per_pixel", ctypes.c_int),
+    ("red_mask", ctypes.c_ulong),
+    ("green_mask", ctypes.c_ulong),
+    ("blue_mask", ctypes.c_ulong),
+    ("obdata", ctypes.c_void_p),
+    ("f", _XImageFuncs),
+]
+
+
+class _XShmSegmentInfo(ctypes.Structure):
+    _fields_ = [
+        ("shmseg", ctypes.c_ulong),
+        ("shmid", ctypes.c_int),
+        ("shmaddr", ctypes.c_void_p),
+        ("readOnly", ctypes.c_int),
+    ]
+
+
+class _XClassHint(ctypes.Structure):
+    # Kept as raw pointers so the strings can be handed back to XFree.
+    _fields_ = [("res_name", ctypes.c_void_p), ("res_class", ctypes.c_void_p)]
+
+
+class _XScreenSaverInfo(ctypes.Structure):
+    _fields_ = [
+        ("window", ctypes.c_ulong),
+        ("state", ctypes.c_int),
+        ("kind", ctypes.c_int),
+        ("til_or_since", ctypes.c_ulong),
+        ("idle", ctypes.c_ulong),
+        ("event_mask", ctypes.c_ulong),
+    ]
+
+
+class _XErrorEvent(ctypes.Structure):
+    _fields_ = [
+        ("type", ctypes.c_int),
+        ("display", ctypes.c_void_p),
+        ("resourceid", ctypes.c_ulong),
+        ("serial", ctypes.c_ulong),
+        ("error_code", ctypes.c_ubyte),
+        ("request_code", ctypes.c_ubyte),
+        ("minor_code", ctypes.c_ubyte),
+    ]
+
+
+# Xlib's default error handler exits the process, e.g. when the active window
+# disappears between two requests. Errors are recorded here instead.
+_ErrorHandler = ctypes.CFUNCTYPE(
+    ctypes.c_int, ctypes.c_void_p, ctypes.POINTER(_XErrorEvent)
+)
+_last_error: list[int] = []
+
+
+@_ErrorHandler
+def _on_x_error(display, event) -> int:
+    _last_error.append(event.contents.error_code)
+    return 0
+
+
+def _load(name: str) -> ctypes.CDLL:
+    path = ctypes.util.find_library(name)
+    if path is None:
+        raise X11Error(f"lib{name} was not found.")
+    return ctypes.CDLL(path)
+
+
+def _declare(lib: ctypes.CDLL, name: str, restype, *argtypes) -> None:
+    func = getattr(lib, name)
+    func.restype = restype
+    func.argtypes = argtypes
+
+
+class X11Grabber:
+    """
+    Grabs the root window of an X11 display into a PIL image.
+
+    Not thread-safe: use a grabber from one thread at a time.
+    """
+
+    def __init__(self, display_name: str | None = None, use_shm: bool = True):
+        """
+        Args:
+            display_name (str, optional): The display to connect to. Defaults to $DISPLAY.
+            use_shm (bool): Use the MIT-SHM extension when the server supports it.
+        """
+        self._x11 = _load("X11")
+        self._declare_x11()
+        self._x11.XSetErrorHandler(_on_x_error)
+
+        self._display = self._x11.XOpenDisplay(
+            display_name.encode() if display_name else None
+        )
+        if not self._display:
+            raise X11Error(f"Cannot open display {display_name or '$DISPLAY'}.")
+        self._screen = self._x11.XDefaultScreen(self._display)
+        self._root = self._x11.XDefaultRootWindow(self._display)
+        self._active_window_atom = self._x11.XInternAtom(
+            self._display, b"_NET_ACTIVE_WINDOW", False
+        )
+
+        self._xext = self._libc = None
+        self._shm_image = None
+        self._shm_info = _XShmSegmentInfo()
+        if use_shm:
+            try:
+                self._xext = _load("Xext")
+                self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+                self._declare_shm()
+                if not self._xext.XShmQueryExtension(self._display):
+                    self._xext = None
+            except X11Error:
+                self._xext = None
+        logger.info(
+            f"X11 grabber connected ({'MIT-SHM' if self._xext else 'XGetImage'})."
+        )
+
+    def _declare_x11(self) -> None:
+        x11, p = self._x11, ctypes.c_void_p
+        _declare(x11, "XSetErrorHandler", p, _ErrorHandler)
+        _declare(x11, "XOpenDisplay", p, ctypes.c_char_p)
+        _declare(x11, "XCloseDisplay", ctypes.c_int, p)
+        _declare(x11, "XDefaultScreen", ctypes.c_int, p)
+        _declare(x11, "XDefaultRootWindow", ctypes.c_ulong, p)
+        _declare(x11, "XDefaultVisual", p, p, ctypes.c_int)
+        _declare(x11, "XDefaultDepth", ctypes.c_int, p, ctypes.c_int)
+        _declare(x11, "XSync", ctypes.c_int, p, ctypes.c_int)
+        _declare(x11, "XFree", ctypes.c_int, p)
+        _declare(x11, "XInternAtom", ctypes.c_ulong, p, ctypes.c_char_p, ctypes.c_int)
+        _declare(
+            x11,
+            "XGetGeometry",
+            ctypes.c_int,
+            p,
+            ctypes.c_ulong,
+            ctypes.POINTER(ctypes.c_ulong),
+            ctypes.POINTER(ctypes.c_int),
+            ctypes.POINTER(ctypes.c_int),
+            ctypes.POINTER(ctypes.c_uint),
+            ctypes.POINTER(ctypes.c_uint),
+            ctypes.POINTER(ctypes.c_uint),
+            ctypes.POINTER(ctypes.c_uint),
+        )
+        _declare(
+            x11,
+            "XGetImage",
+            ctypes.POINTER(_XImage),
+            p,
+            ctypes.c_ulong,
+            ctypes.c_int,
+            ctypes.c_int,
+            ctypes.c_uint,
+            ctypes.c_uint,
+            ctypes.c_ulong,
+            ctypes.c_int,
+        )
+        _declare(
+            x11,
+            "XGetWindowProperty",
+            ctypes.c_int,
+            p,
+            ctypes.c_ulong,
+            ctypes.c_ulong,
+            ctypes.c_long,
+            ctypes.c_long,
+            ctypes.c_int,
+            ctypes.c_ulong,
+            ctypes.POINTER(ctypes.c_ulong),
+            ctypes.POINTER(ctypes.c_int),
+            ctypes.POINTER(ctypes.c_ulong),
+            ctypes.POINTER(ctypes.c_ulong),
+            ctypes.POINTER(ctypes.c_void_p),
+        )
+        _declare(
+            x11,
+            "XGetClassHint",
+            ctypes.c_int,
+            p,
+            ctypes.c_ulong,
+            ctypes.POINTER(_XClassHint),
+        )
+
+    def _declare_shm(self) -> None:
+        xext, libc, p = self._xext, self._libc, ctypes.c_void_p
+        _declare(xext, "XShmQueryExtension", ctypes.c_int, p)
+        _declare(
+            xext,
+            "XShmCreateImage",
+            ctypes.POINTER(_XImage),
+            p,
+            p,
+            ctypes.c_uint,
+            ctypes.c_int,
+            p,
+            ctypes.POINTER(_XShmSegmentInfo),
+            ctypes.c_uint,
+            ctypes.c_uint,
+        )
+        _declare(xext, "XShmAttach", ctypes.c_int, p, ctypes.POINTER(_XShmSegmentInfo))
+        _declare(xext, "XShmDetach", ctypes.c_int, p, ctypes.POINTER(_XShmSegmentInfo))
+        _declare(
+            xext,
+            "XShmGetImage",
+            ctypes.c_int,
+            p,
+            ctypes.c_ulong,
+            ctypes.POINTER(_XImage),
+            ctypes.c_int,
+            ctypes.c_int,
+            ctypes.c_ulong,
+        )
+        _declare(libc, "shmget", ctypes.c_int, ctypes.c_int, ctypes.c_size_t, ctypes.c_int)
+        _declare(libc, "shmat", p, ctypes.c_int, p, ctypes.c_int)
+        _declare(libc, "shmdt", ctypes.c_int, p)
+        _declare(libc, "shmctl", ctypes.c_int, ctypes.c_int, ctypes.c_int, p)
+
+    def _screen_size(self) -> tuple[int, int]:
+        root = ctypes.c_ulong()
+        x, y = ctypes.c_int(), ctypes.c_int()
+        width, height = ctypes.c_uint(), ctypes.c_uint()
+        border, depth = ctypes.c_uint(), ctypes.c_uint()
+        if not self._x11.XGetGeometry(
+            self._display,
+            self._root,
+            ctypes.byref(root),
+            ctypes.byref(x),
+            ctypes.byref(y),
+            ctypes.byref(width),
+            ctypes.byref(height),
+            ctypes.byref(border),
+            ctypes.byref(depth),
+        ):
+            raise X11Error("XGetGeometry failed.")
+        return width.value, height.value
+
+    def grab(self) -> Image.Image:
+        """
+        Capture the whole screen.
+
+        Returns:
+            Image.Image: The screen as an RGB image.
+        """
+        width, height = self._screen_size()
+        if self._xext is not None:
+            try:
+                return self._grab_shm(width, height)
+            except X11Error as e:
+                logger.warning(f"MIT-SHM capture failed, using XGetImage: {e}")
+                self._release_shm()
+                self._xext = None
+
+        image = self._x11.XGetImage(
+            self._display, self._root, 0, 0, width, height, _ALL_PLANES, _Z_PIXMAP
+        )
+        if not image:
+            raise X11Error("XGetImage failed.")
+        try:
+            return _to_rgb(image.contents)
+        finally:
+            image.contents.f.destroy_image(image)
+
+    def _grab_shm(self, width: int, height: int) -> Image.Image:
+        image = self._shm_image
+        if image is None or (image.contents.width, image.contents.height) != (
+            width,
+            height,
+        ):
+            self._release_shm()
+            image = self._create_shm_image(width, height)
+        del _last_error[:]
+        ok = self._xext.XShmGetImage(
+            self._display, self._root, image, 0, 0, _ALL_PLANES
+        )
+        if not ok or _last_error:
+            raise X11Error("XShmGetImage failed.")
+        return _to_rgb(image.contents)
+
+    def _create_shm_image(self, width: int, height: int):
+        visual = self._x11.XDefaultVisual(self._display, self._screen)
+        depth = self._x11.XDefaultDepth(self._display, self._screen)
+        info = self._shm_info
+        image = self._xext.XShmCreateImage(
+            self._display,
+            visual,
+            depth,
+            _Z_PIXMAP,
+            None,
+            ctypes.byref(info),
+            width,
+            height,
+        )
+        if not image:
+            raise X11Error("XShmCreateImage failed.")
+        size = image.contents.bytes_per_line * image.contents.height
+        info.shmid = self._libc.shmget(_IPC_PRIVATE, size, _IPC_CREAT | 0o600)
+        if info.shmid < 0:
+            image.contents.f.destroy_image(image)
+            raise X11Error(f"shmget failed (errno {ctypes.get_errno()}).")
+        info.shmaddr = self._libc.shmat(info.shmid, None, 0)
+        if info.shmaddr in (None, ctypes.c_void_p(-1).value):
+            self._libc.shmctl(info.shmid, _IPC_RMID, None)
+            image.contents.f.destroy_image(image)
+            raise X11Error(f"shmat failed (errno {ctypes.get_errno()}).")
+        image.contents.data = info.shmaddr
+        info.readOnly = False
+
+        del _last_error[:]
+        self._xext.XShmAttach(self._display, ctypes.byref(info))
+        self._x11.XSync(self._display, False)
+        # The segment is freed once both sides have detached.
+        self._libc.shmctl(info.shmid, _IPC_RMID, None)
+        self._shm_image = image
+        if _last_error:
+            # E.g. a remote display, which cannot map our memory.
+            raise X11Error("XShmAttach failed.")
+        return image
+
+    def _release_shm(self) -> None:
+        image, self._shm_image = self._shm_image, None
+        if image is None:
+            return
+        self._xext.XShmDetach(self._display, ctypes.byref(self._shm_info))
+        self._x11.XSync(self._display, False)
+        self._libc.shmdt(self._shm_info.shmaddr)
+        # The pixels live in the segment; only free the XImage itself.
+        image.contents.data = None
+        image.contents.f.destroy_image(image)
+
+    def active_window_class(self) -> str:
+        """
+        Get the class of the focused window (what `xdotool getwindowclassname` prints).
+
+        Returns:
+            str: The window class, or "" if it cannot be determined.
+        """
+        del _last_error[:]
+        actual_type = ctypes.c_ulong()
+        actual_format = ctypes.c_int()
+        n_items, bytes_after = ctypes.c_ulong(), ctypes.c_ulong()
+        prop = ctypes.c_void_p()
+        status = self._x11.XGetWindowProperty(
+            self._display,
+            self._root,
+            self._active_window_atom,
+            0,
+            1,
+            False,
+            _XA_WINDOW,
+            ctypes.byref(actual_type),
+            ctypes.byref(actual_format),
+            ctypes.byref(n_items),
+            ctypes.byref(bytes_after),
+            ctypes.byref(prop),
+        )
+        if status != 0 or not prop.value:
+            return ""
+        try:
+            if n_items.value < 1 or actual_format.value != 32:
+                return ""
+            # Format 32 properties are returned as C longs.
+            window = ctypes.c_ulong.from_address(prop.value).value
+        finally:
+            self._x11.XFree(prop)
+        if not window:
+            return ""
+
+        hint = _XClassHint()
+        if not self._x11.XGetClassHint(self._display, window, ctypes.byref(hint)):
+            return ""
+        res_class = ctypes.string_at(hint.res_class) if hint.res_class else b""
+        for pointer in (hint.res_name, hint.res_class):
+            if pointer:
+                self._x11.XFree(pointer)
+        return res_class.decode(errors="replace")
+
+    def close(self) -> None:
+        if self._display:
+            if self._xext is not None:
+                self._release_shm()
+            self._x11.XCloseDisplay(self._display)
+            self._display = None
+
+
+class X11IdleMonitor:
+    """
+    Reads how long the user has not touched the keyboard or mouse, through the
+    MIT-SCREEN-SAVER extension (what `xprintidle` prints).
+    """
+
+    def __init__(self, display_name: str | None = None):
+        """
+        Args:
+            display_name (str, optional): The display to connect to. Defaults to $DISPLAY.
+        """
+        p = ctypes.c_void_p
+        self._x11 = _load("X11")
+        self._xss = _load("Xss")
+        _declare(self._x11, "XSetErrorHandler", p, _ErrorHandler)
+        _declare(self._x11, "XOpenDisplay", p, ctypes.c_char_p)
+        _declare(self._x11, "XCloseDisplay", ctypes.c_int, p)
+        _declare(self._x11, "XDefaultRootWindow", ctypes.c_ulong, p)
+        _declare(self._x11, "XFree", ctypes.c_int, p)
+        _declare(
+            self._xss, "XScreenSaverAllocInfo", ctypes.POINTER(_XScreenSaverInfo)
+        )
+        _declare(
+            self._xss,
+            "XScreenSaverQueryInfo",
+            ctypes.c_int,
+            p,
+            ctypes.c_ulong,
+            ctypes.POINTER(_XScreenSaverInfo),
+        )
+        self._x11.XSetErrorHandler(_on_x_error)
+
+        self._display = self._x11.XOpenDisplay(
+            display_name.encode() if display_name else None
+        )
+        if not self._display:
+            raise X11Error(f"Cannot open display {display_name or '$DISPLAY'}.")
+        self._root = self._x11.XDefaultRootWindow(self._display)
+        self._info = self._xss.XScreenSaverAllocInfo()
+
+    def idle_seconds(self) -> float:
+        """Seconds since the last keyboard or mouse input."""
+        if not self._xss.XScreenSaverQueryInfo(self._display, self._root, self._info):
+            raise X11Error("The X server does not support MIT-SCREEN-SAVER.")
+        return self._info.contents.idle / 1000
+
+    def close(self) -> None:
+        if self._display:
+            self._x11.XFree(self._info)
+            self._x11.XCloseDisplay(self._display)
+            self._display = None
+
+
+def _to_rgb(image: _XImage) -> Image.Image:
+    """Copy a 24/32-bit ZPixmap XImage out into an RGB PIL image."""
+    if image.bits_per_pixel != 32 or (
+        image.red_mask,
+        image.green_mask,
+        image.blue_mask,
+    ) != (0xFF0000, 0xFF00, 0xFF):
+        raise X11Error(
+            f"Unsupported pixel layout ({image.bits_per_pixel} bpp, "
+            f"masks {image.red_mask:x}/{image.green_mask:x}/{image.blue_mask:x})."
+        )
+    size = image.bytes_per_line * image.height
+    # byte_order 0 is LSBFirst: pixels are stored B, G, R, X.
+    raw_mode = "BGRX" if image.byte_order == 0 else "XRGB"
+    return Image.frombytes(
+        "RGB",
+        (image.width, image.height),
+        ctypes.string_at(image.data, size),
+        "raw",
+        raw_mode,
+        image.bytes_per_line,
+    )
@@ -1,26 +1,53 @@
 import os
 import sys
+import time
+
+_IMPORT_STARTED = time.monotonic()
+
 import customtkinter as ctk
 from PIL import Image, ImageTk
 import threading
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from pathlib import Path
 import logging
 
 # Add project root to sys.path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-from core.main import search_images
+from core.client import DaemonClient, RemoteError
+from core.main import open_search
+from core.metrics import MetricsWriter
+from core.thumbnails import THUMBNAIL_SIZE, make_thumbnail
+from core.model import ModelLoadError, model
+from core.shards import ShardedDatabase
 from config.log_config import setup_logging
 
 # Config
 SCREENSHOTS_DIR = Path.home() / ".smarn" / "screenshots"
 SCREENSHOTS_DIR.mkdir(parents=True, exist_ok=True)
 
+# Time range filter label -> start of the range (None for no lower bound), in
+# aware local time
+TIME_RANGES = {
+    "Any time": lambda: None,
+    "Last hour": lambda: datetime.now().astimezone() - timedelta(hours=1),
+    "Today": lambda: datetime.now()
+    .replace(hour=0, minute=0, second=0, microsecond=0)
+    .astimezone(),
+    "Last 7 days": lambda: datetime.now().astimezone() - timedelta(days=7),
+    "Last 30 days": lambda: datetime.now().astimezone() - timedelta(days=30),
+}
+
 
 class SmarnApp(ctk.CTk):
-    def __init__(self):
+    def __init__(
+        self, started_at: float | None = None, client: DaemonClient | None = None
+    ):
         super().__init__()
         self.logger = logging.getLogger(__name__)
+        self.started_at = started_at if started_at is not None else _IMPORT_STARTED
+        # Searches go through the daemon when one is running.
+        self.client = client
 
         # --- Load bundled fonts ---
         FONTS_DIR = Path(__file__).parent.parent / "fonts"
@@ -73,6 +100,25 @@ class SmarnApp(ctk.CTk):
         self.search_entry.grid(row=0, column=0, padx=20, pady=15, sticky="ew")
         self.search_entry.bind("<Return>", lambda e: self.search())
 
+        # Filters
+        self.time_range_menu = ctk.CTkOptionMenu(
+            search_frame,
+            values=list(TIME_RANGES),
+            font=self.metadata_font,
+            height=40,
+        )
+        self.time_range_menu.grid(row=0, column=1, padx=(0, 10), pady=15)
+
+        self.apps_entry = ctk.CTkEntry(
+            search_frame,
+            placeholder_text="Apps (e.g. firefox, code)",
+            font=self.metadata_font,
+            width=220,
+            height=40,
+        )
+        self.apps_entry.grid(row=0, column=2, padx=(0, 20), pady=15)
+        self.apps_entry.bind("<Return>", lambda e: self.search())
+
         # --- RESULTS ---
         self.results_frame = ctk.CTkScrollableFrame(self, fg_color="transparent")
         self.results_frame.grid(row=2, column=0, padx=30, pady=20, sticky="nsew")
@@ -83,7 +129,63 @@ class SmarnApp(ctk.CTk):
 
         # Internal state
         self.search_in_progress = False
+        self.search_generation = 0
         self.images = []
+        self.cursor = None
+        self.result_count = 0
+        self.page_loading = False
+        self.thumbnail_pool = ThreadPoolExecutor(
+            max_workers=4, thread_name_prefix="smarn-thumbnail"
+        )
+
+        # Startup
+        self.bind("<Map>", self._on_first_map, add="+")
+        self.warmup_label = None
+        self.model_error = None
+        if not self._model_ready():
+            self.warmup_label = ctk.CTkLabel(
+                self.results_frame,
+                text="Model warming up...",
+                font=self.status_font,
+                text_color="gray70",
+            )
+            self.warmup_label.pack(pady=80)
+            self.after(500, self._poll_model_ready)
+        self.after(250, self._poll_scroll)
+
+    def _on_first_map(self, event):
+        if event.widget is not self:
+            return
+        self.unbind("<Map>")
+        self.logger.info(
+            f"Time to first window: {time.monotonic() - self.started_at:.2f}s"
+        )
+
+    def _model_ready(self):
+        """Whether the model is loaded; a load failure is kept in `model_error`."""
+        try:
+            if self.client is not None:
+                return self.client.is_ready()
+            return model.is_ready()
+        except (ModelLoadError, RemoteError) as e:
+            self.model_error = str(e)
+            return False
+
+    def _poll_model_ready(self):
+        ready = self._model_ready()
+        if not ready and self.model_error is None:
+            self.after(500, self._poll_model_ready)
+            return
+        # A search started meanwhile has already cleared the label.
+        if self.warmup_label is not None and self.warmup_label.winfo_exists():
+            if ready:
+                self.warmup_label.destroy()
+            else:
+                self.warmup_label.configure(
+                    text=f"Model failed to load: {self.model_error}"
+                )
+                return
+        self.warmup_label = None
 
     def search(self):
         if self.search_in_progress:
@@ -94,51 +196,116 @@ class SmarnApp(ctk.CTk):
             return
 
         self.search_in_progress = True
+        self.search_generation += 1
         self.search_entry.configure(state="disabled")
 
         # Clear previous results
         for widget in self.results_frame.winfo_children():
             widget.destroy()
         self.images.clear()
-
-        # Show searching status
+        self.cursor = None
+        self.result_count = 0
+
+        # Show searching status. Until the model is loaded the query stays queued
+        # on the search thread, which blocks on the model.
+        if self._model_ready():
+            status = f"Searching for: {query}..."
+        elif self.model_error is not None:
+            status = f"Model failed to load: {self.model_error}"
+        else:
+            status = f"Model warming up; will search for: {query}"
         self.status_label = ctk.CTkLabel(
             self.results_frame,
-            text=f"Searching for: {query}...",
+            text=status,
             font=self.status_font,
             text_color="gray70",
         )
         self.status_label.pack(pady=80)
 
+        filters = self._get_filters()
         threading.Thread(
-            target=self._perform_search, args=(query,), daemon=True
+            target=self._perform_search,
+            args=(query, filters, self.search_generation),
+            daemon=True,
         ).start()
 
-    def _perform_search(self, query):
+    def _get_filters(self):
+        """Read the filter controls into `open_search` keyword arguments."""
+        apps = [app.strip() for app in self.apps_entry.get().split(",") if app.strip()]
+        return {
+            "since": TIME_RANGES[self.time_range_menu.get()](),
+            "apps": apps or None,
+        }
+
+    def _perform_search(self, query, filters, generation):
         try:
-            results = search_images(query)
-            self.after(0, self._display_results, results)
+            if self.client is not None:
+                cursor = self.client.open_search(query, **filters)
+            else:
+                cursor = open_search(query, **filters)
+            results = cursor.next_page() if cursor else []
+            self.after(0, self._display_results, results, cursor, generation)
         except Exception as e:
             self.after(0, self._handle_error, f"Error: {e}")
         finally:
             self.after(0, self._search_complete)
 
-    def _display_results(self, results):
-        if self.status_label:
-            self.status_label.destroy()
+    def _poll_scroll(self):
+        """Fetch the next page of results once the user scrolls near the bottom."""
+        self.after(250, self._poll_scroll)
+        if (
+            self.cursor is None
+            or not self.cursor.has_more
+            or self.page_loading
+            or self.search_in_progress
+        ):
+            return
+        # CTkScrollableFrame does not expose its canvas publicly.
+        if self.results_frame._parent_canvas.yview()[1] < 0.9:
+            return
 
-        if not results:
-            self.status_label = ctk.CTkLabel(
-                self.results_frame,
-                text="No results found",
-                font=self.status_font,
-                text_color="gray70",
-            )
-            self.status_label.pack(pady=80)
+        self.page_loading = True
+        threading.Thread(
+            target=self._load_next_page,
+            args=(self.cursor, self.search_generation),
+            daemon=True,
+        ).start()
+
+    def _load_next_page(self, cursor, generation):
+        try:
+            page = cursor.next_page()
+            self.after(0, self._display_results, page, cursor, generation)
+        except Exception as e:
+            self.logger.error(f"Error loading the next page of results: {e}")
+        finally:
+            self.after(0, self._page_loaded)
+
+    def _page_loaded(self):
+        self.page_loading = False
+
+    def _display_results(self, results, cursor, generation):
+        # A page of an older search may arrive after a new search started.
+        if generation != self.search_generation:
             return
+        self.cursor = cursor
+
+        if self.result_count == 0:
+            if self.status_label:
+                self.status_label.destroy()
+                self.status_label = None
+
+            if not results:
+                self.status_label = ctk.CTkLabel(
+                    self.results_frame,
+                    text="No results found",
+                    font=self.status_font,
+                    text_color="gray70",
+                )
+                self.status_label.pack(pady=80)
+                return
 
-        for idx, item in enumerate(results):
-            row, col = divmod(idx, 3)
+        for item in results:
+            row, col = divmod(self.result_count, 3)
 
             try:
                 image_path = item["image_path"]
@@ -148,15 +315,19 @@ class SmarnApp(ctk.CTk):
                 # Result card
                 result_frame = ctk.CTkFrame(self.results_frame)
                 result_frame.grid(row=row, column=col, padx=15, pady=15, sticky="nsew")
+                self.result_count += 1
 
-                # Thumbnail
-                img = Image.open(image_path)
-                img.thumbnail((380, 260))
-                photo = ImageTk.PhotoImage(img)
-                self.images.append(photo)
-
-                img_label = ctk.CTkLabel(result_frame, image=photo, text="")
+                # Thumbnail; decoded off the UI thread and filled in when ready
+                img_label = ctk.CTkLabel(
+                    result_frame,
+                    text="",
+                    width=THUMBNAIL_SIZE[0],
+                    height=THUMBNAIL_SIZE[1],
+                )
                 img_label.pack(padx=10, pady=10)
+                self.thumbnail_pool.submit(
+                    self._load_thumbnail, item, img_label, self.search_generation
+                )
 
                 # Metadata
                 timestamp = datetime.fromisoformat(item["timestamp"])
@@ -176,6 +347,32 @@ class SmarnApp(ctk.CTk):
                     f"Error displaying image {item.get('image_path')}: {e}"
                 )
 
+    def _load_thumbnail(self, item, img_label, generation):
+        """Decode a result's thumbnail on a pool thread, creating it if needed."""
+        try:
+            thumbnail_path = item.get("thumbnail_path")
+            if not thumbnail_path or not os.path.exists(thumbnail_path):
+                thumbnail_path = make_thumbnail(item["image_path"])
+                if thumbnail_path is None:
+                    return
+                ShardedDatabase().set_thumbnail_path(item["image_path"], thumbnail_path)
+
+            with Image.open(thumbnail_path) as img:
+                img.load()
+            self.after(0, self._show_thumbnail, img, img_label, generation)
+        except Exception as e:
+            self.logger.error(
+                f"Error loading thumbnail for {item.get('image_path')}: {e}"
+            )
+
+    def _show_thumbnail(self, img, img_label, generation):
+        # Results of an older search may still be arriving; their cards are gone.
+        if generation != self.search_generation or not img_label.winfo_exists():
+            return
+        photo = ImageTk.PhotoImage(img)
+        self.images.append(photo)
+        img_label.configure(image=photo)
+
     def _handle_error(self, message):
         if self.status_label:
             self.status_label.configure(text=message)
@@ -185,12 +382,31 @@ class SmarnApp(ctk.CTk):
         self.search_entry.configure(state="normal")
 
 
-def main():
+def main(started_at: float | None = None, use_daemon: bool = True):
+    """
+    Launch the GUI.
+
+    Args:
+        started_at (float, optional): `time.monotonic()` at process start, used to
+            report time-to-first-window. Defaults to when this module was imported.
+        use_daemon (bool): Search through the smarn daemon if one is running,
+            instead of loading the model in this process.
+    """
     setup_logging()
+    client = DaemonClient.connect() if use_daemon else None
+    if client is None:
+        model.warm_up()
+    metrics_writer = MetricsWriter("gui")
+    metrics_writer.start()
     ctk.set_appearance_mode("dark")
     ctk.set_default_color_theme("blue")
-    app = SmarnApp()
-    app.mainloop()
+    app = SmarnApp(started_at, client)
+    try:
+        app.mainloop()
+    finally:
+        metrics_writer.stop()
+        if client is not None:
+            client.close()
 
 
 if __name__ == "__main__":
@@ -1,4 +1,8 @@
 #!/usr/bin/env python3
+import time
+
+STARTED_AT = time.monotonic()
+
 import sys
 import threading
 
@@ -16,8 +20,9 @@ def main():
     screenshot_thread = threading.Thread(target=screenshot_service, daemon=True)
     screenshot_thread.start()
 
-    # Start the GUI
-    gui_main()
+    # Start the GUI; the model warms up in the background meanwhile. The service
+    # runs in this process, so the GUI shares its model without the socket.
+    gui_main(STARTED_AT, use_daemon=False)
 
     return 0
 
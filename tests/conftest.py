@@ -0,0 +1,79 @@
+"""
+Fixtures shared by the database tests.
+
+They skip unless numpy and sqlite-vec are installed and Python's sqlite3 can
+load extensions (some builds, e.g. macOS system Python, cannot).
+"""
+
+import os
+import sqlite3
+
+import pytest
+
+
+def _require_sqlite_vec():
+    pytest.importorskip("numpy")
+    sqlite_vec = pytest.importorskip("sqlite_vec")
+    if not hasattr(sqlite3.Connection, "enable_load_extension"):
+        pytest.skip("this sqlite3 build cannot load extensions")
+    return sqlite_vec
+
+
+@pytest.fixture
+def vec_connect():
+    """Open a plain connection with sqlite-vec loaded."""
+    sqlite_vec = _require_sqlite_vec()
+    opened = []
+
+    def connect(path) -> sqlite3.Connection:
+        conn = sqlite3.connect(path)
+        conn.enable_load_extension(True)
+        sqlite_vec.load(conn)
+        conn.enable_load_extension(False)
+        opened.append(conn)
+        return conn
+
+    yield connect
+    for conn in opened:
+        conn.close()
+
+
+@pytest.fixture
+def database(tmp_path):
+    """A `Database` with the current schema in a temporary file."""
+    _require_sqlite_vec()
+    from core.db import Database
+
+    db = Database(str(tmp_path / "database.sqlite"))
+    db.create_tables()
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def embedding():
+    """Make a unit-length 768-d embedding from a seed."""
+    np = pytest.importorskip("numpy")
+
+    def make(seed: int):
+        emb = np.random.default_rng(seed).standard_normal(768).astype(np.float32)
+        return emb / np.linalg.norm(emb)
+
+    return make
+
+
+@pytest.fixture
+def sharded(tmp_path, monkeypatch):
+    """A `ShardedDatabase` in a temporary data directory, with no legacy database."""
+    _require_sqlite_vec()
+    from config import settings
+    from core.shards import ShardedDatabase
+
+    monkeypatch.setattr(settings, "LEGACY_DB_FILE", str(tmp_path / "legacy.sqlite"))
+    db = ShardedDatabase(str(tmp_path / "data"))
+    db.create_tables()
+    yield db
+    for shard in db.shards():
+        shard.close()
+    db.cache_db.close()
+    ShardedDatabase._instances.pop(os.path.abspath(db.data_dir))
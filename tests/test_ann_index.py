@@ -0,0 +1,76 @@
+"""The optional HNSW graph."""
+
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("hnswlib")
+
+from core.ann_index import HnswIndex, index_path  # noqa: E402
+
+
+def _embs(n: int, seed: int = 0) -> "np.ndarray":
+    embs = np.random.default_rng(seed).standard_normal((n, 768)).astype(np.float32)
+    return embs / np.linalg.norm(embs, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def graph(tmp_path):
+    return HnswIndex(str(tmp_path / "database.hnsw"), save_every=0)
+
+
+def test_search_add_and_remove(graph):
+    embs = _embs(50)
+    graph.add(list(range(100, 150)), embs)
+
+    (id_, distance), *_ = graph.search(embs[7], 3)
+    assert id_ == 107 and distance == pytest.approx(0, abs=1e-5)
+
+    graph.remove([107, 999])
+    assert len(graph) == 49
+    assert 107 not in [id_ for id_, _ in graph.search(embs[7], 10)]
+
+
+def test_graph_grows_past_its_capacity(graph):
+    graph.add(list(range(1500)), _embs(1500))
+    assert len(graph) == 1500
+
+
+def test_saved_graph_is_loaded(graph, tmp_path):
+    graph.add([1, 2], _embs(2))
+    graph.save()
+
+    loaded = HnswIndex(graph.path)
+    assert loaded.load()
+    assert len(loaded) == 2
+    assert not HnswIndex(str(tmp_path / "missing.hnsw")).load()
+
+
+def test_sync_catches_up_with_the_database(graph):
+    embs = _embs(4)
+    graph.add([1, 2, 3], embs[:3])
+    stored = {2: embs[1], 3: embs[2], 4: embs[3]}
+
+    def fetch(ids):
+        return ids, np.vstack([stored[id_] for id_ in ids])
+
+    graph.sync(lambda: set(stored), fetch)
+
+    assert len(graph) == 3
+    assert {id_ for id_, _ in graph.search(embs[0], 10)} == {2, 3, 4}
+
+
+def test_database_search_uses_the_graph(database, embedding):
+    ids = [database.insert_entry(f"/{i}.png", embedding(i)) for i in range(20)]
+    assert database.build_ann_index() == 20
+    assert os.path.exists(index_path(database.db_file))
+
+    exact = database.get_top_k_entries(embedding(3), 5, approximate=False)
+    approximate = database.get_top_k_entries(embedding(3), 5, approximate=True)
+    assert approximate[0][0] == exact[0][0] == "/3.png"
+
+    # Deleted entries leave the graph with the database rows.
+    database.delete_entries([ids[3]])
+    approximate = database.get_top_k_entries(embedding(3), 5, approximate=True)
+    assert "/3.png" not in [entry[0] for entry in approximate]
@@ -0,0 +1,79 @@
+"""Importing existing screenshot folders."""
+
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("PIL")
+
+from core.backfill import find_images, infer_timestamp  # noqa: E402
+
+
+def test_find_images_walks_directories(tmp_path):
+    (tmp_path / "a" / "b").mkdir(parents=True)
+    for name in ("a/one.PNG", "a/b/two.webp", "a/notes.txt", "three.jpg"):
+        (tmp_path / name).write_bytes(b"")
+
+    assert find_images([str(tmp_path)]) == [
+        str(tmp_path / "a" / "b" / "two.webp"),
+        str(tmp_path / "a" / "one.PNG"),
+        str(tmp_path / "three.jpg"),
+    ]
+
+
+def test_timestamp_from_smarn_file_name(tmp_path):
+    path = tmp_path / "smarn_2024-05-01_12-30-15.png"
+    path.write_bytes(b"")
+
+    assert infer_timestamp(str(path)) == datetime(2024, 5, 1, 12, 30, 15).astimezone()
+
+
+def test_timestamp_from_mtime(tmp_path):
+    path = tmp_path / "restored.png"
+    path.write_bytes(b"")
+    os.utime(path, (1_700_000_000, 1_700_000_000))
+
+    assert infer_timestamp(str(path)) == datetime.fromtimestamp(
+        1_700_000_000, timezone.utc
+    )
+
+
+def _entries(embedding, start: datetime, n: int, seed: int = 0) -> list[tuple]:
+    return [
+        (
+            f"/backup/{seed + i}.png",
+            embedding(seed + i),
+            "",
+            start + timedelta(minutes=i),
+            None,
+        )
+        for i in range(n)
+    ]
+
+
+def test_insert_entries_lets_sqlite_assign_ids(database, embedding):
+    now = datetime.now(timezone.utc)
+    last = database.insert_entry("/live/0.png", embedding(100), timestamp=now)
+    database.delete_entries([last])
+
+    inserted = database.insert_entries(
+        _entries(embedding, now - timedelta(days=30), 3)
+    )
+
+    assert inserted == 3
+    conn = database._get_connection()
+    ids = [row[0] for row in conn.execute("SELECT id FROM img_info ORDER BY id")]
+    # AUTOINCREMENT never hands out the id of the deleted entry again.
+    assert ids == [last + 1, last + 2, last + 3]
+    assert conn.execute("SELECT COUNT(*) FROM vec_idx_bin").fetchone()[0] == 3
+
+
+def test_backfilled_entries_are_not_the_last_entry(database, embedding):
+    now = datetime.now(timezone.utc)
+    database.insert_entry("/live/0.png", embedding(100), timestamp=now)
+    # Older captures imported afterwards get higher ids.
+    database.insert_entries(_entries(embedding, now - timedelta(days=30), 3))
+
+    assert database.get_last_entry()[1] == "/live/0.png"
@@ -0,0 +1,53 @@
+"""Batched embedding on the Jina-CLIP model, with the weights faked."""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from core.model.jina_clip import JinaClipModel  # noqa: E402
+
+
+class FakeClip:
+    """Embeds item `x` as a row of `len(x)`s and records the batches."""
+
+    def __init__(self):
+        self.batches: list[list] = []
+
+    def encode_text(self, texts, batch_size=None):
+        self.batches.append(list(texts))
+        return np.array([np.full(4, len(text), dtype=np.float32) for text in texts])
+
+    encode_image = encode_text
+
+
+def _model(max_batch_size: int) -> JinaClipModel:
+    # Skip __init__, which loads the weights.
+    model = JinaClipModel.__new__(JinaClipModel)
+    model.model = FakeClip()
+    model.max_batch_size = max_batch_size
+    return model
+
+
+def test_texts_are_batched_by_length_and_returned_in_order():
+    model = _model(max_batch_size=2)
+    texts = ["aaaa", "a", "aaa", "aa", "aaaaa"]
+
+    embs = model.get_text_embs_batch(texts)
+
+    assert embs[:, 0].tolist() == [4, 1, 3, 2, 5]
+    assert model.model.batches == [["a", "aa"], ["aaa", "aaaa"], ["aaaaa"]]
+
+
+def test_images_are_split_into_batches():
+    model = _model(max_batch_size=2)
+
+    embs = model.get_img_embs_batch(["xxx", "x", "xx"])
+
+    assert embs[:, 0].tolist() == [3, 1, 2]
+    assert model.model.batches == [["xxx", "x"], ["xx"]]
+
+
+def test_empty_batch():
+    assert _model(max_batch_size=2).get_text_embs_batch([]).size == 0
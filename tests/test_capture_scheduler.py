@@ -0,0 +1,125 @@
+"""Capture interval policies and the scheduler feeding them."""
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from core import capture_scheduler  # noqa: E402
+from core.capture_scheduler import (  # noqa: E402
+    UNCHANGED_SIMILARITY,
+    AdaptivePolicy,
+    CaptureScheduler,
+    FixedStepPolicy,
+    Sample,
+    on_battery,
+)
+
+
+def _policy(**kwargs) -> AdaptivePolicy:
+    options = dict(
+        min_interval=0.25,
+        max_interval=5,
+        alpha=0.3,
+        similar=0.95,
+        different=0.8,
+        load_threshold=0.7,
+        battery_factor=2,
+        cpu_budget=0,
+    )
+    options.update(kwargs)
+    return AdaptivePolicy(**options)
+
+
+def _settle(policy, sample: Sample, steps: int = 50) -> float:
+    for _ in range(steps):
+        interval = policy.next_interval(sample)
+    return interval
+
+
+def test_idle_screen_is_captured_least_often():
+    assert _settle(_policy(), Sample(similarity=0.99)) == pytest.approx(5)
+
+
+def test_busy_screen_is_captured_most_often():
+    assert _settle(_policy(), Sample(similarity=0.5)) == pytest.approx(0.25)
+
+
+def test_activity_maps_geometrically_between_the_bounds():
+    policy = _policy(alpha=1)
+    # Halfway between `similar` and `different`.
+    interval = policy.next_interval(Sample(similarity=0.875))
+    assert interval == pytest.approx((0.25 * 5) ** 0.5)
+
+
+def test_single_odd_frame_does_not_swing_the_interval():
+    policy = _policy()
+    idle = _settle(policy, Sample(similarity=0.99))
+    blip = policy.next_interval(Sample(similarity=0.5))
+    assert 0.25 < blip < idle
+
+
+def test_load_and_battery_stretch_the_interval():
+    busy = Sample(similarity=0.5)
+    base = _settle(_policy(), busy)
+    loaded = _settle(_policy(), Sample(similarity=0.5, load=1.4))
+    battery = _settle(_policy(), Sample(similarity=0.5, on_battery=True))
+    assert loaded == pytest.approx(base * 2)
+    assert battery == pytest.approx(base * 2)
+
+
+def test_cpu_budget_bounds_the_interval_from_below():
+    policy = _policy(cpu_budget=0.05)
+    # 6 s per embedding at 5% of a core: at most one capture every 2 minutes.
+    interval = _settle(policy, Sample(similarity=0.5, inference_seconds=6))
+    assert interval == pytest.approx(2)
+
+
+def test_fixed_step_policy():
+    policy = FixedStepPolicy(interval=1)
+    assert policy.next_interval(Sample(similarity=0.99)) == 1.25
+    assert policy.next_interval(Sample(similarity=0.5)) == 1
+    assert policy.next_interval(Sample(similarity=0.9)) == 1
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    monkeypatch.setattr(capture_scheduler, "cpu_load", lambda: 0.0)
+    monkeypatch.setattr(capture_scheduler, "on_battery", lambda: False)
+    return CaptureScheduler(policy=_policy(), interval=1)
+
+
+def test_unchanged_frames_count_as_identical(scheduler):
+    for _ in range(50):
+        scheduler.observe(0.5)
+    busy = scheduler.interval
+
+    for _ in range(50):
+        scheduler.observe_unchanged()
+
+    assert scheduler.policy.change == pytest.approx(1 - UNCHANGED_SIMILARITY, abs=1e-6)
+    assert scheduler.interval > busy
+    assert scheduler.interval == pytest.approx(5)
+
+
+def test_inference_cost_is_smoothed(scheduler):
+    scheduler.record_inference(1.0)
+    scheduler.record_inference(2.0)
+    assert scheduler._inference_seconds == pytest.approx(1.3)
+
+
+def _supply(root, name: str, **attributes) -> None:
+    (root / name).mkdir()
+    for attribute, value in attributes.items():
+        (root / name / attribute).write_text(f"{value}\n")
+
+
+def test_on_battery(tmp_path):
+    _supply(tmp_path, "BAT0", type="Battery", status="Discharging")
+    assert on_battery(str(tmp_path))
+
+    _supply(tmp_path, "AC", type="Mains", online=1)
+    assert not on_battery(str(tmp_path))
+
+
+def test_no_power_supply_class(tmp_path):
+    assert not on_battery(str(tmp_path / "missing"))
@@ -0,0 +1,66 @@
+"""The pixel-level change detector."""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+from core.change_detector import ChangeDetector  # noqa: E402
+
+
+def _screen(fill: int = 255) -> "Image.Image":
+    return Image.new("RGB", (1280, 720), (fill, fill, fill))
+
+
+def _with_box(img: "Image.Image", box: tuple, fill: int = 0) -> "Image.Image":
+    img = img.copy()
+    img.paste((fill, fill, fill), box)
+    return img
+
+
+def test_first_frame_counts_as_changed():
+    detector = ChangeDetector(threshold=0.05, pixel_threshold=8)
+    assert detector.has_changed(detector.sample(_screen())) == (True, 1.0)
+
+
+def test_small_change_is_ignored_and_large_one_is_not():
+    detector = ChangeDetector(threshold=0.05, pixel_threshold=8)
+    detector.commit(detector.sample(_screen()))
+
+    # A cursor-sized blip changes one tile out of 144.
+    cursor = detector.sample(_with_box(_screen(), (0, 0, 80, 80)))
+    changed, score = detector.has_changed(cursor)
+    assert not changed and 0 < score < 0.05
+
+    window = detector.sample(_with_box(_screen(), (0, 0, 640, 720)))
+    changed, score = detector.has_changed(window)
+    assert changed and score == pytest.approx(0.5)
+
+
+def test_reference_only_moves_on_commit():
+    detector = ChangeDetector(threshold=0.05, pixel_threshold=8)
+    detector.commit(detector.sample(_screen()))
+    switched = detector.sample(_screen(0))
+
+    assert detector.has_changed(switched)[0]
+    # Not committed (e.g. the embed failed): still a change next time.
+    assert detector.has_changed(switched)[0]
+    detector.commit(switched)
+    assert not detector.has_changed(switched)[0]
+
+
+def test_drift_adds_up_against_the_committed_reference():
+    detector = ChangeDetector(threshold=0.05, pixel_threshold=8)
+    detector.commit(detector.sample(_screen()))
+    # Typing: a little more of the screen changes every interval.
+    typed = [_with_box(_screen(), (0, 0, 80 * n, 80)) for n in range(1, 16)]
+    changes = [detector.has_changed(detector.sample(img))[0] for img in typed]
+    assert not changes[0] and any(changes)
+
+
+def test_reset_forgets_the_reference():
+    detector = ChangeDetector()
+    sample = detector.sample(_screen())
+    detector.commit(sample)
+    detector.reset()
+    assert detector.has_changed(sample)[0]
@@ -0,0 +1,130 @@
+"""`DaemonClient` against a `SmarnDaemon` serving a Unix socket."""
+
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("sqlite_vec")
+
+from core import daemon as daemon_module  # noqa: E402
+from core.client import DaemonClient, RemoteError  # noqa: E402
+
+
+class FakeCursor:
+    def __init__(self, results, page_size):
+        self.results = results
+        self.page_size = page_size
+
+    def next_page(self):
+        page = self.results[: self.page_size]
+        self.results = self.results[self.page_size :]
+        return page
+
+    @property
+    def has_more(self):
+        return bool(self.results)
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.inserted = []
+
+    def insert_entry(self, image_path, img_emb, application_name="", **kwargs):
+        self.inserted.append((image_path, application_name))
+        return len(self.inserted)
+
+
+def _result(i: int) -> dict:
+    return {
+        "image_path": f"/shots/{i}.webp",
+        "application_name": "term",
+        "timestamp": "2024-05-01 12:00:00",
+        "distance": i / 8,
+        "thumbnail_path": None,
+    }
+
+
+@pytest.fixture
+def served(monkeypatch, tmp_path):
+    monkeypatch.setattr(daemon_module, "ShardedDatabase", FakeDatabase)
+    monkeypatch.setattr(daemon_module.model, "warm_up", lambda: None)
+    # Unix socket paths are limited to ~100 bytes; tmp_path can be longer.
+    socket_path = f"/tmp/smarn-test-{os.getpid()}.sock"
+    server = daemon_module.SmarnDaemon(socket_path, max_cursors=2)
+    assert server.start()
+    client = DaemonClient(socket_path, timeout=10)
+    yield server, client
+    client.close()
+    server.stop()
+
+
+def test_search_pages_through_the_daemon(served, monkeypatch):
+    server, client = served
+    results = [_result(i) for i in range(7)]
+    monkeypatch.setattr(
+        daemon_module,
+        "open_search",
+        lambda text_query, page_size, **filters: FakeCursor(results, page_size),
+    )
+
+    cursor = client.open_search("query", page_size=3)
+    pages = []
+    while cursor.has_more:
+        pages.append(cursor.next_page())
+
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert [item for page in pages for item in page] == results
+    # Exhausted cursors are released by the daemon.
+    assert not server._cursors
+
+
+def test_expired_cursor_reports_an_error(served, monkeypatch):
+    server, client = served
+    monkeypatch.setattr(
+        daemon_module,
+        "open_search",
+        lambda text_query, page_size, **filters: FakeCursor(
+            [_result(i) for i in range(10)], page_size
+        ),
+    )
+    first = client.open_search("first", page_size=1)
+    client.open_search("second", page_size=1)
+    client.open_search("third", page_size=1)
+
+    first.next_page()
+    with pytest.raises(RemoteError, match="expired"):
+        first.next_page()
+
+
+def test_ingest_sends_an_absolute_path(served, monkeypatch, tmp_path):
+    server, client = served
+    Image = pytest.importorskip("PIL.Image")
+    Image.new("RGB", (32, 32), "red").save(tmp_path / "shot.png")
+    monkeypatch.setattr(daemon_module, "make_thumbnail", lambda path, img: None)
+
+    class Inference:
+        def embed_image(self, img):
+            from concurrent.futures import Future
+
+            future = Future()
+            future.set_result(np.ones(768, dtype=np.float32))
+            return future
+
+    monkeypatch.setattr(daemon_module, "inference", Inference())
+    monkeypatch.chdir(tmp_path)
+
+    assert client.ingest("shot.png", "term") == 1
+    assert server.db.inserted == [(str(tmp_path / "shot.png"), "term")]
+
+
+def test_daemon_rejects_relative_ingest_paths(served):
+    server, client = served
+    body = daemon_module.Writer().str("shot.png").str("").time(None).bytes()
+
+    type_, reply = server.dispatch(
+        daemon_module.protocol.INGEST, daemon_module.Reader(body)
+    )
+
+    assert type_ == daemon_module.protocol.ERROR
+    assert "absolute path" in reply.decode()
@@ -0,0 +1,90 @@
+"""The single database writer thread."""
+
+import sqlite3
+import threading
+
+import pytest
+
+from core.db_writer import DbWriter
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = str(tmp_path / "writer.sqlite")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE t (x INTEGER UNIQUE)")
+    return path
+
+
+def _count(path) -> int:
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM t").fetchone()[0]
+
+
+def _insert(x):
+    return lambda conn: conn.execute("INSERT INTO t VALUES (?)", (x,)).lastrowid
+
+
+def test_jobs_commit_and_resolve(path):
+    writer = DbWriter(lambda: sqlite3.connect(path, check_same_thread=False))
+    futures = [writer.submit(_insert(x)) for x in range(10)]
+
+    assert [future.result(timeout=10) for future in futures] == list(range(1, 11))
+    writer.close()
+    assert _count(path) == 10
+
+
+def test_failing_job_is_rolled_back_alone(path):
+    writer = DbWriter(
+        lambda: sqlite3.connect(path, check_same_thread=False), max_delay=0.2
+    )
+    first = writer.submit(_insert(1))
+    duplicate = writer.submit(_insert(1))
+    last = writer.submit(_insert(2))
+
+    with pytest.raises(sqlite3.IntegrityError):
+        duplicate.result(timeout=10)
+    assert first.result(timeout=10) and last.result(timeout=10)
+    writer.close()
+    assert _count(path) == 2
+
+
+def test_close_commits_queued_jobs(path):
+    writer = DbWriter(
+        lambda: sqlite3.connect(path, check_same_thread=False), max_delay=0.5
+    )
+    for x in range(5):
+        writer.submit(_insert(x))
+    writer.close()
+    assert _count(path) == 5
+
+
+def test_connect_failure_fails_pending_and_later_jobs(tmp_path):
+    opening = threading.Event()
+
+    def connect():
+        opening.wait(10)
+        raise sqlite3.OperationalError("unable to open database file")
+
+    writer = DbWriter(connect)
+    pending = writer.submit(_insert(1))
+    opening.set()
+
+    with pytest.raises(sqlite3.OperationalError, match="not running"):
+        pending.result(timeout=10)
+    with pytest.raises(sqlite3.OperationalError, match="not running"):
+        writer.submit(_insert(2))
+    # Nothing is left to wait for.
+    writer.flush()
+    writer.close()
+
+
+def test_connect_failure_of_any_kind_is_reported(tmp_path):
+    def connect():
+        raise AttributeError("'Connection' has no attribute 'enable_load_extension'")
+
+    writer = DbWriter(connect)
+    writer.close()
+
+    with pytest.raises(sqlite3.OperationalError, match="enable_load_extension"):
+        writer.submit(_insert(1))
@@ -0,0 +1,38 @@
+"""The in-memory window of recent frame embeddings."""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from core.utils import EmbeddingWindow, compare_with_prev_img  # noqa: E402
+
+
+def _unit(*values) -> "np.ndarray":
+    return np.array(values, dtype=np.float32)
+
+
+def test_empty_window_has_no_previous_image():
+    assert compare_with_prev_img(_unit(1, 0), EmbeddingWindow(3)) is None
+
+
+def test_best_match_in_the_window():
+    window = EmbeddingWindow(3)
+    window.push(_unit(1, 0))
+    window.push(_unit(0, 2))
+
+    assert compare_with_prev_img(_unit(0, 1), window) == pytest.approx(1)
+    assert compare_with_prev_img(_unit(1, 1), window) == pytest.approx(0.5**0.5)
+
+
+def test_oldest_embedding_is_evicted():
+    window = EmbeddingWindow(2)
+    window.hydrate([_unit(1, 0), _unit(0, 1), _unit(-1, 0)])
+
+    assert len(window) == 2
+    assert sorted(window.similarities(_unit(1, 0)).tolist()) == [-1, 0]
+
+
+def test_zero_embedding_matches_nothing():
+    window = EmbeddingWindow(2)
+    window.push(_unit(1, 0))
+    assert window.similarities(_unit(0, 0)).tolist() == [0]
@@ -0,0 +1,113 @@
+"""The low-priority inference executor and its thread budget."""
+
+import sys
+import threading
+import types
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("PIL")
+
+from config import settings  # noqa: E402
+from core.model.executor import InferenceExecutor, thread_budget  # noqa: E402
+
+
+class FakeTorch(types.ModuleType):
+    def __init__(self, threads: int):
+        super().__init__("torch")
+        self.threads = threads
+
+    def get_num_threads(self) -> int:
+        return self.threads
+
+    def set_num_threads(self, threads: int) -> None:
+        self.threads = threads
+
+
+class NeverIdle:
+    def is_idle(self) -> bool:
+        return False
+
+
+@pytest.fixture
+def torch(monkeypatch):
+    fake = FakeTorch(threads=8)
+    monkeypatch.setitem(sys.modules, "torch", fake)
+    monkeypatch.setattr(settings, "MODEL_BACKEND", "torch")
+    monkeypatch.setattr(settings, "INFERENCE_THREADS", 0)
+    return fake
+
+
+def test_budget_applies_inside_the_block_only(torch):
+    with thread_budget(2):
+        assert torch.threads == 2
+    assert torch.threads == 8
+
+
+def test_budget_is_restored_after_an_error(torch):
+    with pytest.raises(RuntimeError):
+        with thread_budget(2):
+            raise RuntimeError("forward pass failed")
+    assert torch.threads == 8
+
+
+def test_budget_restores_the_interactive_setting(torch, monkeypatch):
+    monkeypatch.setattr(settings, "INFERENCE_THREADS", 6)
+    with thread_budget(2):
+        # As a model loaded inside the block does.
+        torch.set_num_threads(6)
+    assert torch.threads == 6
+
+
+def test_budget_leaves_onnx_alone(torch, monkeypatch):
+    monkeypatch.setattr(settings, "MODEL_BACKEND", "onnx")
+    with thread_budget(2):
+        assert torch.threads == 8
+
+
+def test_budget_without_torch(monkeypatch):
+    monkeypatch.setitem(sys.modules, "torch", None)
+    monkeypatch.setattr(settings, "MODEL_BACKEND", "torch")
+    with thread_budget(2):
+        pass
+
+
+def test_live_jobs_run_before_deferred_ones():
+    executor = InferenceExecutor(
+        threads=0,
+        nice=0,
+        sched_idle=False,
+        idle=NeverIdle(),
+        poll_seconds=0.05,
+        max_defer=0.5,
+    )
+    started = threading.Event()
+    release = threading.Event()
+    order = []
+
+    # Hold the thread so the other jobs queue up behind it.
+    blocker = executor.submit(lambda: started.set() or release.wait(10))
+    started.wait(10)
+    deferred = executor.submit(order.append, "deferred", when_idle=True)
+    live = executor.submit(order.append, "live")
+    release.set()
+
+    live.result(timeout=10)
+    deferred.result(timeout=10)
+    assert blocker.result() and order == ["live", "deferred"]
+    executor.shutdown()
+
+
+def test_job_errors_fail_their_future_only():
+    executor = InferenceExecutor(threads=0, nice=0, sched_idle=False)
+
+    def fail():
+        raise SystemExit("model gave up")
+
+    with pytest.raises(SystemExit):
+        executor.submit(fail).result(timeout=10)
+    assert executor.run(sum, [1, 2]) == 3
+    executor.shutdown()
+    with pytest.raises(RuntimeError):
+        executor.submit(sum, [])
@@ -0,0 +1,72 @@
+"""Loading the model lazily."""
+
+import threading
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("PIL")
+
+from core.model import BaseModel, LazyModel, ModelLoadError  # noqa: E402
+
+
+class TinyModel(BaseModel):
+    model_id = "tiny-v2"
+
+    def get_text_embs(self, text):
+        return np.full((1, 768), len(text), dtype=np.float32)
+
+    def get_img_embs(self, img):
+        return np.zeros((1, 768), dtype=np.float32)
+
+
+class Factory:
+    def __init__(self, error: Exception | None = None):
+        self.calls = 0
+        self.error = error
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self) -> BaseModel:
+        self.calls += 1
+        self.release.wait(10)
+        if self.error is not None:
+            raise self.error
+        return TinyModel()
+
+
+def test_model_loads_on_first_use():
+    factory = Factory()
+    model = LazyModel(factory, "tiny")
+
+    assert factory.calls == 0 and not model.is_ready()
+    assert model.get_text_embs("abc")[0, 0] == 3
+    assert model.get_text_embs_batch(["a", "ab"])[:, 0].tolist() == [1, 2]
+    assert factory.calls == 1
+    assert model.is_ready() and model.model_id == "tiny-v2"
+
+
+def test_warm_up_loads_in_the_background():
+    factory = Factory()
+    factory.release.clear()
+    model = LazyModel(factory, "tiny")
+
+    model.warm_up()
+    assert not model.wait_ready(timeout=0.05)
+    factory.release.set()
+    assert model.wait_ready(timeout=10)
+    assert factory.calls == 1
+
+
+def test_load_error_is_kept():
+    factory = Factory(error=ImportError("No module named 'torch'"))
+    model = LazyModel(factory, "tiny")
+    model.warm_up().join(10)
+
+    with pytest.raises(ModelLoadError, match="torch"):
+        model.is_ready()
+    with pytest.raises(ModelLoadError):
+        model.get_img_embs(None)
+    with pytest.raises(ModelLoadError):
+        model.wait_ready()
+    assert factory.calls == 1
@@ -0,0 +1,71 @@
+"""The metrics registry and its Prometheus text output."""
+
+import pytest
+
+from core.metrics import MetricsRegistry
+
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry()
+
+
+def test_metrics_are_looked_up_by_name_and_labels(registry):
+    registry.counter("frames_total", "Frames.", {"stage": "embed"}).inc()
+    registry.counter("frames_total", labels={"stage": "embed"}).inc(2)
+    registry.counter("frames_total", labels={"stage": "write"}).inc()
+
+    text = registry.render()
+    assert "# HELP frames_total Frames.\n# TYPE frames_total counter\n" in text
+    assert 'frames_total{stage="embed"} 3.0' in text
+    assert 'frames_total{stage="write"} 1.0' in text
+
+
+def test_a_name_keeps_its_kind(registry):
+    registry.counter("frames_total")
+    with pytest.raises(ValueError):
+        registry.gauge("frames_total")
+
+
+def test_histogram_buckets_are_cumulative(registry):
+    histogram = registry.histogram("latency_seconds", buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.7, 3):
+        histogram.observe(value)
+
+    text = registry.render()
+    assert 'latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{le="1"} 3' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 4' in text
+    assert "latency_seconds_sum 4.25" in text
+    assert "latency_seconds_count 4" in text
+
+
+def test_gauges_read_from_a_function(registry):
+    queue = [1, 2]
+    registry.gauge("queue_depth", fn=lambda: len(queue))
+    queue.append(3)
+    assert "queue_depth 3" in registry.render()
+
+
+def test_failing_gauge_does_not_break_the_export(registry):
+    registry.gauge("broken", fn=lambda: 1 / 0)
+    registry.gauge("working").set(2)
+
+    text = registry.render()
+    assert "working 2" in text
+    assert "\nbroken " not in text
+
+
+def test_label_values_are_escaped(registry):
+    registry.gauge("app", labels={"name": 'say "hi"\n'}).set(1)
+    assert 'app{name="say \\"hi\\"\\n"} 1' in registry.render()
+
+
+def test_textfile_is_written(registry, tmp_path):
+    registry.counter("frames_total").inc()
+    path = tmp_path / "metrics" / "smarn.prom"
+
+    registry.write_textfile(str(path))
+
+    assert path.read_text() == registry.render()
+    assert [p.name for p in path.parent.iterdir()] == ["smarn.prom"]
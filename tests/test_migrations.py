@@ -0,0 +1,99 @@
+"""Upgrading databases created by earlier versions of smarn."""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from core.migrations import MIGRATIONS, SCHEMA_VERSION, migrate, schema_version  # noqa: E402
+
+
+def _baseline_database(conn, rows: int) -> None:
+    """The unversioned schema smarn shipped before migrations, with entries."""
+    conn.execute(
+        """
+            CREATE TABLE img_info (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                image_path TEXT NOT NULL,
+                application_name TEXT,
+                timestamp TIMESTAMP NOT NULL
+            );
+        """
+    )
+    conn.execute(
+        """
+            CREATE VIRTUAL TABLE vec_idx USING vec0 (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                embedding FLOAT[768] distance_metric=cosine
+            );
+        """
+    )
+    rng = np.random.default_rng(0)
+    for i in range(rows):
+        conn.execute(
+            """
+                INSERT INTO img_info (image_path, application_name, timestamp)
+                VALUES (?, ?, datetime('2024-01-01', ?))
+            """,
+            (f"/shots/{i}.png", "Firefox" if i % 2 else "Terminal", f"+{i} minutes"),
+        )
+        conn.execute(
+            "INSERT INTO vec_idx (embedding) VALUES (?)",
+            (rng.standard_normal(768).astype(np.float32),),
+        )
+    conn.commit()
+
+
+def test_migrates_baseline_database_with_entries(vec_connect, tmp_path):
+    conn = vec_connect(tmp_path / "database.sqlite")
+    _baseline_database(conn, rows=1200)
+
+    assert migrate(conn) == len(MIGRATIONS)
+    conn.commit()
+
+    assert schema_version(conn) == SCHEMA_VERSION
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(img_info)")}
+    assert {"thumbnail_path", "retention_level"} <= columns
+    assert conn.execute("SELECT COUNT(*) FROM vec_idx").fetchone()[0] == 1200
+    assert conn.execute("SELECT COUNT(*) FROM vec_idx_bin").fetchone()[0] == 1200
+    # The metadata columns were filled in from img_info.
+    assert conn.execute(
+        "SELECT captured_at, application_name FROM vec_idx WHERE id = 2"
+    ).fetchone() == (1704067260, "firefox")
+    assert conn.execute(
+        "SELECT captured_at, application_name FROM vec_idx_bin WHERE id = 2"
+    ).fetchone() == (1704067260, "firefox")
+
+
+def test_migrate_is_idempotent(vec_connect, tmp_path):
+    conn = vec_connect(tmp_path / "database.sqlite")
+    _baseline_database(conn, rows=3)
+    migrate(conn)
+    conn.commit()
+
+    assert migrate(conn) == 0
+    assert conn.execute("SELECT COUNT(*) FROM vec_idx_bin").fetchone()[0] == 3
+
+
+def test_leaves_newer_schema_alone(vec_connect, tmp_path):
+    conn = vec_connect(tmp_path / "database.sqlite")
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION + 1}")
+
+    assert migrate(conn) == 0
+    assert schema_version(conn) == SCHEMA_VERSION + 1
+
+
+def test_search_after_upgrade(tmp_path, vec_connect):
+    conn = vec_connect(tmp_path / "legacy.sqlite")
+    _baseline_database(conn, rows=5)
+    conn.close()
+
+    from core.db import Database
+
+    legacy = Database(str(tmp_path / "legacy.sqlite"))
+    try:
+        legacy.create_tables()
+        query = legacy.get_last_embeddings(1)[0]
+        hits = legacy.get_top_k_entries(query, 3)
+        assert hits and hits[0][0] == "/shots/4.png"
+    finally:
+        legacy.close()
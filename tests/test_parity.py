@@ -0,0 +1,46 @@
+"""
+The ONNX backend must embed like the fp32 model (see `core.model.parity`).
+
+Skipped unless the ONNX towers have been exported (`python -m core.model.onnx_clip`)
+and the Jina-CLIP weights are in the Hugging Face cache.
+"""
+
+import os
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+pytest.importorskip("onnxruntime")
+huggingface_hub = pytest.importorskip("huggingface_hub")
+
+from config import settings  # noqa: E402
+from core.model import HF_MODEL_ID  # noqa: E402
+from core.model.onnx_clip import TEXT_TOWER, VISION_TOWER, _tower_path  # noqa: E402
+from core.model.parity import check_parity  # noqa: E402
+
+WEIGHT_FILES = ("model.safetensors", "pytorch_model.bin")
+
+
+def _towers_exported() -> bool:
+    return all(
+        os.path.exists(
+            _tower_path(settings.ONNX_MODEL_DIR, tower, settings.ONNX_QUANTIZED)
+        )
+        for tower in (TEXT_TOWER, VISION_TOWER)
+    )
+
+
+def _weights_cached() -> bool:
+    return any(
+        isinstance(huggingface_hub.try_to_load_from_cache(HF_MODEL_ID, name), str)
+        for name in WEIGHT_FILES
+    )
+
+
+@pytest.mark.skipif(
+    not _towers_exported(), reason="ONNX towers not exported; see core.model.onnx_clip"
+)
+@pytest.mark.skipif(not _weights_cached(), reason=f"{HF_MODEL_ID} weights not cached")
+def test_onnx_matches_fp32():
+    assert check_parity("onnx")
@@ -0,0 +1,183 @@
+"""The capture pipeline's stages, with the database and the encoder faked."""
+
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+from config import settings  # noqa: E402
+from core import pipeline as pipeline_module  # noqa: E402
+from core.model import (  # noqa: E402
+    BaseModel,
+    InferenceExecutor,
+    InferenceScheduler,
+    LazyModel,
+)
+from core.pipeline import _STOP, Capture, CapturePipeline  # noqa: E402
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.inserted: list[str] = []
+
+    def create_tables(self):
+        pass
+
+    def get_last_embeddings(self, n):
+        return []
+
+    def insert_entry_async(self, image_path, img_emb, application_name="", **kwargs):
+        self.inserted.append(image_path)
+        future = Future()
+        future.set_result(len(self.inserted))
+        return future
+
+    def flush(self):
+        pass
+
+
+class FakeEncoder:
+    def submit(self, raw_path):
+        return _done(raw_path + ".webp")
+
+    def submit_image(self, img, stem):
+        return _done(stem + ".webp")
+
+    def shutdown(self):
+        pass
+
+
+class FakeModel(BaseModel):
+    model_id = "fake"
+
+    def get_text_embs(self, text):
+        return np.ones(768, dtype=np.float32)
+
+    def get_img_embs(self, img):
+        return self.get_img_embs_batch([img])
+
+    def get_img_embs_batch(self, imgs):
+        embs = np.random.default_rng(len(imgs)).standard_normal((len(imgs), 768))
+        return (embs / np.linalg.norm(embs, axis=1, keepdims=True)).astype(np.float32)
+
+
+def _done(result) -> Future:
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def _failing_factory():
+    raise ImportError("No module named 'torch'")
+
+
+def _screen(seed: int) -> "Image.Image":
+    pixels = np.random.default_rng(seed).integers(0, 255, (90, 160, 3), dtype=np.uint8)
+    return Image.fromarray(pixels)
+
+
+@pytest.fixture
+def make_pipeline(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "OCR_ENABLED", False)
+    monkeypatch.setattr(pipeline_module, "ShardedDatabase", FakeDatabase)
+    monkeypatch.setattr(pipeline_module, "ScreenshotEncoder", FakeEncoder)
+    monkeypatch.setattr(pipeline_module, "make_thumbnail", lambda path, img: None)
+    executors = []
+
+    def make(model: BaseModel, screens=None, interval=0.001) -> CapturePipeline:
+        executor = InferenceExecutor(threads=0, nice=0, sched_idle=False)
+        executors.append(executor)
+        monkeypatch.setattr(
+            pipeline_module,
+            "inference",
+            InferenceScheduler(model, executor, batch_window=0, max_batch=4),
+        )
+        shots = iter(screens if screens is not None else range(1_000_000))
+
+        def capture_fn():
+            seed = next(shots)
+            return Capture(str(tmp_path / f"shot-{seed}"), _screen(seed), "term")
+
+        return CapturePipeline(capture_fn, interval=interval)
+
+    yield make
+    for executor in executors:
+        executor.shutdown()
+
+
+def _run_embed_stage(pipeline: CapturePipeline) -> list:
+    """Run the embed stage until its stop sentinel; return what it wrote."""
+    pipeline.embed_queue.put(_STOP)
+    pipeline._embed_stage()
+    written = []
+    while (frame := pipeline.write_queue.get_nowait()) is not _STOP:
+        written.append(frame)
+    return written
+
+
+def test_frames_are_embedded_and_written(make_pipeline):
+    pipeline = make_pipeline(FakeModel(), screens=[1, 2, 3])
+    for _ in range(3):
+        pipeline._offer(pipeline._capture_frame())
+
+    written = _run_embed_stage(pipeline)
+
+    assert len(written) == 3
+    assert all(frame.embedding is not None for frame in written)
+    assert pipeline.stats.embed.processed == 3
+
+
+def test_unchanged_screen_skips_inference(make_pipeline):
+    pipeline = make_pipeline(FakeModel(), screens=[1, 1])
+    pipeline._offer(pipeline._capture_frame())
+    _run_embed_stage(pipeline)
+
+    assert pipeline._capture_frame() is None
+    assert pipeline.stats.capture.skipped == 1
+
+
+def test_failed_embed_does_not_become_the_reference(make_pipeline):
+    pipeline = make_pipeline(LazyModel(_failing_factory, "missing"), screens=[1, 1])
+    pipeline._offer(pipeline._capture_frame())
+    _run_embed_stage(pipeline)
+
+    # The same screen is captured again and embedded this time.
+    assert pipeline._capture_frame() is not None
+
+
+def test_model_load_failure_discards_frames_and_keeps_stage_alive(make_pipeline):
+    pipeline = make_pipeline(LazyModel(_failing_factory, "missing"), screens=[1, 2])
+    pipeline._offer(pipeline._capture_frame())
+    pipeline._offer(pipeline._capture_frame())
+
+    # The stage survives the error and still forwards the stop sentinel.
+    assert _run_embed_stage(pipeline) == []
+    assert pipeline.stats.embed.errors == 2
+
+
+def test_full_embed_queue_drops_oldest_frame(make_pipeline):
+    pipeline = make_pipeline(FakeModel(), screens=[1, 2, 3])
+    pipeline.embed_queue.maxsize = 2
+    frames = [pipeline._capture_frame() for _ in range(3)]
+    for frame in frames:
+        pipeline._offer(frame)
+
+    assert pipeline.stats.embed.dropped == 1
+    assert list(pipeline.embed_queue.queue) == frames[1:]
+
+
+@pytest.mark.parametrize("model", [FakeModel(), LazyModel(_failing_factory, "missing")])
+def test_stop_returns_with_running_stages(make_pipeline, model):
+    pipeline = make_pipeline(model)
+    pipeline.start()
+    threads = list(pipeline._threads)
+    # Let a few frames go through (or fail to).
+    threading.Event().wait(0.5)
+
+    pipeline.stop(timeout=10)
+
+    assert not any(thread.is_alive() for thread in threads)
+    assert pipeline.stats.capture.processed > 0
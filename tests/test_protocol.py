@@ -0,0 +1,96 @@
+"""The daemon's wire format."""
+
+import math
+import socket
+from datetime import datetime, timezone
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from core import protocol  # noqa: E402
+from core.protocol import ProtocolError, Reader, Writer  # noqa: E402
+
+RESULTS = [
+    {
+        "image_path": "/shots/ünïcode.webp",
+        "application_name": "firefox",
+        "timestamp": "2024-05-01 12:00:00",
+        "distance": 0.25,
+        "thumbnail_path": "/thumbs/a.webp",
+    },
+    {
+        "image_path": "/shots/b.webp",
+        "application_name": "",
+        "timestamp": "2024-05-01 12:01:00",
+        "distance": None,
+        "thumbnail_path": None,
+    },
+]
+
+
+def test_fields_round_trip():
+    when = datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)
+    emb = np.linspace(-1, 1, 768, dtype=np.float32)
+    data = (
+        Writer()
+        .u8(7)
+        .u16(65535)
+        .u32(2**32 - 1)
+        .i64(-1)
+        .f64(math.pi)
+        .str("héllo")
+        .str(None)
+        .time(when)
+        .time(None)
+        .embedding(emb)
+        .results(RESULTS)
+        .bytes()
+    )
+
+    reader = Reader(data)
+    assert reader.u8() == 7
+    assert reader.u16() == 65535
+    assert reader.u32() == 2**32 - 1
+    assert reader.i64() == -1
+    assert reader.f64() == math.pi
+    assert reader.str() == "héllo"
+    assert reader.str() == ""
+    assert reader.time() == when
+    assert reader.time() is None
+    np.testing.assert_array_equal(reader.embedding(), emb)
+    assert reader.results() == RESULTS
+
+
+def test_truncated_message_is_rejected():
+    data = Writer().str("truncated").bytes()
+    with pytest.raises(ProtocolError):
+        Reader(data[:-1]).str()
+
+
+def test_oversized_string_is_rejected():
+    with pytest.raises(ProtocolError):
+        Writer().str("x" * 0x10000)
+
+
+def test_frames_over_a_socket():
+    left, right = socket.socketpair()
+    with left, right:
+        protocol.send_message(left, protocol.SEARCH, Writer().str("query").bytes())
+        protocol.send_message(left, protocol.PING)
+
+        type_, reader = protocol.recv_message(right)
+        assert (type_, reader.str()) == (protocol.SEARCH, "query")
+        type_, _ = protocol.recv_message(right)
+        assert type_ == protocol.PING
+
+        left.shutdown(socket.SHUT_WR)
+        assert protocol.recv_message(right) is None
+
+
+def test_invalid_frame_length_is_rejected():
+    left, right = socket.socketpair()
+    with left, right:
+        left.sendall((protocol.MAX_FRAME_SIZE + 1).to_bytes(4, "big"))
+        with pytest.raises(ProtocolError):
+            protocol.recv_message(right)
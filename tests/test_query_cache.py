@@ -0,0 +1,60 @@
+"""The query embedding cache."""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from core import query_cache  # noqa: E402
+from core.query_cache import QueryEmbeddingCache, normalize_query  # noqa: E402
+
+
+class Encoder:
+    def __init__(self):
+        self.calls: list[str] = []
+
+    def __call__(self, text: str) -> np.ndarray:
+        self.calls.append(text)
+        return np.full((1, 768), len(self.calls), dtype=np.float64)
+
+
+def test_normalize_query_only_touches_whitespace():
+    assert normalize_query("  red   Car\n") == "red Car"
+
+
+def test_repeated_queries_are_encoded_once():
+    cache = QueryEmbeddingCache("model", capacity=8, persist=False)
+    encode = Encoder()
+
+    first = cache.get_or_compute("red car", encode)
+    again = cache.get_or_compute(" red  car ", encode)
+
+    assert encode.calls == ["red car"]
+    assert again is first
+    assert first.shape == (768,) and first.dtype == np.float32
+    assert not first.flags.writeable
+    assert cache.stats() == {"hits": 1, "misses": 1, "size": 1}
+
+
+def test_least_recently_used_query_is_evicted():
+    cache = QueryEmbeddingCache("model", capacity=2, persist=False)
+    encode = Encoder()
+    for query in ("a", "b", "a", "c", "a", "b"):
+        cache.get_or_compute(query, encode)
+
+    # "b" was the least recently used when "c" came in.
+    assert encode.calls == ["a", "b", "c", "b"]
+
+
+def test_embeddings_survive_a_restart(sharded, monkeypatch):
+    monkeypatch.setattr(query_cache, "ShardedDatabase", lambda: sharded)
+    encode = Encoder()
+    emb = QueryEmbeddingCache("model", persist=True).get_or_compute("dog", encode)
+    sharded.flush()
+
+    restarted = QueryEmbeddingCache("model", persist=True)
+    assert np.array_equal(restarted.get_or_compute("dog", encode), emb)
+    assert encode.calls == ["dog"]
+
+    # Another model's embedding of the same query is not reused.
+    QueryEmbeddingCache("other", persist=True).get_or_compute("dog", encode)
+    assert encode.calls == ["dog", "dog"]
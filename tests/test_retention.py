@@ -0,0 +1,119 @@
+"""The retention tiers applied by the compactor."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+from config import settings  # noqa: E402
+from core import retention  # noqa: E402
+from core.retention import Compactor, RetentionTier, default_policy  # noqa: E402
+from core.shards import month_key  # noqa: E402
+
+
+@pytest.fixture
+def compact(sharded, tmp_path, monkeypatch):
+    monkeypatch.setattr(retention, "ARCHIVE_DIR", str(tmp_path / "archive"))
+    monkeypatch.setattr(retention, "_BATCH_PAUSE", 0)
+
+    def run(*tiers: RetentionTier) -> retention.CompactionReport:
+        compactor = Compactor(list(tiers), batch_size=2, duplicate_similarity=0.97)
+        compactor.db = sharded
+        return compactor.run_once()
+
+    return run
+
+
+def _file(path) -> str:
+    path.write_bytes(b"x" * 10)
+    return str(path)
+
+
+def _entry(sharded, embedding, tmp_path, name, seed, timestamp, thumbnail=None):
+    image_path = _file(tmp_path / f"{name}.png")
+    sharded.insert_entry(
+        image_path, embedding(seed), "term", timestamp, thumbnail_path=thumbnail
+    )
+    return image_path
+
+
+def test_dedupe_keeps_shared_thumbnails(sharded, compact, embedding, tmp_path):
+    yesterday = datetime.now(timezone.utc) - timedelta(days=1)
+    shared = _file(tmp_path / "shared.webp")
+    own = _file(tmp_path / "own.webp")
+    first = _entry(sharded, embedding, tmp_path, "first", 1, yesterday, shared)
+    _entry(sharded, embedding, tmp_path, "second", 1, yesterday, shared)
+    _entry(sharded, embedding, tmp_path, "third", 1, yesterday, own)
+
+    report = compact(RetentionTier(timedelta(0), "dedupe"))
+
+    assert report.deleted == 2
+    assert sharded.get_indexed_paths() == {first}
+    assert not (tmp_path / "second.png").exists()
+    assert not (tmp_path / "third.png").exists()
+    # The first entry still shows the shared thumbnail; nothing shows the other.
+    assert (tmp_path / "shared.webp").exists()
+    assert not (tmp_path / "own.webp").exists()
+
+
+def test_dedupe_is_per_application(sharded, compact, embedding, tmp_path):
+    yesterday = datetime.now(timezone.utc) - timedelta(days=1)
+    for name, app in (("a", "term"), ("b", "browser")):
+        sharded.insert_entry(
+            _file(tmp_path / f"{name}.png"), embedding(1), app, yesterday
+        )
+
+    assert compact(RetentionTier(timedelta(0), "dedupe")).deleted == 0
+
+
+def test_thumbnail_tier_archives_the_screenshot(
+    sharded, compact, embedding, tmp_path
+):
+    yesterday = datetime.now(timezone.utc) - timedelta(days=1)
+    image_path = str(tmp_path / "full.png")
+    Image.new("RGB", (320, 180), "red").save(image_path)
+    shared = _file(tmp_path / "shared.webp")
+    sharded.insert_entry(image_path, embedding(1), "term", yesterday, shared)
+    _entry(sharded, embedding, tmp_path, "other", 2, yesterday, shared)
+
+    report = compact(RetentionTier(timedelta(0), "thumbnail"))
+
+    assert report.archived == 1
+    assert not (tmp_path / "full.png").exists()
+    archived = list((tmp_path / "archive").iterdir())
+    assert len(archived) == 1
+    assert str(archived[0]) in sharded.get_indexed_paths()
+    # The other entry's screenshot could not be archived, so it keeps it all.
+    assert (tmp_path / "shared.webp").exists()
+
+
+def test_retire_drops_old_months(sharded, compact, embedding, tmp_path):
+    now = datetime.now(timezone.utc)
+    old = datetime(2020, 1, 15, tzinfo=timezone.utc)
+    shared = _file(tmp_path / "shared.webp")
+    own = _file(tmp_path / "own.webp")
+    _entry(sharded, embedding, tmp_path, "old", 1, old, shared)
+    _entry(sharded, embedding, tmp_path, "older", 2, old, own)
+    new = _entry(sharded, embedding, tmp_path, "new", 3, now, shared)
+
+    report = compact(RetentionTier(timedelta(days=60), "retire"))
+
+    assert report.deleted == 2
+    assert month_key(old) not in {shard.key for shard in sharded.shards()}
+    assert sharded.get_indexed_paths() == {new}
+    assert not (tmp_path / "old.png").exists()
+    assert (tmp_path / "shared.webp").exists()
+    assert not (tmp_path / "own.webp").exists()
+
+
+def test_default_policy(monkeypatch):
+    monkeypatch.setattr(settings, "RETENTION_KEEP_DAYS", 7)
+    monkeypatch.setattr(settings, "RETENTION_DEDUPE_DAYS", 90)
+    monkeypatch.setattr(settings, "RETENTION_RETIRE_DAYS", 0)
+
+    assert default_policy() == [
+        RetentionTier(timedelta(days=7), "dedupe"),
+        RetentionTier(timedelta(days=90), "thumbnail"),
+    ]
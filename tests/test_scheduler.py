@@ -0,0 +1,132 @@
+"""Micro-batching and priorities of the inference scheduler."""
+
+import threading
+import time
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("PIL")
+
+from core.model import BaseModel, InferenceExecutor, InferenceScheduler  # noqa: E402
+from core.model.scheduler import ModelGate  # noqa: E402
+
+
+class RecordingModel(BaseModel):
+    """Embeds item `x` as a row of `x`s and records every forward pass."""
+
+    model_id = "recording"
+
+    def __init__(self, error: Exception | None = None):
+        self.passes: list[list] = []
+        self.error = error
+
+    def _embed(self, items: list) -> np.ndarray:
+        self.passes.append(items)
+        if self.error is not None:
+            raise self.error
+        return np.array([np.full(768, item, dtype=np.float32) for item in items])
+
+    def get_text_embs(self, text):
+        return self._embed([text])
+
+    def get_text_embs_batch(self, texts):
+        return self._embed(texts)
+
+    def get_img_embs(self, img):
+        return self._embed([img])
+
+    def get_img_embs_batch(self, imgs):
+        return self._embed(imgs)
+
+
+@pytest.fixture
+def executor():
+    executor = InferenceExecutor(threads=0, nice=0, sched_idle=False)
+    yield executor
+    executor.shutdown()
+
+
+def _hold_executor(executor: InferenceExecutor) -> threading.Event:
+    """Keep the executor thread busy until the returned event is set."""
+    started, release = threading.Event(), threading.Event()
+    executor.submit(lambda: started.set() or release.wait(10))
+    started.wait(10)
+    return release
+
+
+def _wait_for(condition) -> None:
+    deadline = time.monotonic() + 10
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_queued_images_are_coalesced_up_to_max_batch(executor):
+    model = RecordingModel()
+    scheduler = InferenceScheduler(model, executor, batch_window=0, max_batch=4)
+    release = _hold_executor(executor)
+
+    futures = [scheduler.embed_images(imgs) for imgs in ([1], [2, 3], [4, 5, 6])]
+    release.set()
+
+    results = [future.result(timeout=10) for future in futures]
+    assert model.passes == [[1, 2, 3], [4, 5, 6]]
+    assert [rows[:, 0].tolist() for rows in results] == [[1], [2, 3], [4, 5, 6]]
+
+
+def test_concurrent_queries_share_a_forward_pass(executor):
+    model = RecordingModel()
+    scheduler = InferenceScheduler(model, executor, batch_window=0, max_batch=4)
+    results = {}
+
+    def query(text):
+        results[text] = scheduler.embed_text(text)
+
+    threads = [threading.Thread(target=query, args=(text,)) for text in (7, 8)]
+    with scheduler.gate.hold():
+        for thread in threads:
+            thread.start()
+        _wait_for(lambda: len(scheduler._texts) == 2)
+    for thread in threads:
+        thread.join(10)
+
+    assert model.passes == [[7, 8]]
+    assert results[7][0, 0] == 7 and results[8][0, 0] == 8
+
+
+def test_errors_fail_the_whole_batch_only(executor):
+    model = RecordingModel(error=RuntimeError("out of memory"))
+    scheduler = InferenceScheduler(model, executor, batch_window=0, max_batch=4)
+    release = _hold_executor(executor)
+    futures = [scheduler.embed_image(1), scheduler.embed_image(2)]
+    release.set()
+
+    for future in futures:
+        with pytest.raises(RuntimeError, match="out of memory"):
+            future.result(timeout=10)
+
+    model.error = None
+    assert scheduler.embed_image(3).result(timeout=10)[0, 0] == 3
+
+
+def test_interactive_holders_go_first():
+    gate = ModelGate()
+    order = []
+
+    def hold(name, interactive):
+        with gate.hold(interactive=interactive):
+            order.append(name)
+
+    with gate.hold():
+        background = threading.Thread(target=hold, args=("background", False))
+        background.start()
+        # Let the background holder start waiting before the query arrives.
+        time.sleep(0.1)
+        interactive = threading.Thread(target=hold, args=("query", True))
+        interactive.start()
+        _wait_for(lambda: gate._interactive_waiting == 1)
+    background.join(10)
+    interactive.join(10)
+
+    assert order == ["query", "background"]
@@ -0,0 +1,85 @@
+"""Paging through search results."""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("PIL")
+
+from core import main  # noqa: E402
+from core.main import SearchCursor  # noqa: E402
+
+
+class FakeDatabase:
+    """Ranks `n` entries by index; records the `k` of every query."""
+
+    def __init__(self, n: int):
+        self.n = n
+        self.queries: list[int] = []
+        self.filters: list[dict] = []
+
+    def get_top_k_entries(self, text_emb, k, **filters):
+        self.queries.append(k)
+        self.filters.append(filters)
+        return [
+            (f"/{i}.png", "term", "2024-01-01 00:00:00", i / 8, None)
+            for i in range(min(k, self.n))
+        ]
+
+    def get_top_k_hybrid(self, text_emb, text_query, k, **filters):
+        return self.get_top_k_entries(text_emb, k, **filters)
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    def make(n: int) -> FakeDatabase:
+        db = FakeDatabase(n)
+        monkeypatch.setattr(main, "db", db)
+        return db
+
+    return make
+
+
+def _paths(page) -> list[str]:
+    return [item["image_path"] for item in page]
+
+
+def test_pages_come_from_the_prefetched_buffer(fake_db):
+    db = fake_db(100)
+    cursor = SearchCursor(np.zeros(768), page_size=3, prefetch_pages=2, apps=["term"])
+
+    assert _paths(cursor.next_page()) == ["/0.png", "/1.png", "/2.png"]
+    assert _paths(cursor.next_page()) == ["/3.png", "/4.png", "/5.png"]
+    assert db.queries == [6]
+    assert db.filters == [{"apps": ["term"]}]
+
+
+def test_dry_buffer_doubles_k_and_skips_served_results(fake_db):
+    db = fake_db(100)
+    cursor = SearchCursor(np.zeros(768), page_size=3, prefetch_pages=2)
+    pages = [cursor.next_page() for _ in range(4)]
+
+    assert db.queries == [6, 12]
+    assert [path for page in pages for path in _paths(page)] == [
+        f"/{i}.png" for i in range(12)
+    ]
+
+
+def test_cursor_is_exhausted_by_a_short_result(fake_db):
+    fake_db(4)
+    cursor = SearchCursor(np.zeros(768), page_size=3, prefetch_pages=2)
+
+    assert len(cursor.next_page()) == 3
+    assert cursor.exhausted and cursor.has_more
+    assert _paths(cursor.next_page()) == ["/3.png"]
+    assert not cursor.has_more
+    assert cursor.next_page() == []
+
+
+def test_k_stops_growing_at_max_k(fake_db, monkeypatch):
+    monkeypatch.setattr(main, "MAX_K", 8)
+    db = fake_db(100)
+    cursor = SearchCursor(np.zeros(768), page_size=3, prefetch_pages=2)
+    while cursor.next_page():
+        pass
+
+    assert db.queries == [6, 8]
@@ -0,0 +1,85 @@
+"""Filtered, quantized and hybrid searches of one database."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("numpy")
+
+START = datetime(2024, 3, 1, tzinfo=timezone.utc)
+
+
+def _near(embedding, seed: int, noise: float, i: int):
+    """An embedding close to `embedding(seed)`, further away as `noise` grows."""
+    emb = embedding(seed) + noise * embedding(1000 + i)
+    return emb / (emb**2).sum() ** 0.5
+
+
+@pytest.fixture
+def filled(database, embedding):
+    """Twenty browser captures close to the query, then five terminal ones."""
+    for i in range(20):
+        database.insert_entry(
+            f"/browser-{i}.png",
+            _near(embedding, 0, 0.1, i),
+            "Firefox",
+            START + timedelta(hours=i),
+        )
+    for i in range(5):
+        database.insert_entry(
+            f"/term-{i}.png",
+            _near(embedding, 0, 1.0, 20 + i),
+            "Alacritty",
+            START + timedelta(days=2, hours=i),
+        )
+    return database
+
+
+def _paths(entries) -> list[str]:
+    return [entry[0] for entry in entries]
+
+
+def test_app_filter_returns_k_matches(filled, embedding):
+    # A global top 3 holds only browser captures; the filter runs inside the scan.
+    entries = filled.get_top_k_entries(embedding(0), 3, apps=["alacritty"])
+
+    assert len(entries) == 3
+    assert all(path.startswith("/term-") for path in _paths(entries))
+
+
+def test_time_range_filter(filled, embedding):
+    entries = filled.get_top_k_entries(
+        embedding(0),
+        10,
+        since=START + timedelta(hours=5),
+        until=START + timedelta(hours=8),
+    )
+
+    assert sorted(_paths(entries)) == [
+        "/browser-5.png",
+        "/browser-6.png",
+        "/browser-7.png",
+    ]
+
+
+def test_quantized_search_reranks_exactly(filled, embedding):
+    exact = filled.get_top_k_entries(embedding(0), 5, quantized=False)
+    quantized = filled.get_top_k_entries(embedding(0), 5, quantized=True)
+
+    assert _paths(quantized)[0] == _paths(exact)[0]
+    exact_distances = {entry[0]: entry[3] for entry in exact}
+    for path, _, _, distance, _ in quantized:
+        if path in exact_distances:
+            assert distance == pytest.approx(exact_distances[path], abs=1e-5)
+
+
+def test_hybrid_search_finds_exact_strings(filled, embedding):
+    far = filled.insert_entry("/error.png", embedding(7), "Alacritty", START)
+    filled.set_ocr_text(far, "curl: ERR_CONNECTION_REFUSED on localhost")
+
+    vector = filled.get_top_k_entries(embedding(0), 2)
+    hybrid = filled.get_top_k_hybrid(embedding(0), "ERR_CONNECTION_REFUSED", 2)
+
+    assert "/error.png" not in _paths(vector)
+    assert "/error.png" in _paths(hybrid)
+    assert dict((entry[0], entry[3]) for entry in hybrid)["/error.png"] is None
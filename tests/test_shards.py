@@ -0,0 +1,129 @@
+"""Monthly database shards."""
+
+import os
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from config import settings  # noqa: E402
+from core.db import Database  # noqa: E402
+from core.shards import (  # noqa: E402
+    LEGACY_KEY,
+    global_id,
+    month_bounds,
+    month_key,
+    month_name,
+    parse_month,
+    split_id,
+)
+
+JAN = datetime(2024, 1, 15, tzinfo=timezone.utc)
+FEB = datetime(2024, 2, 15, tzinfo=timezone.utc)
+
+
+def test_ids_name_their_shard():
+    key = month_key(FEB)
+    id_ = global_id(key, 7)
+    assert split_id(id_) == (key, 7)
+    assert split_id(global_id(key, 2**32 - 1)) == (key, 2**32 - 1)
+    # Entries of the adopted legacy database keep their ids.
+    assert global_id(LEGACY_KEY, 7) == 7
+
+
+def test_month_keys():
+    key = month_key(datetime(2024, 12, 31, 23, 30))
+    assert month_name(key) == "2024-12"
+    assert parse_month("2024-12") == key
+    assert month_name(LEGACY_KEY) == "legacy"
+    assert parse_month("legacy") == LEGACY_KEY
+    # Local times are filed by their UTC month.
+    assert month_key(datetime.fromisoformat("2025-01-01T00:30:00+01:00")) == key
+    start, end = month_bounds(key)
+    assert start == datetime(2024, 12, 1, tzinfo=timezone.utc).timestamp()
+    assert end == datetime(2025, 1, 1, tzinfo=timezone.utc).timestamp()
+
+
+def test_entries_go_to_their_month(sharded, embedding):
+    jan = sharded.insert_entry("/jan.png", embedding(1), timestamp=JAN)
+    feb = sharded.insert_entry("/feb.png", embedding(2), timestamp=FEB)
+
+    assert [shard.name for shard in sharded.shards()] == ["2024-01", "2024-02"]
+    assert split_id(jan)[0] == month_key(JAN)
+    assert split_id(feb)[0] == month_key(FEB)
+    assert [shard.name for shard in sharded.shards(since=FEB)] == ["2024-02"]
+
+
+def test_search_merges_the_shards(sharded, embedding):
+    sharded.insert_entry("/jan.png", embedding(1), timestamp=JAN)
+    sharded.insert_entry("/feb.png", embedding(2), timestamp=FEB)
+    sharded.insert_entry("/feb-other.png", embedding(3), timestamp=FEB)
+
+    entries = sharded.get_top_k_entries(embedding(1), 2)
+    assert entries[0][0] == "/jan.png"
+    assert len(entries) == 2
+    assert [entry[3] for entry in entries] == sorted(entry[3] for entry in entries)
+
+    entries = sharded.get_top_k_entries(embedding(1), 3, since=FEB)
+    assert {entry[0] for entry in entries} == {"/feb.png", "/feb-other.png"}
+
+
+def test_retire_drops_the_month(sharded, embedding):
+    sharded.insert_entry("/jan.png", embedding(1), timestamp=JAN, thumbnail_path="/t")
+    sharded.insert_entry("/feb.png", embedding(2), timestamp=FEB)
+    jan = sharded.shards()[0]
+
+    assert sharded.retire(month_key(JAN)) == [("/jan.png", "/t")]
+    assert [shard.name for shard in sharded.shards()] == ["2024-02"]
+    assert not os.path.exists(jan.path)
+    assert sharded.get_indexed_paths() == {"/feb.png"}
+    assert sharded.retire(month_key(JAN)) == []
+
+
+def test_retire_before_keeps_months_that_end_later(sharded, embedding):
+    sharded.insert_entry("/jan.png", embedding(1), timestamp=JAN)
+    sharded.insert_entry("/feb.png", embedding(2), timestamp=FEB)
+
+    retired = sharded.retire_before(FEB)
+
+    assert retired == [("/jan.png", None)]
+    assert [shard.name for shard in sharded.shards()] == ["2024-02"]
+
+
+@pytest.fixture
+def graphs(monkeypatch):
+    """Pretend every shard's HNSW graph holds 30 000 entries."""
+    monkeypatch.setattr(settings, "HNSW_INDEX", True)
+    monkeypatch.setattr(settings, "HNSW_MIN_ROWS", 50_000)
+    monkeypatch.setattr(Database, "ann_size", lambda self: 30_000)
+
+
+def test_hnsw_threshold_counts_every_shard_searched(sharded, embedding, graphs):
+    sharded.insert_entry("/jan.png", embedding(1), timestamp=JAN)
+    assert sharded._approximate(sharded.shards(), None, None, None, None) is False
+
+    sharded.insert_entry("/feb.png", embedding(2), timestamp=FEB)
+    assert sharded._approximate(sharded.shards(), None, None, None, None) is True
+
+
+def test_hnsw_threshold_leaves_filtered_and_explicit_searches(
+    sharded, embedding, graphs
+):
+    sharded.insert_entry("/jan.png", embedding(1), timestamp=JAN)
+    sharded.insert_entry("/feb.png", embedding(2), timestamp=FEB)
+    shards = sharded.shards()
+
+    assert sharded._approximate(shards, None, None, None, ["term"]) is None
+    assert sharded._approximate(shards, None, JAN, None, None) is None
+    assert sharded._approximate(shards, False, None, None, None) is False
+
+
+def test_hnsw_threshold_off_without_the_setting(
+    sharded, embedding, graphs, monkeypatch
+):
+    monkeypatch.setattr(settings, "HNSW_INDEX", False)
+    sharded.insert_entry("/jan.png", embedding(1), timestamp=JAN)
+    sharded.insert_entry("/feb.png", embedding(2), timestamp=FEB)
+
+    assert sharded._approximate(sharded.shards(), None, None, None, None) is None
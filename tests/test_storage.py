@@ -0,0 +1,60 @@
+"""Encoding screenshots for storage."""
+
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+from core.storage import (  # noqa: E402
+    ScreenshotEncoder,
+    codec_available,
+    encode_frame,
+    encode_screenshot,
+)
+
+
+def _screen(seed: int = 0) -> "Image.Image":
+    pixels = np.random.default_rng(seed).integers(0, 255, (90, 160, 3), dtype=np.uint8)
+    return Image.fromarray(pixels)
+
+
+def test_lossless_codecs_keep_every_pixel(tmp_path):
+    raw_path = str(tmp_path / "raw.bmp")
+    _screen().save(raw_path)
+
+    for codec in ("png", "webp-lossless"):
+        if not codec_available(codec):
+            continue
+        stored = encode_screenshot(raw_path, codec, quality=50)
+        # The raw capture is left for the caller to remove.
+        assert os.path.exists(raw_path)
+        with Image.open(stored) as img:
+            assert np.array_equal(np.asarray(img), np.asarray(_screen()))
+
+
+def test_frames_are_stored_as_rgb(tmp_path):
+    frame = _screen().convert("RGBA")
+
+    stored = encode_frame(frame, str(tmp_path / "shot"), "png", quality=50)
+
+    assert stored == str(tmp_path / "shot.png")
+    with Image.open(stored) as img:
+        assert img.mode == "RGB"
+
+
+def test_unknown_codec_is_rejected():
+    with pytest.raises(ValueError):
+        ScreenshotEncoder(codec="jpeg-xl", workers=1)
+
+
+def test_encoder_works_in_a_worker_process(tmp_path):
+    encoder = ScreenshotEncoder(codec="png", workers=1)
+    try:
+        stored = encoder.submit_image(_screen(1), str(tmp_path / "shot")).result(60)
+    finally:
+        encoder.shutdown()
+
+    with Image.open(stored) as img:
+        assert np.array_equal(np.asarray(img), np.asarray(_screen(1)))
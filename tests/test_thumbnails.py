@@ -0,0 +1,60 @@
+"""The thumbnail cache."""
+
+import os
+
+import pytest
+
+pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+from core.thumbnails import (  # noqa: E402
+    THUMBNAIL_SIZE,
+    evict_thumbnails,
+    make_thumbnail,
+)
+
+
+def _screenshot(path, color="red") -> str:
+    Image.new("RGB", (1920, 1080), color).save(path)
+    return str(path)
+
+
+def test_thumbnail_fits_the_result_card(tmp_path):
+    thumbnail = make_thumbnail(
+        _screenshot(tmp_path / "a.png"), thumbnail_dir=str(tmp_path)
+    )
+
+    with Image.open(thumbnail) as img:
+        assert img.width <= THUMBNAIL_SIZE[0] and img.height <= THUMBNAIL_SIZE[1]
+
+
+def test_identical_screenshots_share_a_thumbnail(tmp_path):
+    first, again, other = (
+        make_thumbnail(_screenshot(tmp_path / name, color), thumbnail_dir=str(tmp_path))
+        for name, color in (("a.png", "red"), ("b.png", "red"), ("c.png", "blue"))
+    )
+
+    assert first == again != other
+
+
+def test_thumbnail_from_decoded_frame(tmp_path):
+    img = Image.new("RGB", (640, 360), "green")
+    thumbnail = make_thumbnail(
+        str(tmp_path / "not-written-yet.png"), img, thumbnail_dir=str(tmp_path)
+    )
+    assert os.path.exists(thumbnail)
+
+
+def test_unreadable_screenshot(tmp_path):
+    missing = str(tmp_path / "missing.png")
+    assert make_thumbnail(missing, thumbnail_dir=str(tmp_path)) is None
+
+
+def test_eviction_drops_least_recently_used(tmp_path):
+    for i, name in enumerate(("old", "middle", "new")):
+        path = tmp_path / name
+        path.write_bytes(b"x" * 100)
+        os.utime(path, (1000 + i, 1000 + i))
+
+    assert evict_thumbnails(str(tmp_path), max_bytes=150) == 200
+    assert sorted(os.listdir(tmp_path)) == ["new"]